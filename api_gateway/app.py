@@ -8,6 +8,13 @@ from functools import wraps
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import uuid
+import os
+import json
+import time
+import random
+import threading
+from collections import deque
+from requests.adapters import HTTPAdapter
 from flask_swagger_ui import get_swaggerui_blueprint
 
 app = Flask(__name__)
@@ -37,12 +44,21 @@ limiter = Limiter(
     strategy="fixed-window",
 )
 
+# Экземпляры сервисов; список можно переопределить файлом UPSTREAMS_CONFIG
+# ({"tasks": ["http://tasks-service-1:5002", "http://tasks-service-2:5002"]}),
+# изменения файла подхватываются без перезапуска шлюза
 SERVICES = {
-    'users': 'http://users-service:5001',
-    'tasks': 'http://tasks-service:5002',
-    'orders': 'http://orders-service:5004'
+    'users': ['http://users-service:5001'],
+    'tasks': ['http://tasks-service:5002'],
+    'orders': ['http://orders-service:5004']
 }
 
+app.config['UPSTREAMS_CONFIG'] = os.environ.get('UPSTREAMS_CONFIG', 'upstreams.json')
+app.config['UPSTREAMS_RELOAD_INTERVAL'] = 1.0
+# Пассивная проверка здоровья: после N ошибок подряд экземпляр исключается
+app.config['UPSTREAM_EJECT_AFTER_FAILURES'] = 3
+app.config['UPSTREAM_EJECT_SECONDS'] = 10
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -62,6 +78,374 @@ AUTH_LIMITS = "5 per minute"
 DEFAULT_LIMITS = "100 per hour"
 HIGH_LIMITS = "60 per minute"
 MEDIUM_LIMITS = "30 per minute"
+# Выгрузки считаются отдельно от обычных запросов
+EXPORT_LIMITS = "20 per hour"
+
+# Дедлайны запросов к сервисам (в секундах). Ключ - префикс пути,
+# выбирается самый длинный совпавший префикс.
+app.config['DEFAULT_DEADLINE'] = 30
+app.config['ROUTE_DEADLINES'] = {
+    'v1/auth': 10,
+    'v1/statistics': 15,
+    'v1/reports/generate/statistics': 60,
+    'v1/orders/bulk': 300,
+    'v1/orders/export': 300,
+}
+
+def get_route_deadline(path):
+    """Бюджет времени на запрос к сервису для данного пути"""
+    best_prefix = ''
+    timeout = app.config['DEFAULT_DEADLINE']
+    for prefix, seconds in app.config['ROUTE_DEADLINES'].items():
+        if path.startswith(prefix) and len(prefix) > len(best_prefix):
+            best_prefix = prefix
+            timeout = seconds
+    return timeout
+
+def compute_deadline(path):
+    """Абсолютный дедлайн запроса с учетом дедлайна, пришедшего от клиента"""
+    deadline = time.time() + get_route_deadline(path)
+    client_deadline = request.headers.get('X-Request-Deadline')
+    if client_deadline:
+        try:
+            deadline = min(deadline, float(client_deadline))
+        except ValueError:
+            pass
+    return deadline
+
+# Bulkhead-изоляция: у каждого класса маршрутов свой ограниченный пул
+# одновременных запросов к сервисам, своя очередь и свои HTTP-соединения,
+# чтобы тяжелые отчеты не занимали ресурсы быстрых чтений.
+app.config['BULKHEADS'] = {
+    'interactive': {'max_concurrent': 32, 'max_queue': 64, 'queue_timeout': 2},
+    'write': {'max_concurrent': 16, 'max_queue': 32, 'queue_timeout': 5},
+    'heavy': {'max_concurrent': 4, 'max_queue': 8, 'queue_timeout': 10},
+}
+
+# Тяжелые маршруты: генерация отчетов, статистика и полные списки
+HEAVY_ROUTE_PREFIXES = [
+    'v1/reports/generate/',
+    'v1/statistics',
+    'v1/orders/analytics/',
+    'v1/orders/bulk',
+    'v1/orders/export',
+]
+HEAVY_LIST_ROUTES = [
+    'v1/users',
+    'v1/defects',
+    'v1/tasks',
+    'v1/orders',
+    'v1/reports',
+]
+# Лента изменений списка возвращает только изменения с прошлой синхронизации
+CHANGE_FEED_PARAMS = ['updated_since', 'change_token']
+
+class Bulkhead:
+    """Ограниченный пул запросов к сервисам для одного класса маршрутов"""
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.active = 0
+        self.queued = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.queue_timeouts = 0
+        self.max_queue_wait = 0.0
+
+        # Отдельный пул HTTP-соединений под размер bulkhead
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=max_concurrent)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def acquire(self, deadline=None):
+        """Занять слот; False, если очередь переполнена или ожидание истекло"""
+        if self._slots.acquire(blocking=False):
+            with self._lock:
+                self.active += 1
+                self.accepted += 1
+            return True
+
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                return False
+            self.queued += 1
+
+        wait = self.queue_timeout
+        if deadline is not None:
+            wait = max(0, min(wait, deadline - time.time()))
+
+        started = time.time()
+        acquired = self._slots.acquire(timeout=wait)
+        waited = time.time() - started
+
+        with self._lock:
+            self.queued -= 1
+            self.max_queue_wait = max(self.max_queue_wait, waited)
+            if acquired:
+                self.active += 1
+                self.accepted += 1
+            else:
+                self.queue_timeouts += 1
+        return acquired
+
+    def release(self, latency):
+        with self._lock:
+            self.active -= 1
+            self._latencies.append(latency)
+        self._slots.release()
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'active': self.active,
+                'queued': self.queued,
+                'accepted': self.accepted,
+                'rejected': self.rejected,
+                'queue_timeouts': self.queue_timeouts,
+                'max_queue_wait': round(self.max_queue_wait, 3),
+                'latency_p50': round(percentile(latencies, 50), 3),
+                'latency_p99': round(percentile(latencies, 99), 3),
+            }
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))
+    return sorted_values[index]
+
+BULKHEADS = {
+    name: Bulkhead(name, **limits)
+    for name, limits in app.config['BULKHEADS'].items()
+}
+
+def classify_route(path, method, args=()):
+    """Определение класса маршрута для выбора bulkhead; args - параметры строки запроса"""
+    if any(path.startswith(prefix) for prefix in HEAVY_ROUTE_PREFIXES):
+        return 'heavy'
+    if method.upper() == 'GET' and path in HEAVY_LIST_ROUTES:
+        if any(param in args for param in CHANGE_FEED_PARAMS):
+            return 'interactive'
+        return 'heavy'
+    if method.upper() != 'GET':
+        return 'write'
+    return 'interactive'
+
+# Повторы идемпотентных запросов к сервисам
+app.config['RETRY_MAX_ATTEMPTS'] = 3
+app.config['RETRY_BASE_DELAY'] = 0.05
+app.config['RETRY_MAX_DELAY'] = 1.0
+# Повторы не должны превышать 10% обычного трафика (плюс небольшой
+# минимальный запас в секунду), чтобы не усиливать отказ сервиса
+app.config['RETRY_BUDGET_RATIO'] = 0.1
+app.config['RETRY_BUDGET_MIN_PER_SECOND'] = 1
+
+IDEMPOTENT_METHODS = ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']
+# POST-маршруты сервисов (service, path), которые учитывают Idempotency-Key
+# (@idempotent). Остальные POST (вход, регистрация, отмена заказа) не повторяются даже с ключом
+IDEMPOTENT_POST_ROUTES = {
+    ('tasks', 'v1/defects'),
+    ('tasks', 'v1/defects/bulk'),
+    ('tasks', 'v1/tasks'),
+    ('tasks', 'v1/tasks/bulk'),
+    ('tasks', 'v1/reports'),
+    ('tasks', 'v1/reports/generate/statistics'),
+    ('orders', 'v1/orders'),
+}
+RETRYABLE_STATUSES = [502, 503]
+
+class RetryBudget:
+    """Общий бюджет повторов в виде ведра токенов"""
+
+    def __init__(self, ratio, min_per_second, max_balance=100):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_balance = max_balance
+        self._balance = float(min_per_second)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.time()
+        self._balance = min(self.max_balance,
+                            self._balance + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def record_request(self):
+        """Каждый исходный запрос пополняет бюджет на долю ratio"""
+        with self._lock:
+            self._refill()
+            self._balance = min(self.max_balance, self._balance + self.ratio)
+
+    def try_spend(self):
+        """Списать токен на повтор; False, если бюджет исчерпан"""
+        with self._lock:
+            self._refill()
+            if self._balance >= 1:
+                self._balance -= 1
+                return True
+            return False
+
+    def balance(self):
+        with self._lock:
+            self._refill()
+            return round(self._balance, 2)
+
+RETRY_BUDGET = RetryBudget(app.config['RETRY_BUDGET_RATIO'],
+                           app.config['RETRY_BUDGET_MIN_PER_SECOND'])
+
+# Счетчики повторов по маршрутам
+RETRY_STATS = {}
+retry_stats_lock = threading.Lock()
+
+def record_retry_stat(route, counter):
+    with retry_stats_lock:
+        stats = RETRY_STATS.setdefault(route, {
+            'retries': 0,
+            'recovered': 0,
+            'budget_exhausted': 0,
+        })
+        stats[counter] += 1
+
+def retry_stats_snapshot():
+    with retry_stats_lock:
+        return {route: dict(stats) for route, stats in RETRY_STATS.items()}
+
+def is_retryable_request(method, service, path):
+    """POST повторяем только на маршрутах из IDEMPOTENT_POST_ROUTES
+    и только при наличии ключа идемпотентности"""
+    method = method.upper()
+    if method in IDEMPOTENT_METHODS:
+        return True
+    return (method == 'POST' and (service, path) in IDEMPOTENT_POST_ROUTES
+            and bool(request.headers.get('Idempotency-Key')))
+
+def retry_delay(attempt):
+    """Экспоненциальная задержка с полным джиттером"""
+    cap = min(app.config['RETRY_MAX_DELAY'], app.config['RETRY_BASE_DELAY'] * (2 ** attempt))
+    return random.uniform(0, cap)
+
+class Upstream:
+    """Экземпляр сервиса со счетчиком незавершенных запросов"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.ejections = 0
+
+    def is_available(self, now):
+        return self.ejected_until <= now
+
+class UpstreamPool:
+    """Балансировка между экземплярами сервиса по принципу power of two choices"""
+
+    def __init__(self, name, urls):
+        self.name = name
+        self._lock = threading.Lock()
+        self.instances = []
+        self.set_urls(urls)
+
+    def set_urls(self, urls):
+        """Обновить список экземпляров, сохранив состояние уже известных"""
+        with self._lock:
+            known = {upstream.url: upstream for upstream in self.instances}
+            self.instances = [known.get(url.rstrip('/')) or Upstream(url) for url in urls]
+
+    def acquire(self, exclude=()):
+        """Выбрать экземпляр с меньшим числом незавершенных запросов"""
+        with self._lock:
+            now = time.time()
+            candidates = [u for u in self.instances if u.url not in exclude and u.is_available(now)]
+            if not candidates:
+                # Все экземпляры исключены - лучше попробовать, чем сразу отказать
+                candidates = [u for u in self.instances if u.url not in exclude] or list(self.instances)
+            if len(candidates) > 1:
+                first, second = random.sample(candidates, 2)
+                upstream = first if first.outstanding <= second.outstanding else second
+            else:
+                upstream = candidates[0]
+            upstream.outstanding += 1
+            upstream.requests += 1
+            return upstream
+
+    def release(self, upstream, success):
+        with self._lock:
+            upstream.outstanding -= 1
+            if success:
+                upstream.consecutive_failures = 0
+                return
+            upstream.failures += 1
+            upstream.consecutive_failures += 1
+            if (upstream.consecutive_failures >= app.config['UPSTREAM_EJECT_AFTER_FAILURES']
+                    and upstream.is_available(time.time())):
+                upstream.ejected_until = time.time() + app.config['UPSTREAM_EJECT_SECONDS']
+                upstream.ejections += 1
+                logger.warning(f"Ejecting {self.name} instance {upstream.url} for "
+                               f"{app.config['UPSTREAM_EJECT_SECONDS']}s after "
+                               f"{upstream.consecutive_failures} consecutive failures")
+
+    def metrics(self):
+        with self._lock:
+            now = time.time()
+            return [{
+                'url': upstream.url,
+                'available': upstream.is_available(now),
+                'outstanding': upstream.outstanding,
+                'requests': upstream.requests,
+                'failures': upstream.failures,
+                'ejections': upstream.ejections,
+            } for upstream in self.instances]
+
+UPSTREAMS = {name: UpstreamPool(name, urls) for name, urls in SERVICES.items()}
+upstreams_config_state = {'mtime': None, 'checked_at': 0.0}
+upstreams_config_lock = threading.Lock()
+
+def reload_upstreams_if_changed():
+    """Перечитать UPSTREAMS_CONFIG, если файл изменился (не чаще раза в интервал)"""
+    now = time.time()
+    if now - upstreams_config_state['checked_at'] < app.config['UPSTREAMS_RELOAD_INTERVAL']:
+        return
+    with upstreams_config_lock:
+        upstreams_config_state['checked_at'] = now
+        path = app.config['UPSTREAMS_CONFIG']
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return
+        if mtime == upstreams_config_state['mtime']:
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load upstreams config {path}: {str(e)}")
+            return
+        upstreams_config_state['mtime'] = mtime
+        for name, urls in config.items():
+            if name not in UPSTREAMS:
+                logger.warning(f"Unknown service '{name}' in upstreams config")
+                continue
+            if isinstance(urls, str):
+                urls = [urls]
+            if not urls:
+                logger.warning(f"Empty instance list for '{name}' in upstreams config, keeping current")
+                continue
+            UPSTREAMS[name].set_urls(urls)
+            logger.info(f"Loaded {len(urls)} instance(s) for {name} service")
 
 def token_required(f):
     @wraps(f)
@@ -107,12 +491,109 @@ def token_required(f):
         return f(*args, **kwargs)
     return decorated
 
-def forward_request(service, path, method='GET', data=None):
+def deadline_exceeded_response(service, url):
+    logger.error(f"Deadline exceeded before forwarding to {service} service: {url}")
+    return jsonify({
+        'success': False,
+        'error': {'code': 'DEADLINE_EXCEEDED', 'message': 'Request deadline exceeded'}
+    }), 504
+
+# Потоковые ответы сервисов (stream=1 у списков) передаются клиенту
+# по мере получения, без буферизации всего тела в шлюзе
+STREAM_QUERY_VALUES = ['1', 'true', 'yes']
+HOP_BY_HOP_HEADERS = ['content-length', 'transfer-encoding', 'connection', 'content-encoding']
+
+def is_stream_request(method):
+    return method.upper() == 'GET' and request.args.get('stream', '').lower() in STREAM_QUERY_VALUES
+
+class UpstreamStream:
+    """Тело потокового ответа сервиса. Пока оно передается клиенту, запрос
+    занимает слот bulkhead и считается незавершенным у экземпляра сервиса;
+    on_close(success) освобождает их, когда передача закончена или прервана.
+    WSGI-сервер вызывает close() и тогда, когда итерация не начиналась"""
+
+    def __init__(self, response, on_close=None):
+        self.response = response
+        self.on_close = on_close
+        self.failed = False
+        self.closed = False
+
+    def __iter__(self):
+        try:
+            for chunk in self.response.iter_content(chunk_size=None):
+                yield chunk
+        except Exception:
+            self.failed = True
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.response.close()
+        finally:
+            if self.on_close is not None:
+                self.on_close(not self.failed)
+
+def stream_upstream(response, on_close=None):
+    return UpstreamStream(response, on_close)
+
+UPSTREAM_BODY_CHUNK = 64 * 1024
+
+def request_body_chunks():
+    """Тело запроса клиента блоками (сервису уходит с chunked-кодированием)"""
+    while True:
+        chunk = request.stream.read(UPSTREAM_BODY_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+def send_upstream(session, method, url, data, headers, timeout, stream=False, raw_body=False, params=None):
+    # Параметры строки запроса (пагинация, фильтры) передаются сервису как есть,
+    # если маршрут не подставил свои
+    if params is None:
+        params = list(request.args.items(multi=True))
+    if raw_body:
+        # Тело передается сервису потоком, без разбора в шлюзе
+        return session.request(
+            method=method.upper(),
+            url=url,
+            params=params,
+            data=request_body_chunks(),
+            headers=headers,
+            timeout=timeout,
+            stream=stream
+        )
+    if method.upper() == 'GET':
+        return session.request(
+            method=method.upper(),
+            url=url,
+            params=params,
+            headers=headers,
+            timeout=timeout,
+            stream=stream
+        )
+    return session.request(
+        method=method.upper(),
+        url=url,
+        params=params,
+        json=data,
+        headers=headers,
+        timeout=timeout
+    )
+
+def forward_request(service, path, method='GET', data=None, raw_body=False, stream_response=False, params=None):
     try:
-        url = f"{SERVICES[service]}/{path}"
+        reload_upstreams_if_changed()
+        url = f"{service}/{path}"
+        deadline = compute_deadline(path)
         headers = {
             'Content-Type': 'application/json',
-            'X-Request-ID': request.headers.get('X-Request-ID', str(uuid.uuid4()))
+            'X-Request-ID': request.headers.get('X-Request-ID', str(uuid.uuid4())),
+            'X-Request-Deadline': f'{deadline:.3f}'
         }
 
         if hasattr(request, 'current_user'):
@@ -120,26 +601,110 @@ def forward_request(service, path, method='GET', data=None):
             headers['X-User-Email'] = request.current_user['email']
             headers['X-User-Role'] = request.current_user['role']
 
-        logger.info(f"Forwarding request to {url} with method {method}")
-
-        if method.upper() == 'GET':
-            response = requests.request(
-                method=method.upper(),
-                url=url,
-                headers=headers,
-                timeout=30
-            )
-        else:
-            response = requests.request(
-                method=method.upper(),
-                url=url,
-                json=data,
-                headers=headers,
-                timeout=30
-            )
+        if request.headers.get('Idempotency-Key'):
+            headers['Idempotency-Key'] = request.headers['Idempotency-Key']
+        
+        if raw_body:
+            headers['Content-Type'] = request.content_type or 'application/json'
+
+        if deadline <= time.time():
+            return deadline_exceeded_response(service, url)
+
+        route_class = classify_route(path, method, request.args)
+        bulkhead = BULKHEADS[route_class]
+        if not bulkhead.acquire(deadline):
+            logger.warning(f"Bulkhead '{route_class}' is full, rejecting request to {url}")
+            return jsonify({
+                'success': False,
+                'error': {'code': 'SERVICE_OVERLOADED', 'message': 'Too many concurrent requests, try again later'}
+            }), 503, {'Retry-After': '1'}
+
+        route = f"{method.upper()} {request.url_rule.rule if request.url_rule else '/' + path}"
+        # Прочитанное потоковое тело повторно не отправить
+        retryable = is_retryable_request(method, service, path) and not raw_body
+        stream = stream_response or is_stream_request(method) or raw_body
+        RETRY_BUDGET.record_request()
+
+        started = time.time()
+        # Экземпляр, с которого идет потоковый ответ: слоты освобождает тело ответа
+        streamed_upstream = None
+        try:
+            attempt = 1
+            tried = set()
+            while True:
+                # Дедлайн мог истечь, пока запрос ждал в очереди bulkhead
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    return deadline_exceeded_response(service, url)
+
+                # Повтор по возможности отправляем на другой экземпляр
+                upstream = UPSTREAMS[service].acquire(exclude=tried)
+                tried.add(upstream.url)
+                url = f"{upstream.url}/{path}"
+
+                logger.info(f"Forwarding request to {url} with method {method} via '{route_class}' bulkhead"
+                            f" (attempt {attempt})")
+
+                error = None
+                success = False
+                try:
+                    response = send_upstream(bulkhead.session, method, url, data, headers, timeout, stream, raw_body, params)
+                    success = response.status_code not in RETRYABLE_STATUSES
+                except requests.exceptions.ConnectionError as e:
+                    error = e
+                finally:
+                    if success and stream:
+                        streamed_upstream = upstream
+                    else:
+                        UPSTREAMS[service].release(upstream, success)
+
+                if success:
+                    break
+
+                delay = retry_delay(attempt)
+                if (not retryable or attempt >= app.config['RETRY_MAX_ATTEMPTS'] or
+                        time.time() + delay >= deadline):
+                    break
+                if not RETRY_BUDGET.try_spend():
+                    logger.warning(f"Retry budget exhausted, not retrying {method} {url}")
+                    record_retry_stat(route, 'budget_exhausted')
+                    break
+
+                logger.warning(f"Retrying {method} {url} in {delay:.3f}s after "
+                               f"{error or response.status_code}")
+                if error is None and stream:
+                    # Непрочитанный потоковый ответ держит соединение пула
+                    response.close()
+                record_retry_stat(route, 'retries')
+                time.sleep(delay)
+                attempt += 1
+
+            if error is not None:
+                raise error
+            if attempt > 1:
+                record_retry_stat(route, 'recovered')
+        except BaseException:
+            if streamed_upstream is not None:
+                UPSTREAMS[service].release(streamed_upstream, True)
+                response.close()
+                streamed_upstream = None
+            raise
+        finally:
+            if streamed_upstream is None:
+                bulkhead.release(time.time() - started)
 
         logger.info(f"Response from {service} service: {response.status_code}")
 
+        if stream:
+            headers = {name: value for name, value in response.headers.items()
+                       if name.lower() not in HOP_BY_HOP_HEADERS}
+            on_close = None
+            if streamed_upstream is not None:
+                def on_close(success):
+                    UPSTREAMS[service].release(streamed_upstream, success)
+                    bulkhead.release(time.time() - started)
+            return Response(stream_upstream(response, on_close), status=response.status_code, headers=headers)
+
         return Response(
             response=response.content,
             status=response.status_code,
@@ -282,8 +847,11 @@ def swagger_json():
                         "description": {"type": "string"},
                         "status": {"type": "string", "enum": ["created", "in_progress", "completed", "cancelled"]},
                         "total_amount": {"type": "number", "format": "float"},
+                        "item_count": {"type": "integer"},
+                        "top_products": {"type": "array", "items": {"type": "string"}},
                         "items": {
                             "type": "array",
+                            "description": "Only in order details or with include=items in lists",
                             "items": {
                                 "type": "object",
                                 "properties": {
@@ -459,8 +1027,31 @@ def swagger_json():
                 "get": {
                     "tags": ["Tasks"],
                     "summary": "Get all tasks",
-                    "description": "Retrieve list of all tasks (requires authentication)",
+                    "description": "Retrieve a page of tasks with filters and sorting (requires authentication)",
                     "security": [{"BearerAuth": []}],
+                    "parameters": [
+                        {"name": "limit", "in": "query", "schema": {"type": "integer", "default": 50, "maximum": 200}},
+                        {"name": "cursor", "in": "query", "schema": {"type": "string"},
+                         "description": "Opaque cursor from pagination.next_cursor"},
+                        {"name": "sort", "in": "query",
+                         "schema": {"type": "string", "enum": ["created_at", "updated_at", "due_date", "title"]}},
+                        {"name": "order", "in": "query", "schema": {"type": "string", "enum": ["asc", "desc"]}},
+                        {"name": "status", "in": "query", "schema": {"type": "string"},
+                         "description": "Comma-separated list of statuses"},
+                        {"name": "priority", "in": "query", "schema": {"type": "string"}},
+                        {"name": "assigned_to", "in": "query", "schema": {"type": "string"}},
+                        {"name": "stream", "in": "query", "schema": {"type": "boolean"},
+                         "description": "Stream the whole list in chunks; limit is optional and uncapped"},
+                        {"name": "fields", "in": "query", "schema": {"type": "string"},
+                         "description": "Comma-separated fields to return (id is always included)"},
+                        {"name": "created_by", "in": "query", "schema": {"type": "string"}},
+                        {"name": "due_from", "in": "query", "schema": {"type": "string", "format": "date"}},
+                        {"name": "due_to", "in": "query", "schema": {"type": "string", "format": "date"}},
+                        {"name": "updated_since", "in": "query", "schema": {"type": "string", "format": "date-time"},
+                         "description": "Return only tasks changed since this UTC time and ids of deleted ones (data.deleted)"},
+                        {"name": "change_token", "in": "query", "schema": {"type": "string"},
+                         "description": "Continue the change feed from pagination.change_token"}
+                    ],
                     "responses": {
                         "200": {
                             "description": "List of tasks",
@@ -476,6 +1067,15 @@ def swagger_json():
                                                     "tasks": {
                                                         "type": "array",
                                                         "items": {"$ref": "#/components/schemas/Task"}
+                                                    },
+                                                    "pagination": {
+                                                        "type": "object",
+                                                        "properties": {
+                                                            "limit": {"type": "integer"},
+                                                            "sort": {"type": "string"},
+                                                            "has_more": {"type": "boolean"},
+                                                            "next_cursor": {"type": "string", "nullable": True}
+                                                        }
                                                     }
                                                 }
                                             }
@@ -542,6 +1142,36 @@ def swagger_json():
                             "in": "query",
                             "schema": {"type": "string", "enum": ["created", "in_progress", "completed", "cancelled"]},
                             "description": "Filter by status"
+                        },
+                        {
+                            "name": "cursor",
+                            "in": "query",
+                            "schema": {"type": "string"},
+                            "description": "Opaque cursor from pagination.next_cursor (takes precedence over page)"
+                        },
+                        {
+                            "name": "total",
+                            "in": "query",
+                            "schema": {"type": "string", "enum": ["exact"]},
+                            "description": "Return an exact total instead of a cached one"
+                        },
+                        {
+                            "name": "stream",
+                            "in": "query",
+                            "schema": {"type": "boolean"},
+                            "description": "Stream the whole list in chunks; limit is optional and uncapped"
+                        },
+                        {
+                            "name": "fields",
+                            "in": "query",
+                            "schema": {"type": "string"},
+                            "description": "Comma-separated fields to return (id is always included)"
+                        },
+                        {
+                            "name": "include",
+                            "in": "query",
+                            "schema": {"type": "string", "enum": ["items"]},
+                            "description": "Add full line items to the order summaries"
                         }
                     ],
                     "responses": {
@@ -566,7 +1196,10 @@ def swagger_json():
                                                             "page": {"type": "integer"},
                                                             "limit": {"type": "integer"},
                                                             "total": {"type": "integer"},
-                                                            "pages": {"type": "integer"}
+                                                            "total_exact": {"type": "boolean"},
+                                                            "pages": {"type": "integer"},
+                                                            "has_more": {"type": "boolean"},
+                                                            "next_cursor": {"type": "string", "nullable": True}
                                                         }
                                                     }
                                                 }
@@ -618,6 +1251,25 @@ def swagger_json():
                     }
                 }
             },
+            "/v1/search": {
+                "get": {
+                    "tags": ["Search"],
+                    "summary": "Full-text search",
+                    "description": "Ranked full-text search over tasks, defects, reports and orders. Every word is matched by prefix; results of both services are merged by score",
+                    "security": [{"BearerAuth": []}],
+                    "parameters": [
+                        {"name": "q", "in": "query", "required": True, "schema": {"type": "string"}},
+                        {"name": "types", "in": "query", "description": "Comma-separated subset of tasks, defects, reports, orders", "schema": {"type": "string"}},
+                        {"name": "page", "in": "query", "schema": {"type": "integer", "default": 1}},
+                        {"name": "limit", "in": "query", "schema": {"type": "integer", "default": 20, "maximum": 100}}
+                    ],
+                    "responses": {
+                        "200": {"description": "Search results ordered by relevance"},
+                        "400": {"$ref": "#/components/schemas/Error"},
+                        "401": {"$ref": "#/components/schemas/Error"}
+                    }
+                }
+            },
             "/v1/statistics": {
                 "get": {
                     "tags": ["Statistics"],
@@ -695,6 +1347,12 @@ def auth_proxy(path):
 def users_proxy():
     return forward_request('users', 'v1/users', 'GET')
 
+@app.route('/v1/users/batch', methods=['GET'])
+@token_required
+@limiter.limit(DEFAULT_LIMITS)
+def users_batch_proxy():
+    return forward_request('users', 'v1/users/batch', 'GET')
+
 # Defects routes
 @app.route('/v1/defects', methods=['GET', 'POST'])
 @token_required
@@ -705,6 +1363,12 @@ def defects_proxy():
     else:
         return forward_request('tasks', 'v1/defects', 'POST', request.get_json())
 
+@app.route('/v1/defects/bulk', methods=['POST', 'PUT'])
+@token_required
+@limiter.limit(MEDIUM_LIMITS)
+def defects_bulk_proxy():
+    return forward_request('tasks', 'v1/defects/bulk', request.method, request.get_json())
+
 @app.route('/v1/defects/<path:path>', methods=['GET'])
 @token_required
 @limiter.limit(MEDIUM_LIMITS)
@@ -727,6 +1391,12 @@ def tasks_proxy():
     else:
         return forward_request('tasks', 'v1/tasks', 'POST', request.get_json())
 
+@app.route('/v1/tasks/bulk', methods=['POST', 'PUT'])
+@token_required
+@limiter.limit(MEDIUM_LIMITS)
+def tasks_bulk_proxy():
+    return forward_request('tasks', 'v1/tasks/bulk', request.method, request.get_json())
+
 @app.route('/v1/tasks/<path:path>', methods=['GET'])
 @token_required
 @limiter.limit(MEDIUM_LIMITS)
@@ -749,6 +1419,20 @@ def orders_proxy():
     else:
         return forward_request('orders', 'v1/orders', 'POST', request.get_json())
 
+@app.route('/v1/orders/export', methods=['GET'])
+@token_required
+@limiter.limit(EXPORT_LIMITS)
+def orders_export_proxy():
+    # Файл выгрузки передается клиенту по мере получения от сервиса
+    return forward_request('orders', 'v1/orders/export', 'GET', stream_response=True)
+
+@app.route('/v1/orders/bulk', methods=['POST'])
+@token_required
+@limiter.limit("10 per minute")
+def orders_bulk_proxy():
+    # NDJSON или JSON-массив заказов; ответ сервиса тоже потоковый
+    return forward_request('orders', 'v1/orders/bulk', 'POST', raw_body=True)
+
 @app.route('/v1/orders/<path:path>', methods=['GET', 'PUT', 'DELETE'])
 @token_required
 @limiter.limit(MEDIUM_LIMITS)
@@ -802,56 +1486,135 @@ def reports_generate_statistics_proxy():
 def statistics_proxy():
     return forward_request('tasks', 'v1/statistics', 'GET')
 
+# Search route. Типы результатов живут в разных сервисах: задачи, дефекты
+# и отчеты ищет сервис задач, заказы - сервис заказов
+SEARCH_TYPES = {'tasks': 'tasks', 'defects': 'tasks', 'reports': 'tasks', 'orders': 'orders'}
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+def search_error(message):
+    return jsonify({
+        'success': False,
+        'error': {'code': 'VALIDATION_ERROR', 'message': message}
+    }), 400
+
+def search_service_results(service, types, page, limit):
+    """Страница результатов сервиса в общем виде: (results, has_more, None)
+    или (None, None, ответ), если сервис ответил ошибкой"""
+    params = [(name, value) for name, value in request.args.items(multi=True)
+              if name not in ('types', 'page', 'limit')]
+    params += [('page', str(page)), ('limit', str(limit))]
+    if service == 'tasks':
+        params.append(('types', ','.join(types)))
+        response = app.make_response(forward_request('tasks', 'v1/search', 'GET', params=params))
+    else:
+        response = app.make_response(forward_request('orders', 'v1/orders/search', 'GET', params=params))
+    if response.status_code != 200:
+        return None, None, response
+    
+    data = response.get_json(force=True)['data']
+    if service == 'tasks':
+        return data['results'], data['pagination']['has_more'], None
+    results = [{
+        'type': 'orders',
+        'id': order['id'],
+        'title': order['title'],
+        'snippet': order['snippet'],
+        'score': order['score']
+    } for order in data['orders']]
+    return results, data['pagination']['has_more'], None
+
+def search_results_response(results, page, limit, has_more):
+    return jsonify({
+        'success': True,
+        'data': {
+            'results': results,
+            'pagination': {'page': page, 'limit': limit, 'has_more': has_more}
+        }
+    })
+
+@app.route('/v1/search', methods=['GET'])
+@token_required
+@limiter.limit(HIGH_LIMITS)
+def search_proxy():
+    types = [name for name in request.args.get('types', ','.join(SEARCH_TYPES)).split(',') if name]
+    if not types or any(name not in SEARCH_TYPES for name in types):
+        return search_error(f"types must be a subset of {', '.join(SEARCH_TYPES)}")
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = min(max(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        return search_error('page and limit must be integers')
+    
+    services = {}
+    for name in dict.fromkeys(types):
+        services.setdefault(SEARCH_TYPES[name], []).append(name)
+    if list(services) == ['tasks']:
+        return forward_request('tasks', 'v1/search', 'GET')
+    if list(services) == ['orders']:
+        results, has_more, error = search_service_results('orders', ['orders'], page, limit)
+        return error or search_results_response(results, page, limit, has_more)
+    
+    # Оба сервиса: у каждого берутся первые page * limit результатов, после
+    # слияния по score (оба сервиса считают -bm25) из них вырезается страница
+    size = page * limit
+    if size > SEARCH_MAX_LIMIT:
+        return search_error(f'page * limit must not exceed {SEARCH_MAX_LIMIT} when searching tasks and orders together')
+    merged = []
+    has_more = False
+    for service, service_types in services.items():
+        results, service_has_more, error = search_service_results(service, service_types, 1, size)
+        if error is not None:
+            return error
+        merged.extend(results)
+        has_more = has_more or service_has_more
+    
+    merged.sort(key=lambda result: (-result['score'], result['id']))
+    has_more = has_more or len(merged) > size
+    return search_results_response(merged[size - limit:size], page, limit, has_more)
+
 # Health check
 @app.route('/health', methods=['GET'])
 @limiter.exempt
 def health():
     return jsonify({'status': 'healthy', 'service': 'api-gateway'})
 
+def check_service_health(name):
+    """Сервис считается здоровым, если здоров хотя бы один его экземпляр"""
+    instances = []
+    for upstream in list(UPSTREAMS[name].instances):
+        try:
+            response = requests.get(f"{upstream.url}/health", timeout=5)
+            instances.append({
+                'url': upstream.url,
+                'status': 'healthy' if response.status_code == 200 else 'unhealthy',
+                'status_code': response.status_code
+            })
+        except Exception as e:
+            instances.append({
+                'url': upstream.url,
+                'status': 'unavailable',
+                'error': str(e)
+            })
+
+    statuses = [instance['status'] for instance in instances]
+    if 'healthy' in statuses:
+        status = 'healthy'
+    elif 'unhealthy' in statuses:
+        status = 'unhealthy'
+    else:
+        status = 'unavailable'
+    return {'status': status, 'instances': instances}
+
 # Health checks для всех сервисов
 @app.route('/health/all', methods=['GET'])
 @limiter.exempt
 def health_all():
     services_status = {}
 
-    # Проверка сервиса пользователей
-    try:
-        response = requests.get(f"{SERVICES['users']}/health", timeout=5)
-        services_status['users'] = {
-            'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-            'status_code': response.status_code
-        }
-    except Exception as e:
-        services_status['users'] = {
-            'status': 'unavailable',
-            'error': str(e)
-        }
-
-    # Проверка сервиса задач
-    try:
-        response = requests.get(f"{SERVICES['tasks']}/health", timeout=5)
-        services_status['tasks'] = {
-            'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-            'status_code': response.status_code
-        }
-    except Exception as e:
-        services_status['tasks'] = {
-            'status': 'unavailable',
-            'error': str(e)
-        }
-
-    # Проверка сервиса заказов
-    try:
-        response = requests.get(f"{SERVICES['orders']}/health", timeout=5)
-        services_status['orders'] = {
-            'status': 'healthy' if response.status_code == 200 else 'unhealthy',
-            'status_code': response.status_code
-        }
-    except Exception as e:
-        services_status['orders'] = {
-            'status': 'unavailable',
-            'error': str(e)
-        }
+    # Проверка сервисов пользователей, задач и заказов (всех экземпляров)
+    for name in ['users', 'tasks', 'orders']:
+        services_status[name] = check_service_health(name)
 
     all_healthy = all(
         service['status'] == 'healthy'
@@ -865,6 +1628,28 @@ def health_all():
         'timestamp': datetime.datetime.now().isoformat()
     })
 
+# Метрики bulkhead-изоляции и повторов. Раскрывают адреса экземпляров
+# сервисов, поэтому доступны только с токеном администратора или менеджера
+METRICS_ROLES = ['admin', 'manager']
+
+@app.route('/metrics', methods=['GET'])
+@limiter.exempt
+def metrics():
+    if request.current_user['role'] not in METRICS_ROLES:
+        return jsonify({
+            'success': False,
+            'error': {'code': 'FORBIDDEN', 'message': 'Access denied'}
+        }), 403
+    return jsonify({
+        'bulkheads': {name: bulkhead.metrics() for name, bulkhead in BULKHEADS.items()},
+        'upstreams': {name: pool.metrics() for name, pool in UPSTREAMS.items()},
+        'retries': {
+            'budget_balance': RETRY_BUDGET.balance(),
+            'routes': retry_stats_snapshot(),
+        },
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
 # Обработка ошибок rate limiting
 @app.errorhandler(429)
 def ratelimit_handler(e):
@@ -905,7 +1690,7 @@ def method_not_allowed_handler(e):
 @app.after_request
 def after_request(response):
     response.headers.add('Access-Control-Allow-Origin', '*')
-    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Request-ID')
+    response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,X-Request-ID,X-Request-Deadline,Idempotency-Key')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
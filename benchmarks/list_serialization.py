@@ -0,0 +1,99 @@
+"""Сравнение способов сериализации списков дефектов.
+
+Запуск из корня репозитория:
+    python benchmarks/list_serialization.py [1000 10000 100000]
+"""
+import json
+import os
+import sys
+import time
+
+import orjson
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import common.json_rows as json_rows
+import service_tasks.app as tasks_service
+
+ROUNDS = 5
+
+def fill_defects(count):
+    conn = tasks_service.get_db()
+    conn.execute('DELETE FROM defects')
+    conn.executemany('''
+        INSERT INTO defects (id, title, description, severity, status, reported_by, assigned_to)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (tasks_service.new_id(), f'Дефект {i}', 'Трещина в несущей стене на отметке +3.000',
+         'high', 'open', 'engineer@system.com', None)
+        for i in range(count)
+    ])
+    conn.commit()
+    conn.close()
+
+def fetch_rows(sql):
+    conn = tasks_service.get_db()
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return rows
+
+def dicts_stdlib(rows):
+    defects = [{
+        'id': row['id'],
+        'title': row['title'],
+        'description': row['description'],
+        'severity': row['severity'],
+        'status': row['status'],
+        'reported_by': row['reported_by'],
+        'assigned_to': row['assigned_to'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at']
+    } for row in rows]
+    # Настройки стандартного JSON-провайдера Flask
+    return json.dumps({'success': True, 'data': {'defects': defects}}, ensure_ascii=True, sort_keys=True)
+
+def dicts_orjson(rows):
+    defects = [dict(row) for row in rows]
+    return orjson.dumps({'success': True, 'data': {'defects': defects}})
+
+def row_encoder_template(rows):
+    json_rows.USE_ORJSON = False
+    return tasks_service.ROW_ENCODERS['defects'].encode_rows(rows)
+
+def row_encoder_orjson(rows):
+    json_rows.USE_ORJSON = True
+    return tasks_service.ROW_ENCODERS['defects'].encode_rows(rows)
+
+def measure(fn, *args):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    variants = [
+        ('dict + json', dicts_stdlib),
+        ('RowEncoder', row_encoder_template),
+        ('dict + orjson', dicts_orjson),
+        ('RowEncoder+orjson', row_encoder_orjson)
+    ]
+    
+    tasks_service.app.config['DATABASE'] = 'memory:benchmark_tasks'
+    tasks_service.init_db()
+    sql = f"SELECT {tasks_service.ROW_ENCODERS['defects'].select_sql} FROM defects"
+    
+    # Время выборки строк общее для всех вариантов и измеряется отдельно
+    print(f"{'rows':>8} {'fetch':>12} " + ' '.join(f'{name:>18}' for name, _ in variants))
+    for size in sizes:
+        fill_defects(size)
+        fetch_time = measure(fetch_rows, sql)
+        rows = fetch_rows(sql)
+        timings = [measure(fn, rows) for _, fn in variants]
+        print(f'{size:>8} {fetch_time * 1000:>9.1f} ms ' + ' '.join(f'{timing * 1000:>15.1f} ms' for timing in timings))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Общий код сервисов пользователей, задач и заказов"""
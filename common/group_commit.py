@@ -0,0 +1,159 @@
+"""Групповая фиксация: записи из разных запросов ждут попутчиков до
+GROUP_COMMIT_WINDOW секунд и фиксируются одной транзакцией (один fsync на
+пачку). Каждый запрос получает ответ только после фиксации своей пачки"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+
+from flask import request, has_request_context
+
+from common.sqlite_pool import get_pool
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT_WINDOW = 0.002
+GROUP_COMMIT_MAX_BATCH = 128
+# Предельное ожидание фиксации, если у запроса нет дедлайна
+GROUP_COMMIT_TIMEOUT = 30
+
+def configure_group_commit(app, enabled=False):
+    """Настройки групповой фиксации в app.config; по умолчанию выключена"""
+    app.config['GROUP_COMMIT'] = enabled
+    app.config['GROUP_COMMIT_WINDOW'] = GROUP_COMMIT_WINDOW
+    app.config['GROUP_COMMIT_MAX_BATCH'] = GROUP_COMMIT_MAX_BATCH
+    app.config['GROUP_COMMIT_TIMEOUT'] = GROUP_COMMIT_TIMEOUT
+
+class GroupCommitTimeout(Exception):
+    pass
+
+class GroupCommitWriter:
+    """Поток-писатель: выполняет записи из разных запросов в одной
+    транзакции и подтверждает каждую только после фиксации всей пачки"""
+
+    def __init__(self, pool, window, max_batch):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, write, timeout=None):
+        """Постановка записи write(conn) в очередь; ждет фиксации пачки не
+        дольше timeout секунд. Если запись еще не начата, она отменяется
+        и возникает GroupCommitTimeout; начатая запись дожидается фиксации"""
+        future = Future()
+        self.queue.put((write, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise GroupCommitTimeout('Group commit did not start before the deadline')
+            return future.result()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        # Любая ошибка завершает только текущую пачку: поток не должен
+        # остановиться, иначе все последующие записи ждали бы впустую
+        while True:
+            batch = []
+            try:
+                batch = self._collect()
+                results = self._write_batch(batch)
+            except Exception as e:
+                logger.error(f"Group commit of {len(batch)} writes failed: {str(e)}")
+                results = [(future, None, e) for _, future in batch]
+
+            for future, result, error in results:
+                try:
+                    if error is not None:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(result)
+                except InvalidStateError:
+                    # Запрос отменил запись, не дождавшись пачки
+                    pass
+
+    def _write_batch(self, batch):
+        results = []
+        conn = self.pool.acquire()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for write, future in batch:
+                # Записи, от которых запрос уже отказался, не выполняются
+                if not future.set_running_or_notify_cancel():
+                    continue
+                # Ошибка одной записи откатывает только ее точку сохранения
+                conn.execute('SAVEPOINT group_write')
+                try:
+                    results.append((future, write(conn), None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO group_write')
+                    results.append((future, None, e))
+                conn.execute('RELEASE group_write')
+            conn.commit()
+            return results
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception as e:
+                logger.error(f"Group commit rollback failed: {str(e)}")
+            raise
+        finally:
+            conn.close()
+
+group_writers = {}
+group_writers_lock = threading.Lock()
+
+def get_writer(database, config):
+    """Общий писатель базы database"""
+    writer = group_writers.get(database)
+    if writer is None:
+        pool = get_pool(database, config)
+        with group_writers_lock:
+            writer = group_writers.get(database)
+            if writer is None:
+                writer = GroupCommitWriter(
+                    pool,
+                    config['GROUP_COMMIT_WINDOW'],
+                    config['GROUP_COMMIT_MAX_BATCH']
+                )
+                group_writers[database] = writer
+    return writer
+
+def write_runner(config):
+    """Функция run_write(write) сервиса: выполнение write(conn) с фиксацией
+    в базе config['DATABASE']. При GROUP_COMMIT запись идет через общего
+    писателя этой базы, иначе - в собственной транзакции"""
+    def run_write(write):
+        database = config['DATABASE']
+        if config['GROUP_COMMIT']:
+            # Ожидание ограничено дедлайном запроса: после него шлюз ответ уже не ждет
+            timeout = config['GROUP_COMMIT_TIMEOUT']
+            deadline = getattr(request, 'deadline', None) if has_request_context() else None
+            if deadline is not None:
+                timeout = max(deadline - time.time(), 0)
+            return get_writer(database, config).submit(write, timeout)
+
+        conn = get_pool(database, config).acquire()
+        try:
+            result = write(conn)
+            conn.commit()
+            return result
+        finally:
+            conn.close()
+    return run_write
@@ -0,0 +1,129 @@
+"""Ключи идемпотентности: повтор POST с тем же Idempotency-Key возвращает
+сохраненный ответ вместо повторного создания записи"""
+import hashlib
+import logging
+import sqlite3
+import time
+from functools import wraps
+
+from flask import request, jsonify, Response, make_response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = 24 * 60 * 60
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+# Незавершенный запрос держит ключ до своего дедлайна (или IDEMPOTENCY_LEASE
+# секунд без дедлайна); после этого повтор с тем же телом перехватывает ключ,
+# например если обработчик упал вместе с процессом
+IDEMPOTENCY_LEASE = 60
+
+def init_idempotency_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            fingerprint BLOB NOT NULL,
+            status_code INTEGER,
+            response TEXT,
+            created_at REAL NOT NULL,
+            lease_until REAL,
+            PRIMARY KEY (scope, key)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys(created_at)')
+
+def idempotency_decorator(get_db):
+    """Декоратор @idempotent для POST-эндпоинтов сервиса, поддерживающий
+    заголовок Idempotency-Key; get_db открывает соединение с базой сервиса"""
+    def idempotent(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return f(*args, **kwargs)
+
+            request_id = request.headers.get('X-Request-ID', 'default')
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                return jsonify({
+                    'success': False,
+                    'error': {'code': 'VALIDATION_ERROR', 'message': 'Idempotency-Key is too long'}
+                }), 400
+
+            # Ключ действует в рамках пользователя и эндпоинта
+            scope = f"{request.headers.get('X-User-ID', 'anonymous')} {request.method} {request.path}"
+            fingerprint = hashlib.sha256(request.get_data()).digest()
+            now = time.time()
+            deadline = getattr(request, 'deadline', None)
+            lease_until = deadline if deadline is not None else now + IDEMPOTENCY_LEASE
+
+            conn = get_db()
+            try:
+                conn.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (now - IDEMPOTENCY_TTL,))
+                conn.execute('''
+                    INSERT INTO idempotency_keys (scope, key, fingerprint, created_at, lease_until)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (scope, key, fingerprint, now, lease_until))
+                conn.commit()
+            except sqlite3.IntegrityError:
+                conn.rollback()
+                # Аренда прежнего владельца истекла: ключ переходит к этому запросу
+                taken_over = conn.execute('''
+                    UPDATE idempotency_keys SET created_at = ?, lease_until = ?
+                    WHERE scope = ? AND key = ? AND fingerprint = ?
+                        AND status_code IS NULL AND lease_until < ?
+                ''', (now, lease_until, scope, key, fingerprint, now)).rowcount
+                conn.commit()
+            else:
+                taken_over = True
+
+            if not taken_over:
+                stored = conn.execute(
+                    'SELECT fingerprint, status_code, response FROM idempotency_keys WHERE scope = ? AND key = ?',
+                    (scope, key)
+                ).fetchone()
+                conn.close()
+
+                if stored and stored['fingerprint'] != fingerprint:
+                    logger.warning(f"Request {request_id} - Idempotency-Key reused with a different payload")
+                    return jsonify({
+                        'success': False,
+                        'error': {'code': 'IDEMPOTENCY_KEY_MISMATCH', 'message': 'Idempotency-Key was used with a different request'}
+                    }), 422
+                if not stored or stored['status_code'] is None:
+                    return jsonify({
+                        'success': False,
+                        'error': {'code': 'IDEMPOTENCY_IN_PROGRESS', 'message': 'Request with this Idempotency-Key is in progress'}
+                    }), 409
+
+                logger.info(f"Request {request_id} - Replaying stored response for Idempotency-Key {key}")
+                return Response(
+                    response=stored['response'],
+                    status=stored['status_code'],
+                    mimetype='application/json',
+                    headers={'Idempotent-Replayed': 'true'}
+                )
+
+            # Запись ключа меняет только его текущий владелец (created_at - метка аренды)
+            owner = (scope, key, now)
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                conn.execute('DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND created_at = ?', owner)
+                conn.commit()
+                conn.close()
+                raise
+
+            # Ошибки сервера не сохраняем, чтобы запрос можно было повторить
+            if response.status_code < 500:
+                conn.execute('''
+                    UPDATE idempotency_keys SET status_code = ?, response = ?, lease_until = NULL
+                    WHERE scope = ? AND key = ? AND created_at = ?
+                ''', (response.status_code, response.get_data(as_text=True)) + owner)
+            else:
+                conn.execute('DELETE FROM idempotency_keys WHERE scope = ? AND key = ? AND created_at = ?', owner)
+            conn.commit()
+            conn.close()
+
+            return response
+        return decorated
+    return idempotent
@@ -0,0 +1,40 @@
+"""Идентификаторы записей: UUIDv7 - 48 бит времени в миллисекундах, затем
+счетчик и случайные биты. Новые id попадают в конец индекса по id,
+а не в случайное место B-дерева, и упорядочены по времени создания"""
+import os
+import threading
+import time
+import uuid
+
+id_lock = threading.Lock()
+last_id_state = [0, 0]  # [миллисекунды, счетчик]
+
+def uuid7():
+    """UUID версии 7, монотонно возрастающий в пределах процесса"""
+    with id_lock:
+        ms = time.time_ns() // 1000000
+        last_ms, counter = last_id_state
+        if ms > last_ms:
+            # Старший бит счетчика обнулен, чтобы оставить запас для инкремента
+            counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            ms = last_ms
+            counter += 1
+            if counter > 0xFFF:
+                ms += 1
+                counter = 0
+        last_id_state[:] = [ms, counter]
+
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+def id_generator(config):
+    """Функция new_id() сервиса; config['TIME_ORDERED_IDS'] = False
+    возвращает случайные uuid4"""
+    def new_id():
+        """Идентификатор новой записи"""
+        if config['TIME_ORDERED_IDS']:
+            return str(uuid7())
+        return str(uuid.uuid4())
+    return new_id
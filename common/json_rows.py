@@ -0,0 +1,229 @@
+"""Сериализация ответов: orjson как JSON-провайдер Flask и кодирование строк
+выборки в JSON без промежуточных словарей. Переменная окружения
+JSON_BACKEND=json оставляет стандартный модуль json"""
+import json
+import logging
+import os
+import time
+from json.encoder import encode_basestring_ascii
+
+import orjson
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+USE_ORJSON = os.environ.get('JSON_BACKEND', 'orjson') == 'orjson'
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """JSON-провайдер на orjson; неизвестные orjson типы и даты
+    кодируются так же, как в стандартном провайдере Flask"""
+
+    def dumps(self, obj, **kwargs):
+        return self._dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._dumps(obj), mimetype=self.mimetype)
+
+    def _dumps(self, obj):
+        return orjson.dumps(
+            obj,
+            default=self.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        )
+
+def init_json_provider(app):
+    """orjson как JSON-провайдер приложения, если не выбран JSON_BACKEND=json"""
+    if USE_ORJSON:
+        app.json = OrjsonJSONProvider(app)
+
+def encode_json_value(value):
+    if value.__class__ is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    return json.dumps(value)
+
+def encode_json_number(value):
+    return 'null' if value is None else repr(float(value))
+
+def encode_json_raw(value):
+    """Столбец, в котором уже хранится JSON-массив"""
+    return value or '[]'
+
+def orjson_number(value):
+    return orjson.dumps(None if value is None else float(value))
+
+def orjson_raw(value):
+    return (value or '[]').encode()
+
+# Вид столбца -> (кодирование в JSON-текст, кодирование в bytes через orjson).
+# Столбцы json в обоих случаях подставляются в ответ как есть
+ROW_FIELD_KINDS = {
+    'value': (encode_json_value, orjson.dumps),
+    'number': (encode_json_number, orjson_number),
+    'json': (encode_json_raw, orjson_raw),
+}
+
+class RowEncoder:
+    """Кодировщик строк выборки в JSON без промежуточных словарей:
+    шаблон объекта с закодированными ключами собирается один раз,
+    значения подставляются по позиции столбца. С orjson каждое значение
+    кодируется им в bytes и подставляется в тот же шаблон. Служебные
+    столбцы после полей кодировщика в ответ не попадают"""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.columns = [name for name, _ in fields]
+        self.select_sql = ', '.join(self.columns)
+        self._template = '{' + ','.join(f'{encode_basestring_ascii(name)}:%s' for name in self.columns) + '}'
+        self._template_bytes = self._template.encode()
+        self._encoders = [ROW_FIELD_KINDS[kind][0] for _, kind in fields]
+        self._orjson_encoders = [ROW_FIELD_KINDS[kind][1] for _, kind in fields]
+        self._subsets = {}
+
+    def subset(self, names):
+        """Кодировщик только для полей names, в исходном порядке полей"""
+        key = frozenset(names)
+        encoder = self._subsets.get(key)
+        if encoder is None:
+            encoder = RowEncoder([field for field in self.fields if field[0] in key])
+            self._subsets[key] = encoder
+        return encoder
+
+    def encode_rows(self, rows):
+        """JSON-массив объектов (bytes) из строк выборки"""
+        if USE_ORJSON:
+            template = self._template_bytes
+            encoders = self._orjson_encoders
+            return b'[' + b','.join([
+                template % tuple([encode(value) for encode, value in zip(encoders, row)]) for row in rows
+            ]) + b']'
+
+        template = self._template
+        encoders = self._encoders
+        return ('[' + ','.join([
+            template % tuple([encode(value) for encode, value in zip(encoders, row)]) for row in rows
+        ]) + ']').encode()
+
+def json_list_response(name, encoded_rows, **extra):
+    """Ответ со списком, уже закодированным RowEncoder; остальные поля
+    data кодируются JSON-провайдером приложения"""
+    parts = [encode_basestring_ascii(name).encode() + b':' + encoded_rows]
+    parts.extend(
+        f'{encode_basestring_ascii(key)}:{current_app.json.dumps(value)}'.encode() for key, value in extra.items()
+    )
+    body = b'{"success":true,"data":{' + b','.join(parts) + b'}}'
+    return current_app.response_class(body, mimetype='application/json')
+
+def json_item_response(encoder, row):
+    """Ответ с одним объектом, закодированным RowEncoder"""
+    body = b'{"success":true,"data":' + encoder.encode_rows([row])[1:-1] + b'}'
+    return current_app.response_class(body, mimetype='application/json')
+
+def requested_fields(encoder, args):
+    """Кодировщик для параметра fields= (поля через запятую): выборка
+    сужается до этих столбцов, id возвращается всегда.
+    ValueError, если поле неизвестно"""
+    value = args.get('fields')
+    if not value:
+        return encoder
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in encoder.columns]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}. Allowed: {", ".join(encoder.columns)}')
+    return encoder.subset(['id'] + names)
+
+# Получение нескольких записей по списку id одним запросом
+MULTI_GET_MAX_IDS = 100
+
+def requested_ids(args):
+    """id из параметра ids= (через запятую) без повторов, в порядке запроса.
+    ValueError, если список пуст или длиннее MULTI_GET_MAX_IDS"""
+    ids = list(dict.fromkeys(
+        value.strip() for param in args.getlist('ids') for value in param.split(',') if value.strip()
+    ))
+    if not ids:
+        raise ValueError('ids required')
+    if len(ids) > MULTI_GET_MAX_IDS:
+        raise ValueError(f'No more than {MULTI_GET_MAX_IDS} ids per request')
+    return ids
+
+def json_multi_response(name, encoder, ids, rows, errors):
+    """Ответ с записями по id в порядке запроса. Для отсутствующих и
+    недоступных записей значение null, а код причины - в errors"""
+    encoded = {row['id']: encoder.encode_rows([row])[1:-1] for row in rows if row['id'] not in errors}
+    for record_id in ids:
+        if record_id not in encoded and record_id not in errors:
+            errors[record_id] = 'NOT_FOUND'
+
+    entries = [
+        encode_basestring_ascii(record_id).encode() + b':' + encoded.get(record_id, b'null') for record_id in ids
+    ]
+    errors = {record_id: {'code': errors[record_id]} for record_id in ids if record_id in errors}
+    body = (b'{"success":true,"data":{' + encode_basestring_ascii(name).encode() + b':{' + b','.join(entries) +
+            b'},"errors":' + current_app.json.dumps(errors).encode() + b'}}')
+    return current_app.response_class(body, mimetype='application/json')
+
+# Потоковая выдача списков (stream=1): строки читаются из курсора пачками
+# и сразу отправляются клиенту, размер списка не ограничивается
+STREAM_CHUNK_ROWS = 500
+
+class StreamDeadlineExceeded(Exception):
+    pass
+
+def wants_stream():
+    return request.args.get('stream', '').lower() in ['1', 'true', 'yes']
+
+def stream_list_response(name, encoder, conn, query, params, limit, pagination_for):
+    """Потоковый ответ со списком. Поле success идет последним: если выдача
+    прервалась, массив закрывается и вместо pagination передается error,
+    а success равен false. Соединение возвращается в пул по окончании выдачи"""
+    app = current_app._get_current_object()
+    request_id = request.headers.get('X-Request-ID', 'default')
+    deadline = getattr(request, 'deadline', None)
+
+    def generate():
+        opened = False
+        count = 0
+        last_row = None
+        has_more = False
+        try:
+            cursor = conn.execute(query, params)
+            yield b'{"data":{' + encode_basestring_ascii(name).encode() + b':['
+            opened = True
+
+            while not has_more:
+                rows = cursor.fetchmany(STREAM_CHUNK_ROWS)
+                if not rows:
+                    break
+                if deadline is not None and time.time() >= deadline:
+                    raise StreamDeadlineExceeded()
+                if limit is not None and count + len(rows) > limit:
+                    rows = rows[:limit - count]
+                    has_more = True
+                if rows:
+                    chunk = encoder.encode_rows(rows)[1:-1]
+                    yield chunk if count == 0 else b',' + chunk
+                    count += len(rows)
+                    last_row = rows[-1]
+
+            pagination = app.json.dumps(pagination_for(last_row, has_more)).encode()
+            logger.info(f"Request {request_id} - Streamed {count} {name}")
+            yield b'],"pagination":' + pagination + b'},"success":true}'
+        except Exception as e:
+            if isinstance(e, StreamDeadlineExceeded):
+                error = {'code': 'DEADLINE_EXCEEDED', 'message': 'Request deadline exceeded'}
+            else:
+                error = {'code': 'SERVER_ERROR', 'message': 'Server error'}
+            logger.error(f"Request {request_id} - Stream of {name} failed after {count} rows: {str(e)}")
+            head = b']},' if opened else b'{"data":{},'
+            yield head + b'"error":' + app.json.dumps(error).encode() + b',"success":false}'
+        finally:
+            conn.close()
+
+    return app.response_class(generate(), mimetype='application/json')
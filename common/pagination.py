@@ -0,0 +1,19 @@
+"""Непрозрачные курсоры для постраничных списков по ключу сортировки"""
+import base64
+import json
+
+def encode_cursor(values):
+    """Непрозрачный курсор из значений ключа сортировки последней строки"""
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, size):
+    """Разбор курсора; ValueError, если курсор поврежден"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
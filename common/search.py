@@ -0,0 +1,117 @@
+"""Полнотекстовый поиск на SQLite FTS5, общий для сервисов.
+
+Индекс {table}_fts хранит нормализованные тексты записей сам. Его rowid -
+ключ из таблицы {table}_search_keys (INTEGER PRIMARY KEY), которая связывает
+ключ с текстовым id записи. Неявный rowid таблиц с id TEXT PRIMARY KEY
+для этого не годится: VACUUM может его перенумеровать"""
+import re
+
+# unicode61 приводит регистр кириллицы и латиницы и убирает диакритику
+# латиницы; ё к е он не сводит, поэтому тексты для индекса и запросы
+# нормализуются отдельно
+SEARCH_TOKENIZER = 'unicode61 remove_diacritics 2'
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+SEARCH_MAX_TERMS = 10
+SEARCH_SNIPPET_TOKENS = 12
+# Каждое слово запроса ищется по префиксу, у русских слов предварительно
+# отбрасывается окончание, чтобы «трещину» находила «трещина»
+SEARCH_RUSSIAN_ENDINGS = sorted([
+    'иями', 'ями', 'ами', 'ией', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем',
+    'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ую', 'юю', 'ию', 'ых', 'их', 'ым', 'им',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й'
+], key=len, reverse=True)
+SEARCH_MIN_STEM = 4
+CYRILLIC_WORD = re.compile('[а-я]+')
+
+def search_text_sql(expr):
+    return f"replace(replace({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+def search_key_sql(table, row):
+    return f'(SELECT key FROM {table}_search_keys WHERE id = {row}.id)'
+
+def create_search_index(conn, table, columns, values_sql, source_columns=None):
+    """Индекс FTS5 {table}_fts по columns и триггеры синхронизации.
+    values_sql(row) - SQL-выражения текстов для строки row (new, old или
+    имя таблицы) в порядке columns; source_columns - столбцы таблицы,
+    изменение которых переиндексирует запись (по умолчанию columns)"""
+    column_list = ', '.join(columns)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table}_search_keys (
+            key INTEGER PRIMARY KEY,
+            id TEXT NOT NULL UNIQUE
+        )
+    ''')
+    conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5(
+            {column_list}, tokenize='{SEARCH_TOKENIZER}', prefix='2 3'
+        )
+    ''')
+    insert_new = (f'INSERT INTO {table}_fts (rowid, {column_list}) '
+                  f'VALUES ({search_key_sql(table, "new")}, {values_sql("new")});')
+    delete_old = f'DELETE FROM {table}_fts WHERE rowid = {search_key_sql(table, "old")};'
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT OR IGNORE INTO {table}_search_keys (id) VALUES (new.id);
+            {insert_new}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_delete AFTER DELETE ON {table}
+        BEGIN
+            {delete_old}
+            DELETE FROM {table}_search_keys WHERE id = old.id;
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_fts_update
+        AFTER UPDATE OF {', '.join(source_columns or columns)} ON {table}
+        BEGIN {delete_old} {insert_new} END
+    ''')
+
+    rebuild_search_index(conn, table, columns, values_sql)
+
+def rebuild_search_index(conn, table, columns, values_sql):
+    """Полное перестроение индекса по таблице"""
+    conn.execute(f'DELETE FROM {table}_fts')
+    conn.execute(f'DELETE FROM {table}_search_keys WHERE id NOT IN (SELECT id FROM {table})')
+    conn.execute(f'INSERT OR IGNORE INTO {table}_search_keys (id) SELECT id FROM {table}')
+    conn.execute(f'''
+        INSERT INTO {table}_fts (rowid, {', '.join(columns)})
+        SELECT k.key, {values_sql(table)}
+        FROM {table} JOIN {table}_search_keys k ON k.id = {table}.id
+    ''')
+
+def search_source_sql(table, alias=None):
+    """FROM для запроса поиска: индекс, ключи и сама таблица (под именем alias)"""
+    alias = alias or table
+    return (f'{table}_fts JOIN {table}_search_keys {table}_keys ON {table}_keys.key = {table}_fts.rowid '
+            f'JOIN {table} {alias} ON {alias}.id = {table}_keys.id')
+
+def search_term(word):
+    word = word.lower().replace('ё', 'е')
+    if CYRILLIC_WORD.fullmatch(word):
+        for ending in SEARCH_RUSSIAN_ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= SEARCH_MIN_STEM:
+                word = word[:-len(ending)]
+                break
+    return f'"{word}"*'
+
+def build_search_match(text):
+    """Выражение MATCH из текста запроса; ValueError, если слов нет.
+    Разделители те же, что у токенизатора unicode61"""
+    words = re.findall(r'[^\W_]+', text)[:SEARCH_MAX_TERMS]
+    if not words:
+        raise ValueError('q must contain at least one word')
+    return ' '.join(search_term(word) for word in words)
+
+def search_page(args):
+    """(page, limit) из параметров запроса; ValueError при ошибке"""
+    try:
+        page = max(int(args.get('page', 1)), 1)
+        limit = min(max(int(args.get('limit', SEARCH_DEFAULT_LIMIT)), 1), SEARCH_MAX_LIMIT)
+    except ValueError:
+        raise ValueError('page and limit must be integers')
+    return page, limit
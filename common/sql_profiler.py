@@ -0,0 +1,196 @@
+"""Профилирование SQL: время и объем работы каждого выражения, журнал
+медленных запросов с планами выполнения, сводка в /diagnostics/sql"""
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from flask import request, jsonify, has_request_context
+
+logger = logging.getLogger(__name__)
+
+SQL_SLOW_QUERY_MS = 50
+SQL_SLOW_LOG_SIZE = 100
+# Обработчик прогресса вызывается раз в SQL_PROGRESS_STEPS инструкций VM
+SQL_PROGRESS_STEPS = 100
+
+def configure_sql_profiler(app, enabled=False):
+    """Настройки профилировщика в app.config; по умолчанию выключен"""
+    app.config['SQL_PROFILING'] = enabled
+    app.config['SQL_SLOW_QUERY_MS'] = SQL_SLOW_QUERY_MS
+    app.config['SQL_SLOW_LOG_SIZE'] = SQL_SLOW_LOG_SIZE
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Курсор, учитывающий время выполнения и выборки строк
+    в записи о выражении текущего запроса"""
+    record = None
+
+    def _start(self, sql, parameters):
+        self.record = {
+            'sql': ' '.join(sql.split()),
+            'parameters': parameters,
+            'time': 0.0,
+            'rows': 0,
+            'vm_steps': 0
+        }
+        queries = getattr(request, 'sql_queries', None) if has_request_context() else None
+        if queries is not None:
+            queries.append(self.record)
+
+    def _timed(self, method, *args):
+        conn = self.connection
+        steps = conn.vm_steps
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self.record is not None:
+                self.record['time'] += time.perf_counter() - started
+                self.record['vm_steps'] += (conn.vm_steps - steps) * SQL_PROGRESS_STEPS
+
+    def _count_rows(self, rows):
+        if self.record is not None:
+            self.record['rows'] += rows
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters)
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._start(sql, None)
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        self._count_rows(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, size or self.arraysize)
+        self._count_rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._count_rows(len(rows))
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        self._count_rows(1)
+        return row
+
+class SqlProfiler:
+    """Сбор профиля SQL по запросам приложения app: заголовки X-SQL-Queries
+    и X-SQL-Time, статистика по эндпоинтам и журнал медленных запросов.
+    Регистрирует обработчики запроса и маршрут /diagnostics/sql"""
+
+    def __init__(self, app, get_db):
+        self.app = app
+        self.get_db = get_db
+        self.lock = threading.Lock()
+        self.endpoint_stats = {}
+        self.slow_queries = deque(maxlen=app.config['SQL_SLOW_LOG_SIZE'])
+
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.add_url_rule('/diagnostics/sql', 'sql_diagnostics', self.diagnostics, methods=['GET'])
+
+    def start(self):
+        if self.app.config['SQL_PROFILING']:
+            request.sql_queries = []
+
+    def explain(self, query):
+        """План выполнения выражения из журнала; None, если его не построить"""
+        if query['parameters'] is None:
+            return None
+        conn = self.get_db()
+        try:
+            return [row['detail'] for row in conn.execute(
+                f"EXPLAIN QUERY PLAN {query['sql']}", query['parameters']
+            )]
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+
+    def finish(self, response):
+        queries = getattr(request, 'sql_queries', None)
+        if queries is None:
+            return response
+        # Выражения, выполненные ниже (EXPLAIN), в профиль запроса не попадают
+        request.sql_queries = None
+
+        sql_time = sum(query['time'] for query in queries)
+        response.headers['X-SQL-Queries'] = str(len(queries))
+        response.headers['X-SQL-Time'] = f'{sql_time:.3f}'
+
+        rule = request.url_rule.rule if request.url_rule else request.path
+        endpoint = f'{request.method} {rule}'
+        slow_threshold = self.app.config['SQL_SLOW_QUERY_MS'] / 1000
+
+        with self.lock:
+            stats = self.endpoint_stats.setdefault(endpoint, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'sql_time': 0.0, 'statements': {}
+            })
+            stats['requests'] += 1
+            stats['queries'] += len(queries)
+            stats['max_queries'] = max(stats['max_queries'], len(queries))
+            stats['sql_time'] += sql_time
+            for query in queries:
+                statement = stats['statements'].setdefault(query['sql'], {
+                    'count': 0, 'time': 0.0, 'max_time': 0.0, 'rows': 0, 'vm_steps': 0
+                })
+                statement['count'] += 1
+                statement['time'] += query['time']
+                statement['max_time'] = max(statement['max_time'], query['time'])
+                statement['rows'] += query['rows']
+                statement['vm_steps'] += query['vm_steps']
+
+        for query in queries:
+            if query['time'] < slow_threshold:
+                continue
+            logger.warning(f"Slow query on {endpoint}: {query['time'] * 1000:.1f} ms, "
+                           f"{query['vm_steps']} VM steps: {query['sql']}")
+            # Параметры в журнал не попадают: в них могут быть личные данные
+            self.slow_queries.append({
+                'endpoint': endpoint,
+                'sql': query['sql'],
+                'time_ms': round(query['time'] * 1000, 3),
+                'rows': query['rows'],
+                'vm_steps': query['vm_steps'],
+                'plan': self.explain(query),
+                'timestamp': time.time()
+            })
+
+        return response
+
+    def diagnostics(self):
+        """Сводка профилировщика SQL по эндпоинтам и журнал медленных запросов"""
+        with self.lock:
+            endpoints = {}
+            for endpoint, stats in self.endpoint_stats.items():
+                statements = sorted(stats['statements'].items(), key=lambda item: item[1]['time'], reverse=True)
+                endpoints[endpoint] = {
+                    'requests': stats['requests'],
+                    'avg_queries': round(stats['queries'] / stats['requests'], 2),
+                    'max_queries': stats['max_queries'],
+                    'avg_sql_time_ms': round(stats['sql_time'] * 1000 / stats['requests'], 3),
+                    'statements': [{
+                        'sql': sql,
+                        'count': statement['count'],
+                        'total_time_ms': round(statement['time'] * 1000, 3),
+                        'max_time_ms': round(statement['max_time'] * 1000, 3),
+                        'avg_rows': round(statement['rows'] / statement['count'], 2),
+                        'avg_vm_steps': statement['vm_steps'] // statement['count']
+                    } for sql, statement in statements[:20]]
+                }
+            slow_queries = list(self.slow_queries)
+
+        return jsonify({
+            'enabled': self.app.config['SQL_PROFILING'],
+            'slow_query_ms': self.app.config['SQL_SLOW_QUERY_MS'],
+            'endpoints': endpoints,
+            'slow_queries': slow_queries
+        })
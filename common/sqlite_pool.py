@@ -0,0 +1,170 @@
+"""Пул постоянных соединений SQLite, общий для сервисов.
+
+Сервис получает соединение через get_pool(app.config['DATABASE'],
+app.config).acquire(), а close() возвращает его в пул, поэтому обработчики
+сохраняют привычный порядок get_db()/close(). Значение 'memory:<имя>' вместо
+пути - база в памяти процесса, общая для всех соединений пула."""
+import sqlite3
+import threading
+
+from common.sql_profiler import ProfiledCursor, SQL_PROGRESS_STEPS
+
+# Настройки SQLite по умолчанию: PRAGMA применяются к каждому новому
+# соединению пула. Сервис кладет их в app.config['SQLITE_PRAGMAS']
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,        # ~16 МБ кэша страниц на соединение
+    'mmap_size': 268435456,      # 256 МБ
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+SQLITE_POOL_SIZE = 8
+SQLITE_CACHED_STATEMENTS = 256
+MEMORY_DATABASE_PREFIX = 'memory:'
+
+def configure_sqlite(app, database, **pragmas):
+    """Настройки пула в app.config; database - путь к базе по умолчанию,
+    pragmas дополняют SQLITE_PRAGMAS"""
+    # Путь к базе задается на экземпляр приложения
+    app.config['DATABASE'] = database
+    app.config['SQLITE_PRAGMAS'] = dict(SQLITE_PRAGMAS, **pragmas)
+    app.config['SQLITE_POOL_SIZE'] = SQLITE_POOL_SIZE
+    app.config['SQLITE_CACHED_STATEMENTS'] = SQLITE_CACHED_STATEMENTS
+
+class PooledConnection(sqlite3.Connection):
+    """Соединение SQLite, которое при close() возвращается в пул"""
+    pool = None
+    idle = False
+    vm_steps = 0
+    profiled = False
+
+    def count_vm_steps(self):
+        self.vm_steps += 1
+        return 0
+
+    def profiled_cursor(self):
+        if not self.profiled:
+            # Обработчик прогресса считает инструкции VM - меру объема
+            # просмотренных строк и индексов
+            self.set_progress_handler(self.count_vm_steps, SQL_PROGRESS_STEPS)
+            self.profiled = True
+        return self.cursor(ProfiledCursor)
+
+    def execute(self, sql, parameters=()):
+        if self.pool is not None and self.pool.profiling:
+            return self.profiled_cursor().execute(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.pool is not None and self.pool.profiling:
+            return self.profiled_cursor().executemany(sql, seq_of_parameters)
+        return super().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self.pool is None:
+            return super().close()
+        self.pool.release(self)
+
+class ConnectionPool:
+    """Пул постоянных соединений к одной базе: кэш страниц и
+    подготовленных выражений переживает отдельные запросы. config -
+    настройки приложения, которые читаются во время работы (SQL_PROFILING)"""
+
+    def __init__(self, database, max_idle, pragmas, cached_statements, config=None):
+        self.database = database
+        self.uri = database.startswith(MEMORY_DATABASE_PREFIX)
+        if self.uri:
+            # VFS memdb: база в памяти, видимая всем соединениям процесса
+            # по одному имени, с обычными блокировками (busy_timeout работает)
+            self.database = f'file:/{database[len(MEMORY_DATABASE_PREFIX):]}?vfs=memdb'
+        self.max_idle = max_idle
+        self.pragmas = pragmas
+        self.cached_statements = cached_statements
+        self.config = config or {}
+        self._idle = []
+        self._lock = threading.Lock()
+        # База в памяти живет, пока открыто хотя бы одно соединение
+        self._keeper = self._connect() if self.uri else None
+
+    @property
+    def profiling(self):
+        return self.config.get('SQL_PROFILING', False)
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.database,
+            factory=PooledConnection,
+            check_same_thread=False,
+            cached_statements=self.cached_statements,
+            uri=self.uri
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            if self._idle:
+                conn = self._idle.pop()
+                conn.idle = False
+                return conn
+        return self._connect()
+
+    def release(self, conn):
+        if conn.idle:
+            return
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                conn.idle = True
+                self._idle.append(conn)
+                return
+        sqlite3.Connection.close(conn)
+
+    def snapshot(self):
+        """Снимок текущей базы в памяти (backup API) для быстрого восстановления"""
+        snapshot = sqlite3.connect(':memory:', check_same_thread=False)
+        conn = self.acquire()
+        try:
+            conn.backup(snapshot)
+        finally:
+            conn.close()
+        return snapshot
+
+    def restore(self, snapshot):
+        """Восстановление базы из снимка snapshot()"""
+        conn = self.acquire()
+        try:
+            snapshot.backup(conn)
+        finally:
+            conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            sqlite3.Connection.close(conn)
+
+db_pools = {}
+db_pools_lock = threading.Lock()
+
+def get_pool(database, config):
+    """Пул соединений базы database с настройками SQLITE_* из config"""
+    pool = db_pools.get(database)
+    if pool is None:
+        with db_pools_lock:
+            pool = db_pools.get(database)
+            if pool is None:
+                pool = ConnectionPool(
+                    database,
+                    config['SQLITE_POOL_SIZE'],
+                    config['SQLITE_PRAGMAS'],
+                    config['SQLITE_CACHED_STATEMENTS'],
+                    config
+                )
+                db_pools[database] = pool
+    return pool
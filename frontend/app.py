@@ -134,7 +134,7 @@ def dashboard():
         if user['role'] in ['engineer', 'manager', 'director', 'admin']:
             print("🔧 Запрос дефектов...")
             defects_response = requests.get(
-                f'{API_BASE_URL}/defects', 
+                f'{API_BASE_URL}/defects?limit=5', 
                 headers=get_auth_headers(),
                 timeout=10
             )
@@ -153,7 +153,7 @@ def dashboard():
         # Получение задач (для всех ролей, включая заказчиков)
         print("📝 Запрос задач...")
         tasks_response = requests.get(
-            f'{API_BASE_URL}/tasks', 
+            f'{API_BASE_URL}/tasks?limit=5', 
             headers=get_auth_headers(),
             timeout=10
         )
@@ -187,8 +187,7 @@ def dashboard():
                     
                     # Отладочная информация о структуре данных заказов
                     for order in orders:
-                        items = order.get('items', [])
-                        print(f"📋 Заказ {order.get('id', 'N/A')}: items type = {type(items)}, items count = {len(items) if isinstance(items, list) else 'N/A'}")
+                        print(f"📋 Заказ {order.get('id', 'N/A')}: позиций = {order.get('item_count', 0)}")
                 else:
                     print(f"⚠️  API вернул success=false для заказов: {orders_data.get('error')}")
             else:
@@ -243,10 +242,15 @@ def defects_page():
     
     print(f"🔧 Страница дефектов для: {user['name']}")
     
+    # Курсор следующей страницы
+    cursor = request.args.get('cursor', '')
+    
     defects = []
+    pagination = {}
     try:
         response = requests.get(
             f'{API_BASE_URL}/defects', 
+            params={'cursor': cursor} if cursor else None,
             headers=get_auth_headers(),
             timeout=10
         )
@@ -258,6 +262,7 @@ def defects_page():
             
             if defects_data.get('success'):
                 defects = defects_data.get('data', {}).get('defects', [])
+                pagination = defects_data.get('data', {}).get('pagination', {})
                 print(f"✅ Найдено дефектов на странице дефектов: {len(defects)}")
             else:
                 print(f"⚠️  API вернул success=false на странице дефектов: {defects_data.get('error')}")
@@ -269,7 +274,7 @@ def defects_page():
     except Exception as e:
         print(f"❌ Ошибка при загрузке дефектов: {e}")
     
-    return render_template('defects.html', user=user, defects=defects)
+    return render_template('defects.html', user=user, defects=defects, pagination=pagination)
 
 @app.route('/tasks')
 def tasks_page():
@@ -280,10 +285,15 @@ def tasks_page():
     # Задачи доступны всем ролям, включая заказчиков
     print(f"📝 Страница задач для: {user['name']}")
     
+    # Курсор следующей страницы
+    cursor = request.args.get('cursor', '')
+    
     tasks = []
+    pagination = {}
     try:
         response = requests.get(
             f'{API_BASE_URL}/tasks', 
+            params={'cursor': cursor} if cursor else None,
             headers=get_auth_headers(),
             timeout=10
         )
@@ -295,6 +305,7 @@ def tasks_page():
             
             if tasks_data.get('success'):
                 tasks = tasks_data.get('data', {}).get('tasks', [])
+                pagination = tasks_data.get('data', {}).get('pagination', {})
                 print(f"✅ Найдено задач на странице задач: {len(tasks)}")
             else:
                 print(f"⚠️  API вернул success=false на странице задач: {tasks_data.get('error')}")
@@ -306,7 +317,7 @@ def tasks_page():
     except Exception as e:
         print(f"❌ Ошибка при загрузке задач: {e}")
     
-    return render_template('tasks.html', user=user, tasks=tasks, now=datetime.now())
+    return render_template('tasks.html', user=user, tasks=tasks, pagination=pagination, now=datetime.now())
 
 @app.route('/orders')
 def orders_page():
@@ -352,8 +363,7 @@ def orders_page():
                 
                 # Отладочная информация о структуре данных
                 for order in orders:
-                    items = order.get('items', [])
-                    print(f"📋 Заказ {order.get('id', 'N/A')}: items type = {type(items)}, items count = {len(items) if isinstance(items, list) else 'N/A'}")
+                    print(f"📋 Заказ {order.get('id', 'N/A')}: позиций = {order.get('item_count', 0)}")
             else:
                 print(f"⚠️  API вернул success=false для заказов: {orders_data.get('error')}")
         else:
@@ -384,10 +394,15 @@ def reports_page():
     
     print(f"📊 Страница отчетов для: {user['name']}")
     
+    # Курсор следующей страницы
+    cursor = request.args.get('cursor', '')
+    
     reports = []
+    pagination = {}
     try:
         response = requests.get(
             f'{API_BASE_URL}/reports', 
+            params={'cursor': cursor} if cursor else None,
             headers=get_auth_headers(),
             timeout=10
         )
@@ -397,6 +412,7 @@ def reports_page():
             reports_data = response.json()
             if reports_data.get('success'):
                 reports = reports_data.get('data', {}).get('reports', [])
+                pagination = reports_data.get('data', {}).get('pagination', {})
                 print(f"✅ Найдено отчетов: {len(reports)}")
             else:
                 print(f"⚠️  API вернул success=false для отчетов: {reports_data.get('error')}")
@@ -408,7 +424,7 @@ def reports_page():
     except Exception as e:
         print(f"❌ Ошибка при загрузке отчетов: {e}")
     
-    return render_template('reports.html', user=user, reports=reports)
+    return render_template('reports.html', user=user, reports=reports, pagination=pagination)
 
 @app.route('/create_defect', methods=['POST'])
 def create_defect():
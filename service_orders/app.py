@@ -1,10 +1,32 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, stream_with_context
 import sqlite3
+import threading
+from collections import OrderedDict
 import uuid
 import logging
 from datetime import datetime
 import time
 import json
+import codecs
+import csv
+import io
+import tempfile
+import openpyxl
+
+from common.group_commit import configure_group_commit, write_runner
+from common.idempotency import init_idempotency_table, idempotency_decorator
+from common.ids import id_generator
+from common.json_rows import (
+    RowEncoder, init_json_provider, json_item_response, json_list_response, json_multi_response,
+    requested_fields, requested_ids, stream_list_response, wants_stream, StreamDeadlineExceeded
+)
+from common.pagination import encode_cursor, decode_cursor
+from common.search import (
+    SEARCH_SNIPPET_TOKENS, build_search_match, create_search_index, search_page, search_source_sql,
+    search_text_sql
+)
+from common.sql_profiler import configure_sql_profiler, SqlProfiler
+from common.sqlite_pool import configure_sqlite, get_pool
 
 app = Flask(__name__)
 DATABASE = 'orders.db'
@@ -16,10 +38,56 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Пул соединений SQLite с настройками SQLITE_PRAGMAS (common/sqlite_pool.py).
+# Путь к базе задается на экземпляр приложения в app.config['DATABASE'];
+# значение 'memory:<имя>' - база в памяти процесса.
+# Без foreign_keys SQLite не проверяет внешние ключи и не выполняет
+# ON DELETE CASCADE у позиций заказа
+configure_sqlite(app, DATABASE, foreign_keys='ON')
+
 def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_pool(app.config['DATABASE'], app.config).acquire()
+
+# Ключи идемпотентности для эндпоинтов создания
+idempotent = idempotency_decorator(get_db)
+
+# Групповая фиксация записей (common/group_commit.py), по умолчанию выключена
+configure_group_commit(app)
+run_write = write_runner(app.config)
+
+# Идентификаторы, упорядоченные по времени (UUIDv7), вместо случайных uuid4
+app.config['TIME_ORDERED_IDS'] = True
+new_id = id_generator(app.config)
+
+# Профилирование SQL (common/sql_profiler.py), по умолчанию выключено;
+# сводка доступна по /diagnostics/sql
+configure_sql_profiler(app)
+sql_profiler = SqlProfiler(app, get_db)
+
+# orjson как JSON-провайдер Flask (common/json_rows.py)
+init_json_provider(app)
+
+def parse_deadline():
+    """Чтение дедлайна запроса, выставленного API Gateway"""
+    header = request.headers.get('X-Request-Deadline')
+    if not header:
+        return None
+    try:
+        return float(header)
+    except ValueError:
+        return None
+
+def deadline_exceeded():
+    """Проверка, не истек ли дедлайн запроса (шлюз уже не ждет ответа)"""
+    deadline = getattr(request, 'deadline', None)
+    return deadline is not None and time.time() >= deadline
+
+def deadline_response(request_id):
+    logger.warning(f"Request {request_id} - Deadline exceeded, aborting {request.method} {request.path}")
+    return jsonify({
+        'success': False,
+        'error': {'code': 'DEADLINE_EXCEEDED', 'message': 'Request deadline exceeded'}
+    }), 504
 
 def log_request():
     """Логирование входящего запроса"""
@@ -34,6 +102,11 @@ def log_request():
 def before_request():
     log_request()
     request.start_time = time.time()
+    request.deadline = parse_deadline()
+    
+    # Запрос простоял в очереди дольше, чем шлюз готов был ждать
+    if deadline_exceeded():
+        return deadline_response(request.headers.get('X-Request-ID', 'default'))
 
 @app.after_request
 def after_request(response):
@@ -66,11 +139,6 @@ def init_db():
         )
     ''')
     
-    # Индексы для улучшения производительности
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_id ON orders(user_id)')
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status)')
-    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at)')
-    
     # Добавляем демо данные
     orders_count = conn.execute('SELECT COUNT(*) FROM orders').fetchone()[0]
     
@@ -96,7 +164,7 @@ def init_db():
         ]
         
         for title, description, status, total_amount, items, user_email in demo_orders:
-            order_id = str(uuid.uuid4())
+            order_id = new_id()
             # Получаем user_id по email (в реальной системе нужно получить из users service)
             user_id = str(uuid.uuid4())  # Временное решение для демо
             
@@ -107,10 +175,303 @@ def init_db():
         
         logger.info("Added demo orders")
     
+    init_idempotency_table(conn)
+    
     conn.commit()
+    
+    migrate_db(conn)
     conn.close()
 
+# Миграции схемы применяются по порядку и к новым, и к уже существующим
+# базам; номер последней примененной миграции хранится в PRAGMA user_version
+def migration_add_keyset_indexes(conn):
+    """Составные индексы под постраничный вывод по (created_at, id)
+    с фильтрами по владельцу и статусу"""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_created_at_id ON orders(created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_user_created_at ON orders(user_id, created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_orders_status_created_at ON orders(status, created_at, id)')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_orders_user_status_created_at
+        ON orders(user_id, status, created_at, id)
+    ''')
+    
+    # Одностолбцовые индексы стали префиксами составных
+    conn.execute('DROP INDEX IF EXISTS idx_orders_user_id')
+    conn.execute('DROP INDEX IF EXISTS idx_orders_status')
+    conn.execute('DROP INDEX IF EXISTS idx_orders_created_at')
+
+ORDER_ITEMS_BACKFILL_BATCH = 500
+
+def migration_add_order_items(conn):
+    """Позиции заказов в отдельной таблице с переносом состава
+    из JSON-столбца orders.items"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY,
+            order_id TEXT NOT NULL REFERENCES orders(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            product TEXT NOT NULL,
+            quantity REAL NOT NULL,
+            unit_price REAL NOT NULL,
+            line_total REAL NOT NULL,
+            created_at TIMESTAMP NOT NULL -- копия orders.created_at для выборок по периоду
+        )
+    ''')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id, position)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_order_items_product ON order_items(product, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_order_items_created_at ON order_items(created_at)')
+    
+    backfill_order_items(conn)
+
+def backfill_order_items(conn, batch_size=None):
+    """Перенос состава существующих заказов пачками по rowid,
+    чтобы не загружать всю таблицу заказов в память"""
+    batch_size = batch_size or ORDER_ITEMS_BACKFILL_BATCH
+    last_rowid = 0
+    migrated = 0
+    
+    while True:
+        batch = conn.execute('''
+            SELECT rowid, id, items, created_at FROM orders
+            WHERE rowid > ? AND NOT EXISTS (
+                SELECT 1 FROM order_items WHERE order_items.order_id = orders.id
+            )
+            ORDER BY rowid LIMIT ?
+        ''', (last_rowid, batch_size)).fetchall()
+        if not batch:
+            break
+        
+        rows = []
+        for order in batch:
+            try:
+                items = json.loads(order['items']) if order['items'] else []
+            except ValueError:
+                logger.warning(f"Order {order['id']} has malformed items, skipped in backfill")
+                continue
+            rows.extend(
+                (order['id'],) + row + (order['created_at'],)
+                for row in order_item_rows(items)
+            )
+        
+        conn.executemany('''
+            INSERT INTO order_items (order_id, position, product, quantity, unit_price, line_total, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        
+        last_rowid = batch[-1]['rowid']
+        migrated += len(batch)
+    
+    if migrated:
+        logger.info(f"Backfilled order items for {migrated} orders")
+
+def migration_add_order_summaries(conn):
+    """Сводка состава в самом заказе (число позиций, основные товары),
+    чтобы списки заказов не читали и не передавали состав целиком"""
+    columns = [row['name'] for row in conn.execute('PRAGMA table_info(orders)')]
+    if 'item_count' not in columns:
+        conn.execute('ALTER TABLE orders ADD COLUMN item_count INTEGER NOT NULL DEFAULT 0')
+    if 'top_products' not in columns:
+        conn.execute("ALTER TABLE orders ADD COLUMN top_products TEXT NOT NULL DEFAULT '[]'")
+    
+    backfill_order_summaries(conn)
+
+def backfill_order_summaries(conn, batch_size=None):
+    """Расчет сводки существующих заказов пачками по rowid"""
+    batch_size = batch_size or ORDER_ITEMS_BACKFILL_BATCH
+    last_rowid = 0
+    
+    while True:
+        batch = conn.execute(
+            'SELECT rowid, id, items FROM orders WHERE rowid > ? ORDER BY rowid LIMIT ?',
+            (last_rowid, batch_size)
+        ).fetchall()
+        if not batch:
+            break
+        
+        updates = []
+        for order in batch:
+            try:
+                items = json.loads(order['items']) if order['items'] else []
+            except ValueError:
+                continue
+            updates.append(order_summary(order_item_rows(items)) + (order['id'],))
+        
+        conn.executemany('UPDATE orders SET item_count = ?, top_products = ? WHERE id = ?', updates)
+        last_rowid = batch[-1]['rowid']
+
+# Полнотекстовый поиск по заказам: индекс FTS5 по названию, описанию и
+# товарам из состава (common/search.py). Товары берутся из JSON в столбце
+# items, поэтому индекс переиндексирует заказ и при изменении состава
+SEARCH_COLUMNS = ['title', 'description', 'products']
+
+def search_values_sql(row):
+    products = (f"(SELECT group_concat(json_extract(value, '$.product'), ' ') FROM json_each("
+                f"CASE WHEN json_valid({row}.items) THEN {row}.items ELSE '[]' END) WHERE type = 'object')")
+    return ', '.join(search_text_sql(expr) for expr in [f'{row}.title', f'{row}.description', products])
+
+def migration_add_search_index(conn):
+    """Индекс FTS5 по заказам и триггеры синхронизации"""
+    create_search_index(conn, 'orders', SEARCH_COLUMNS, search_values_sql,
+                        source_columns=['title', 'description', 'items'])
+
+SCHEMA_MIGRATIONS = [
+    (1, migration_add_keyset_indexes),
+    (2, migration_add_order_items),
+    (3, migration_add_order_summaries),
+    (4, migration_add_search_index),
+]
+
+def migrate_db(conn):
+    """Применение недостающих миграций, каждая в своей транзакции"""
+    current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    applied = False
+    
+    for version, migration in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        logger.info(f"Applying schema migration {version}: {migration.__name__}")
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied = True
+    
+    if applied:
+        # Обновляем статистику планировщика для новых индексов
+        conn.execute('ANALYZE')
+        conn.commit()
+
 # Вспомогательные функции
+ORDERS_DEFAULT_LIMIT = 10
+ORDERS_MAX_LIMIT = 100
+ORDERS_COUNT_CACHE_TTL = 30
+ORDERS_COUNT_CACHE_MAX_ENTRIES = 1024
+
+# Кэш количества заказов по фильтру: точный COUNT(*) только по запросу.
+# Ключ включает пользователя и фильтры, поэтому размер кэша ограничен:
+# при переполнении вытесняются давно не использованные записи (LRU)
+orders_count_cache = OrderedDict()
+orders_count_cache_lock = threading.Lock()
+
+def count_orders(conn, where_sql, params, exact=False):
+    """Количество заказов по фильтру: точное или из кэша с коротким TTL"""
+    key = (where_sql, tuple(params))
+    now = time.time()
+    if not exact:
+        with orders_count_cache_lock:
+            cached = orders_count_cache.get(key)
+            if cached and cached[1] > now:
+                orders_count_cache.move_to_end(key)
+                return cached[0]
+            if cached:
+                del orders_count_cache[key]
+    
+    total = conn.execute(f'SELECT COUNT(*) FROM orders{where_sql}', params).fetchone()[0]
+    with orders_count_cache_lock:
+        orders_count_cache[key] = (total, now + ORDERS_COUNT_CACHE_TTL)
+        orders_count_cache.move_to_end(key)
+        while len(orders_count_cache) > ORDERS_COUNT_CACHE_MAX_ENTRIES:
+            orders_count_cache.popitem(last=False)
+    return total
+
+def orders_pagination(page, limit, total_count, exact_total, last_row, has_more):
+    """Блок pagination списка заказов; last_row - последняя выданная строка"""
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([last_row['sort_key'], last_row['id']])
+    
+    return {
+        'page': page,
+        'limit': limit,
+        'total': total_count,
+        'total_exact': exact_total,
+        'pages': (total_count + limit - 1) // limit if limit else 1,
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }
+
+def invalidate_orders_count_cache():
+    with orders_count_cache_lock:
+        orders_count_cache.clear()
+
+def order_item_rows(items):
+    """Позиции заказа в виде (position, product, quantity, unit_price, line_total)"""
+    rows = []
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or not all(key in item for key in ['product', 'quantity', 'unit_price']):
+            continue
+        quantity = item['quantity']
+        unit_price = item['unit_price']
+        rows.append((position, item['product'], quantity, unit_price, quantity * unit_price))
+    return rows
+
+# Сколько товаров с наибольшей суммой попадает в сводку заказа
+ORDER_SUMMARY_TOP_PRODUCTS = 3
+
+def order_summary(item_rows):
+    """Сводка по позициям order_item_rows(): (item_count, top_products),
+    top_products - JSON-массив названий товаров по убыванию суммы"""
+    totals = {}
+    for _, product, _, _, line_total in item_rows:
+        totals[product] = totals.get(product, 0) + line_total
+    top_products = sorted(totals, key=lambda product: totals[product], reverse=True)
+    return len(item_rows), json.dumps(top_products[:ORDER_SUMMARY_TOP_PRODUCTS], ensure_ascii=False)
+
+# Позиция заказа: (position, product, quantity, unit_price, line_total, order_id)
+INSERT_ORDER_ITEM_SQL = '''
+    INSERT INTO order_items (order_id, position, product, quantity, unit_price, line_total, created_at)
+    SELECT id, ?, ?, ?, ?, ?, created_at FROM orders WHERE id = ?
+'''
+
+def replace_order_items(conn, order_id, items):
+    """Замена позиций заказа и их сводки в транзакции вызывающего кода"""
+    item_rows = order_item_rows(items)
+    conn.execute('DELETE FROM order_items WHERE order_id = ?', (order_id,))
+    conn.executemany(INSERT_ORDER_ITEM_SQL, [row + (order_id,) for row in item_rows])
+    conn.execute(
+        'UPDATE orders SET item_count = ?, top_products = ? WHERE id = ?',
+        order_summary(item_rows) + (order_id,)
+    )
+
+# Поля заказа в карточке в порядке столбцов выборки; состав заказа
+# хранится в JSON и вставляется в ответ без разбора
+ORDER_ROW_ENCODER = RowEncoder([
+    ('id', 'value'),
+    ('title', 'value'),
+    ('description', 'value'),
+    ('status', 'value'),
+    ('total_amount', 'number'),
+    ('item_count', 'value'),
+    ('top_products', 'json'),
+    ('items', 'json'),
+    ('user_id', 'value'),
+    ('created_at', 'value'),
+    ('updated_at', 'value')
+])
+
+# В списке по умолчанию - сводка без состава; состав отдается по include=items
+# или при явном указании в fields=
+ORDER_SUMMARY_ENCODER = ORDER_ROW_ENCODER.subset(
+    [name for name in ORDER_ROW_ENCODER.columns if name != 'items']
+)
+ORDER_LIST_INCLUDES = ['items']
+
+def order_list_encoder(args):
+    """Кодировщик полей списка заказов; ValueError при неизвестных полях"""
+    include = [name.strip() for name in args.get('include', '').split(',') if name.strip()]
+    unknown = [name for name in include if name not in ORDER_LIST_INCLUDES]
+    if unknown:
+        raise ValueError(f'Unknown include: {", ".join(unknown)}. Allowed: {", ".join(ORDER_LIST_INCLUDES)}')
+    
+    encoder = requested_fields(ORDER_ROW_ENCODER, args)
+    if encoder is ORDER_ROW_ENCODER and 'items' not in include:
+        return ORDER_SUMMARY_ENCODER
+    return encoder
+
 def has_permission(user_role, required_roles):
     """Проверка прав доступа"""
     return user_role in required_roles
@@ -121,6 +482,7 @@ def can_modify_order(order_user_id, current_user_id, user_role):
 
 # Эндпоинты для заказов
 @app.route('/v1/orders', methods=['POST'])
+@idempotent
 def create_order():
     request_id = request.headers.get('X-Request-ID', 'default')
     user_id = request.headers.get('X-User-ID', 'anonymous')
@@ -157,16 +519,17 @@ def create_order():
         # Расчет общей суммы
         total_amount = sum(item['quantity'] * item['unit_price'] for item in items)
         
-        order_id = str(uuid.uuid4())
+        order_id = new_id()
         
-        conn = get_db()
-        conn.execute('''
-            INSERT INTO orders (id, user_id, title, description, total_amount, items)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (order_id, user_id, title, description, total_amount, json.dumps(items)))
-        conn.commit()
-        conn.close()
+        def insert_order(conn):
+            conn.execute('''
+                INSERT INTO orders (id, user_id, title, description, total_amount, items)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (order_id, user_id, title, description, total_amount, json.dumps(items)))
+            replace_order_items(conn, order_id, items)
+        run_write(insert_order)
         
+        invalidate_orders_count_cache()
         logger.info(f"Request {request_id} - Order created: {order_id}")
         
         return jsonify({
@@ -185,6 +548,489 @@ def create_order():
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+# Пакетный импорт заказов: тело (NDJSON или JSON-массив) читается и
+# проверяется по одному заказу, заказы записываются пачками по
+# BULK_ORDERS_BATCH в одной транзакции. Ответ отправляется после чтения
+# всего тела: иначе клиент, который сначала отправляет тело целиком,
+# и сервис блокируются на заполненных буферах сокетов. В памяти не больше
+# одной пачки
+BULK_ORDERS_BATCH = 100
+BULK_READ_CHUNK = 64 * 1024
+BULK_ORDER_MAX_BYTES = 1024 * 1024
+NDJSON_MIMETYPES = ['application/x-ndjson', 'application/ndjson', 'application/jsonl']
+# Результаты импорта копятся до конца чтения тела (сверх этого размера - на диске)
+BULK_RESULTS_SPOOL_BYTES = 1024 * 1024
+
+class BulkInputError(ValueError):
+    """Тело запроса нельзя разобрать дальше"""
+
+def iter_ndjson(stream):
+    """Пары (заказ, ошибка) по строкам NDJSON; пустые строки пропускаются"""
+    while True:
+        line = stream.readline(BULK_ORDER_MAX_BYTES + 1)
+        if not line:
+            return
+        if len(line) > BULK_ORDER_MAX_BYTES and not line.endswith(b'\n'):
+            raise BulkInputError(f'Line exceeds {BULK_ORDER_MAX_BYTES} bytes')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), None
+        except ValueError:
+            yield None, 'Malformed JSON line'
+
+def iter_json_array(stream):
+    """Пары (заказ, None) по элементам JSON-массива; тело читается
+    блоками, в буфере не больше одного элемента"""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    eof = False
+    state = 'start'
+    
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n':
+            position += 1
+        
+        if position < len(buffer):
+            char = buffer[position]
+            if state == 'start':
+                if char != '[':
+                    raise BulkInputError('JSON array expected')
+                position += 1
+                state = 'first'
+                continue
+            if state == 'separator':
+                if char == ']':
+                    return
+                if char != ',':
+                    raise BulkInputError('Malformed JSON array')
+                position += 1
+                state = 'value'
+                continue
+            if state == 'first' and char == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                end = None
+            # Значение у конца буфера может продолжаться в следующем блоке
+            if end is not None and (end < len(buffer) or eof):
+                yield value, None
+                position = end
+                state = 'separator'
+                continue
+        
+        if eof:
+            raise BulkInputError('Malformed JSON array')
+        if len(buffer) - position > BULK_ORDER_MAX_BYTES:
+            raise BulkInputError(f'Order exceeds {BULK_ORDER_MAX_BYTES} bytes')
+        chunk = stream.read(BULK_READ_CHUNK)
+        eof = not chunk
+        try:
+            buffer = buffer[position:] + utf8.decode(chunk, final=eof)
+        except UnicodeDecodeError:
+            raise BulkInputError('Body must be UTF-8')
+        position = 0
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def bulk_order(data, user_id):
+    """Проверка заказа из пакета за один проход по позициям.
+    Возвращает (строка orders, позиции); ValueError при ошибке"""
+    if not isinstance(data, dict):
+        raise ValueError('Order must be a JSON object')
+    title = data.get('title')
+    if not title or not isinstance(title, str):
+        raise ValueError('Title required')
+    description = data.get('description') or ''
+    if not isinstance(description, str):
+        raise ValueError('description must be a string')
+    items = data.get('items')
+    if not items or not isinstance(items, list):
+        raise ValueError('Items must be a non-empty array')
+    
+    item_rows = []
+    total_amount = 0
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('product') or not isinstance(item['product'], str):
+            raise ValueError(f'Item {position}: product required')
+        quantity = item.get('quantity')
+        unit_price = item.get('unit_price')
+        if not is_number(quantity) or not is_number(unit_price) or quantity <= 0 or unit_price < 0:
+            raise ValueError(f'Item {position}: quantity must be positive and unit_price non-negative')
+        line_total = quantity * unit_price
+        total_amount += line_total
+        item_rows.append((position, item['product'], quantity, unit_price, line_total))
+    
+    item_count, top_products = order_summary(item_rows)
+    order_row = (new_id(), user_id, title, description, total_amount, json.dumps(items), item_count, top_products)
+    return order_row, item_rows
+
+def insert_orders_batch(conn, orders):
+    conn.executemany('''
+        INSERT INTO orders (id, user_id, title, description, total_amount, items, item_count, top_products)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [order_row for order_row, _ in orders])
+    conn.executemany(INSERT_ORDER_ITEM_SQL, [
+        item_row + (order_row[0],) for order_row, item_rows in orders for item_row in item_rows
+    ])
+
+def drain_request_body(deadline):
+    """Дочитывание тела запроса, прерванного ошибкой, чтобы клиент,
+    еще отправляющий тело, дошел до чтения ответа"""
+    while deadline is None or time.time() < deadline:
+        if not request.stream.read(BULK_READ_CHUNK):
+            return
+
+@app.route('/v1/orders/bulk', methods=['POST'])
+def create_orders_bulk():
+    """Импорт заказов. Пачки фиксируются по мере чтения тела, а ответ
+    (results, затем summary) отправляется только после того, как тело
+    прочитано целиком: клиент (и шлюз) читает ответ лишь после отправки
+    всего тела, и непрочитанные результаты остановили бы обе стороны.
+    success идет последним и равен false, если импорт прерван
+    (зафиксированные до этого пачки остаются)"""
+    request_id = request.headers.get('X-Request-ID', 'default')
+    user_id = request.headers.get('X-User-ID', 'anonymous')
+    deadline = getattr(request, 'deadline', None)
+    ndjson = request.mimetype in NDJSON_MIMETYPES
+    entries = iter_ndjson(request.stream) if ndjson else iter_json_array(request.stream)
+    logger.info(f"Request {request_id} - Bulk order import by user {user_id} ({request.mimetype})")
+    
+    def generate():
+        summary = {'total': 0, 'created': 0, 'failed': 0}
+        output = tempfile.SpooledTemporaryFile(max_size=BULK_RESULTS_SPOOL_BYTES)
+        orders = []
+        results = []
+        error = None
+        
+        def flush():
+            if orders:
+                run_write(lambda conn: insert_orders_batch(conn, orders))
+                invalidate_orders_count_cache()
+            summary['created'] += len(orders)
+            summary['failed'] += len(results) - len(orders)
+            chunk = b','.join(app.json.dumps(result).encode() for result in results)
+            output.write(chunk if output.tell() == 0 else b',' + chunk)
+            orders.clear()
+            results.clear()
+        
+        try:
+            for index, (data, entry_error) in enumerate(entries):
+                summary['total'] += 1
+                if entry_error is None:
+                    try:
+                        order_row, item_rows = bulk_order(data, user_id)
+                        orders.append((order_row, item_rows))
+                        results.append({'index': index, 'status': 'created', 'order_id': order_row[0],
+                                        'total_amount': order_row[4]})
+                    except ValueError as e:
+                        entry_error = str(e)
+                if entry_error is not None:
+                    results.append({'index': index, 'status': 'error',
+                                    'error': {'code': 'VALIDATION_ERROR', 'message': entry_error}})
+                
+                if len(results) >= BULK_ORDERS_BATCH:
+                    if deadline is not None and time.time() >= deadline:
+                        raise StreamDeadlineExceeded()
+                    flush()
+            
+            if results:
+                flush()
+            logger.info(f"Request {request_id} - Bulk import: {summary}")
+        except Exception as e:
+            if isinstance(e, StreamDeadlineExceeded):
+                error = {'code': 'DEADLINE_EXCEEDED', 'message': 'Request deadline exceeded'}
+            elif isinstance(e, BulkInputError):
+                error = {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            else:
+                error = {'code': 'SERVER_ERROR', 'message': 'Server error'}
+            # Незафиксированная пачка в summary не попадает
+            summary['total'] -= len(results)
+            logger.error(f"Request {request_id} - Bulk import stopped after {summary}: {str(e)}")
+            try:
+                drain_request_body(deadline)
+            except Exception:
+                pass
+        
+        try:
+            yield b'{"data":{"results":['
+            output.seek(0)
+            while True:
+                chunk = output.read(BULK_READ_CHUNK)
+                if not chunk:
+                    break
+                yield chunk
+            if error is None:
+                yield b'],"summary":' + app.json.dumps(summary).encode() + b'},"success":true}'
+            else:
+                yield (b'],"summary":' + app.json.dumps(summary).encode() + b'},"error":' +
+                       app.json.dumps(error).encode() + b',"success":false}')
+        finally:
+            output.close()
+    
+    return app.response_class(stream_with_context(generate()), mimetype='application/json')
+
+# Выгрузка заказов в CSV/XLSX прямо из курсора: строки читаются пачками
+# и сразу уходят клиенту, память не зависит от размера выгрузки
+EXPORT_FORMATS = ['csv', 'xlsx']
+EXPORT_CHUNK_ROWS = 500
+EXPORT_ORDER_COLUMNS = ['id', 'title', 'description', 'status', 'total_amount', 'item_count',
+                        'user_id', 'created_at', 'updated_at']
+EXPORT_ITEM_COLUMNS = ['position', 'product', 'quantity', 'unit_price', 'line_total']
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Ячейки, которые табличный редактор принял бы за формулу, выводятся с апострофом
+EXPORT_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+EXPORT_ERROR_MARKER = '#ERROR'
+
+def export_cell(value):
+    if isinstance(value, str) and value.startswith(EXPORT_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def export_row(row):
+    return [export_cell(value) for value in row]
+
+def export_query(args, user_id, user_role):
+    """Запрос выгрузки по фильтрам status (через запятую), from/to (created_at,
+    to не включительно), user_id и expand=items - строка на каждую позицию.
+    Возвращает (sql, params, columns); ValueError при ошибке в параметрах"""
+    expand = args.get('expand', '')
+    if expand not in ['', 'items']:
+        raise ValueError('expand must be items')
+    
+    conditions = []
+    params = []
+    
+    status = args.get('status')
+    if status:
+        statuses = status.split(',')
+        conditions.append(f'o.status IN ({", ".join("?" for _ in statuses)})')
+        params.extend(statuses)
+    
+    # Не руководители выгружают только свои заказы
+    if user_role not in ['manager', 'admin']:
+        conditions.append('o.user_id = ?')
+        params.append(user_id)
+    elif args.get('user_id'):
+        conditions.append('o.user_id = ?')
+        params.append(args['user_id'])
+    
+    date_from = args.get('from')
+    if date_from:
+        conditions.append('o.created_at >= ?')
+        params.append(date_from)
+    date_to = args.get('to')
+    if date_to:
+        conditions.append('o.created_at < ?')
+        params.append(date_to)
+    
+    where_sql = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+    select = [f'o.{column}' for column in EXPORT_ORDER_COLUMNS]
+    columns = list(EXPORT_ORDER_COLUMNS)
+    from_sql = 'orders o'
+    order_sql = 'o.created_at, o.id'
+    if expand:
+        select += [f'oi.{column}' for column in EXPORT_ITEM_COLUMNS]
+        columns += EXPORT_ITEM_COLUMNS
+        from_sql += ' LEFT JOIN order_items oi ON oi.order_id = o.id'
+        order_sql += ', oi.position'
+    
+    return f'SELECT {", ".join(select)} FROM {from_sql}{where_sql} ORDER BY {order_sql}', params, columns
+
+def export_batches(conn, query, params):
+    """Строки выгрузки пачками; соединение возвращается в пул в конце"""
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_ROWS)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+def csv_export(columns, batches, deadline, request_id):
+    """CSV отдается по мере чтения курсора. Если выдача прервалась (дедлайн,
+    ошибка базы), последней строкой идет маркер #ERROR с кодом ошибки"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл файл в UTF-8
+    buffer.write('\ufeff')
+    writer.writerow(columns)
+    count = 0
+    try:
+        for rows in batches:
+            if deadline is not None and time.time() >= deadline:
+                raise StreamDeadlineExceeded()
+            writer.writerows(export_row(row) for row in rows)
+            count += len(rows)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    except Exception as e:
+        if isinstance(e, StreamDeadlineExceeded):
+            error = ['DEADLINE_EXCEEDED', 'Request deadline exceeded']
+        else:
+            error = ['SERVER_ERROR', 'Server error']
+        logger.error(f"Request {request_id} - CSV export failed after {count} rows: {str(e)}")
+        writer.writerow([EXPORT_ERROR_MARKER] + error)
+    finally:
+        batches.close()
+    yield buffer.getvalue().encode()
+
+def xlsx_export(columns, batches, deadline):
+    """XLSX собирается в режиме write_only: строки сразу пишутся во временный
+    файл листа, а книга сохраняется во временный файл на диске, так что память
+    не зависит от размера выгрузки. ZIP нельзя отдать до конца сборки, поэтому
+    книга строится до ответа и ошибки возвращаются обычным статусом.
+    Возвращает открытый временный файл, установленный на начало"""
+    file = tempfile.TemporaryFile()
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('orders')
+    try:
+        sheet.append(columns)
+        for rows in batches:
+            if deadline is not None and time.time() >= deadline:
+                raise StreamDeadlineExceeded()
+            for row in rows:
+                sheet.append(export_row(row))
+        workbook.save(file)
+        file.seek(0)
+        return file
+    except Exception:
+        # Лист закрывается, чтобы openpyxl дописал и освободил свой временный файл
+        sheet.close()
+        file.close()
+        raise
+    finally:
+        batches.close()
+
+def file_chunks(file):
+    with file:
+        for chunk in iter(lambda: file.read(BULK_READ_CHUNK), b''):
+            yield chunk
+
+@app.route('/v1/orders/export', methods=['GET'])
+def export_orders():
+    request_id = request.headers.get('X-Request-ID', 'default')
+    user_id = request.headers.get('X-User-ID', 'anonymous')
+    user_role = request.headers.get('X-User-Role', 'unknown')
+    
+    try:
+        export_format = request.args.get('format', 'csv').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': f'format must be one of: {EXPORT_FORMATS}'}
+            }), 400
+        
+        try:
+            query, params, columns = export_query(request.args, user_id, user_role)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            }), 400
+        
+        conn = get_db()
+        batches = export_batches(conn, query, params)
+        filename = f"orders-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+        logger.info(f"Request {request_id} - Exporting orders as {export_format} for user {user_id}")
+        
+        if export_format == 'xlsx':
+            try:
+                body = file_chunks(xlsx_export(columns, batches, getattr(request, 'deadline', None)))
+            except StreamDeadlineExceeded:
+                return deadline_response(request_id)
+            content_type = XLSX_MIMETYPE
+        else:
+            body = csv_export(columns, batches, getattr(request, 'deadline', None), request_id)
+            content_type = 'text/csv; charset=utf-8'
+        return app.response_class(body, content_type=content_type, headers={
+            'Content-Disposition': f'attachment; filename="{filename}"'
+        })
+        
+    except Exception as e:
+        logger.error(f"Request {request_id} - Export orders error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
+# Поиск по заказам: ранжирование по bm25, совпадение в названии весит
+# больше, чем в товарах и описании. Пользователи без роли менеджера
+# находят только свои заказы
+SEARCH_WEIGHTS = '5.0, 1.0, 2.0'
+
+@app.route('/v1/orders/search', methods=['GET'])
+def search_orders():
+    request_id = request.headers.get('X-Request-ID', 'default')
+    user_id = request.headers.get('X-User-ID', 'anonymous')
+    user_role = request.headers.get('X-User-Role', 'unknown')
+    
+    try:
+        if deadline_exceeded():
+            return deadline_response(request_id)
+        
+        try:
+            match = build_search_match(request.args.get('q', ''))
+            page, limit = search_page(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            }), 400
+        
+        conditions = ['orders_fts MATCH ?']
+        params = [match]
+        if user_role not in ['manager', 'admin']:
+            conditions.append('o.user_id = ?')
+            params.append(user_id)
+        if request.args.get('status'):
+            conditions.append('o.status = ?')
+            params.append(request.args['status'])
+        params.extend([limit + 1, (page - 1) * limit])
+        
+        conn = get_db()
+        rows = conn.execute(f'''
+            SELECT o.id, o.title, o.status, o.total_amount, o.item_count, o.created_at,
+                   snippet(orders_fts, -1, '[', ']', '…', {SEARCH_SNIPPET_TOKENS}) AS snippet,
+                   -bm25(orders_fts, {SEARCH_WEIGHTS}) AS score
+            FROM {search_source_sql('orders', 'o')}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY score DESC, o.id LIMIT ? OFFSET ?
+        ''', params).fetchall()
+        conn.close()
+        
+        has_more = len(rows) > limit
+        results = []
+        for row in rows[:limit]:
+            result = dict(row)
+            result['total_amount'] = float(row['total_amount'] or 0)
+            result['score'] = round(row['score'], 4)
+            results.append(result)
+        
+        logger.info(f"Request {request_id} - Order search returned {len(results)} results")
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'orders': results,
+                'pagination': {'page': page, 'limit': limit, 'has_more': has_more}
+            }
+        })
+        
+    except Exception as e:
+        logger.error(f"Request {request_id} - Order search error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
 @app.route('/v1/orders', methods=['GET'])
 def get_orders():
     request_id = request.headers.get('X-Request-ID', 'default')
@@ -192,81 +1038,230 @@ def get_orders():
     user_role = request.headers.get('X-User-Role', 'unknown')
     
     try:
-        # Параметры пагинации
-        page = int(request.args.get('page', 1))
-        limit = int(request.args.get('limit', 10))
-        status_filter = request.args.get('status', '')
+        # Параметры пагинации: cursor - постранично по ключу (created_at, id),
+        # page - прежний режим со смещением. В потоковом режиме limit
+        # не ограничен и по умолчанию отсутствует
+        stream = wants_stream()
+        try:
+            encoder = order_list_encoder(request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            }), 400
         
-        offset = (page - 1) * limit
+        try:
+            page = int(request.args.get('page', 1))
+            limit = None
+            if 'limit' in request.args or not stream:
+                limit = int(request.args.get('limit', ORDERS_DEFAULT_LIMIT))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor, 2) if cursor else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': 'Invalid pagination parameters'}
+            }), 400
         
-        conn = get_db()
+        page = max(page, 1)
+        if limit is not None:
+            limit = max(limit, 1) if stream else min(max(limit, 1), ORDERS_MAX_LIMIT)
+        status_filter = request.args.get('status', '')
+        exact_total = request.args.get('total') == 'exact'
         
-        # Базовый запрос
-        query = 'SELECT * FROM orders'
-        count_query = 'SELECT COUNT(*) FROM orders'
+        conditions = []
         params = []
         
         # Фильтрация по пользователю (если не админ/менеджер)
         if user_role not in ['manager', 'admin']:
-            query += ' WHERE user_id = ?'
-            count_query += ' WHERE user_id = ?'
+            conditions.append('user_id = ?')
             params.append(user_id)
         
         # Фильтрация по статусу
         if status_filter:
-            if 'WHERE' in query:
-                query += ' AND status = ?'
-                count_query += ' AND status = ?'
-            else:
-                query += ' WHERE status = ?'
-                count_query += ' WHERE status = ?'
+            conditions.append('status = ?')
             params.append(status_filter)
         
-        # Сортировка и пагинация
-        query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-        params.extend([limit, offset])
+        where_sql = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+        
+        page_conditions = list(conditions)
+        page_params = list(params)
+        if after:
+            page_conditions.append('(created_at, id) < (?, ?)')
+            page_params.extend(after)
+        page_where_sql = f' WHERE {" AND ".join(page_conditions)}' if page_conditions else ''
+        
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        query = (f'SELECT {encoder.select_sql}, created_at AS sort_key FROM orders{page_where_sql} '
+                 'ORDER BY created_at DESC, id DESC LIMIT ?')
+        page_params.append(limit + 1 if limit is not None else -1)
+        if not after and page > 1 and limit is not None:
+            query += ' OFFSET ?'
+            page_params.append((page - 1) * limit)
+        
+        conn = get_db()
+        
+        if stream:
+            total_count = count_orders(conn, where_sql, params, exact=exact_total)
+            
+            def pagination_for(last_row, has_more):
+                return orders_pagination(page, limit, total_count, exact_total, last_row, has_more)
+            
+            return stream_list_response('orders', encoder, conn, query, page_params, limit,
+                                        pagination_for)
         
         # Получаем заказы
-        orders = conn.execute(query, params).fetchall()
+        orders = conn.execute(query, page_params).fetchall()
+        
+        if deadline_exceeded():
+            conn.close()
+            return deadline_response(request_id)
+        
+        # Общее количество: из кэша, если не запрошено точное значение
+        total_count = count_orders(conn, where_sql, params, exact=exact_total)
+        
+        conn.close()
+        
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+        
+        logger.info(f"Request {request_id} - Sent {len(orders)} orders")
+        
+        pagination = orders_pagination(page, limit, total_count, exact_total,
+                                       orders[-1] if orders else None, has_more)
+        return json_list_response('orders', encoder.encode_rows(orders), pagination=pagination)
         
-        # Получаем общее количество для пагинации
-        count_params = params[:-2]  # Убираем LIMIT и OFFSET
-        total_count = conn.execute(count_query, count_params).fetchone()[0]
+    except Exception as e:
+        logger.error(f"Request {request_id} - Get orders error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
+@app.route('/v1/orders/analytics/products', methods=['GET'])
+def get_product_analytics():
+    """Сводка по товарам: количество, сумма и число заказов за период"""
+    request_id = request.headers.get('X-Request-ID', 'default')
+    user_id = request.headers.get('X-User-ID', 'anonymous')
+    user_role = request.headers.get('X-User-Role', 'unknown')
+    
+    try:
+        try:
+            limit = int(request.args.get('limit', ORDERS_MAX_LIMIT))
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': 'limit must be an integer'}
+            }), 400
+        limit = min(max(limit, 1), ORDERS_MAX_LIMIT)
+        
+        conditions = []
+        params = []
+        
+        # Без фильтра по статусу отмененные заказы не учитываются
+        status_filter = request.args.get('status', '')
+        if status_filter:
+            conditions.append('o.status = ?')
+            params.append(status_filter)
+        else:
+            conditions.append("o.status != 'cancelled'")
+        
+        # Фильтрация по пользователю (если не админ/менеджер)
+        if user_role not in ['manager', 'admin']:
+            conditions.append('o.user_id = ?')
+            params.append(user_id)
+        
+        product = request.args.get('product')
+        if product:
+            conditions.append('oi.product = ?')
+            params.append(product)
+        
+        # Период: from включительно, to - не включительно
+        date_from = request.args.get('from')
+        if date_from:
+            conditions.append('oi.created_at >= ?')
+            params.append(date_from)
+        date_to = request.args.get('to')
+        if date_to:
+            conditions.append('oi.created_at < ?')
+            params.append(date_to)
+        
+        params.append(limit)
         
+        conn = get_db()
+        rows = conn.execute(f'''
+            SELECT oi.product,
+                   SUM(oi.quantity) AS quantity,
+                   SUM(oi.line_total) AS amount,
+                   COUNT(DISTINCT oi.order_id) AS orders_count,
+                   MIN(oi.unit_price) AS min_unit_price,
+                   MAX(oi.unit_price) AS max_unit_price
+            FROM order_items oi
+            JOIN orders o ON o.id = oi.order_id
+            WHERE {" AND ".join(conditions)}
+            GROUP BY oi.product
+            ORDER BY amount DESC
+            LIMIT ?
+        ''', params).fetchall()
         conn.close()
         
-        # Преобразуем в словари
-        orders_list = []
-        for order in orders:
-            orders_list.append({
-                'id': order['id'],
-                'title': order['title'],
-                'description': order['description'],
-                'status': order['status'],
-                'total_amount': float(order['total_amount']),
-                'items': json.loads(order['items']) if order['items'] else [],
-                'user_id': order['user_id'],
-                'created_at': order['created_at'],
-                'updated_at': order['updated_at']
-            })
-        
-        logger.info(f"Request {request_id} - Sent {len(orders_list)} orders")
+        products = [{
+            'product': row['product'],
+            'quantity': row['quantity'],
+            'amount': float(row['amount']),
+            'orders_count': row['orders_count'],
+            'min_unit_price': row['min_unit_price'],
+            'max_unit_price': row['max_unit_price']
+        } for row in rows]
+        
+        logger.info(f"Request {request_id} - Product analytics for {len(products)} products")
         
         return jsonify({
             'success': True,
-            'data': {
-                'orders': orders_list,
-                'pagination': {
-                    'page': page,
-                    'limit': limit,
-                    'total': total_count,
-                    'pages': (total_count + limit - 1) // limit
-                }
-            }
+            'data': {'products': products}
         })
+    
+    except Exception as e:
+        logger.error(f"Request {request_id} - Product analytics error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
+@app.route('/v1/orders/batch', methods=['GET'])
+def get_orders_batch():
+    request_id = request.headers.get('X-Request-ID', 'default')
+    user_id = request.headers.get('X-User-ID', 'anonymous')
+    user_role = request.headers.get('X-User-Role', 'unknown')
+    
+    try:
+        try:
+            ids = requested_ids(request.args)
+            encoder = requested_fields(ORDER_ROW_ENCODER, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            }), 400
+        
+        conn = get_db()
+        orders = conn.execute(
+            f'SELECT {encoder.select_sql}, user_id AS owner_id FROM orders '
+            f'WHERE id IN ({", ".join("?" for _ in ids)})', ids
+        ).fetchall()
+        conn.close()
+        
+        # Проверка прав доступа сразу для всех найденных заказов
+        errors = {}
+        if user_role not in ['manager', 'admin']:
+            errors = {order['id']: 'FORBIDDEN' for order in orders if order['owner_id'] != user_id}
+        
+        logger.info(f"Request {request_id} - Retrieved {len(orders) - len(errors)} of {len(ids)} orders")
+        
+        return json_multi_response('orders', encoder, ids, orders, errors)
         
     except Exception as e:
-        logger.error(f"Request {request_id} - Get orders error: {str(e)}")
+        logger.error(f"Request {request_id} - Multi-get orders error: {str(e)}")
         return jsonify({
             'success': False,
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
@@ -279,9 +1274,17 @@ def get_order(order_id):
     user_role = request.headers.get('X-User-Role', 'unknown')
     
     try:
+        try:
+            encoder = requested_fields(ORDER_ROW_ENCODER, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            }), 400
+        
         conn = get_db()
         order = conn.execute(
-            'SELECT * FROM orders WHERE id = ?', (order_id,)
+            f'SELECT {encoder.select_sql}, user_id AS owner_id FROM orders WHERE id = ?', (order_id,)
         ).fetchone()
         conn.close()
         
@@ -292,30 +1295,15 @@ def get_order(order_id):
             }), 404
         
         # Проверка прав доступа
-        if order['user_id'] != user_id and user_role not in ['manager', 'admin']:
+        if order['owner_id'] != user_id and user_role not in ['manager', 'admin']:
             return jsonify({
                 'success': False,
                 'error': {'code': 'FORBIDDEN', 'message': 'Access denied'}
             }), 403
         
-        order_data = {
-            'id': order['id'],
-            'title': order['title'],
-            'description': order['description'],
-            'status': order['status'],
-            'total_amount': float(order['total_amount']),
-            'items': json.loads(order['items']) if order['items'] else [],
-            'user_id': order['user_id'],
-            'created_at': order['created_at'],
-            'updated_at': order['updated_at']
-        }
-        
         logger.info(f"Request {request_id} - Order retrieved: {order_id}")
         
-        return jsonify({
-            'success': True,
-            'data': order_data
-        })
+        return json_item_response(encoder, order)
         
     except Exception as e:
         logger.error(f"Request {request_id} - Get order error: {str(e)}")
@@ -394,10 +1382,13 @@ def update_order(order_id):
             query = f'UPDATE orders SET {", ".join(updates)} WHERE id = ?'
             params.append(order_id)
             conn.execute(query, params)
+            if items:
+                replace_order_items(conn, order_id, items)
         
         conn.commit()
         conn.close()
         
+        invalidate_orders_count_cache()
         logger.info(f"Request {request_id} - Order updated: {order_id}")
         
         return jsonify({
@@ -457,6 +1448,7 @@ def cancel_order(order_id):
         conn.commit()
         conn.close()
         
+        invalidate_orders_count_cache()
         logger.info(f"Request {request_id} - Order cancelled: {order_id}")
         
         return jsonify({
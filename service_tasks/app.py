@@ -2,9 +2,24 @@ from flask import Flask, request, jsonify
 import sqlite3
 import uuid
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 import time
 
+from common.group_commit import configure_group_commit, write_runner
+from common.idempotency import init_idempotency_table, idempotency_decorator
+from common.ids import id_generator
+from common.json_rows import (
+    RowEncoder, init_json_provider, json_item_response, json_list_response, json_multi_response,
+    requested_fields, requested_ids, stream_list_response, wants_stream
+)
+from common.pagination import encode_cursor, decode_cursor
+from common.search import (
+    SEARCH_SNIPPET_TOKENS, build_search_match, create_search_index, search_page, search_source_sql,
+    search_text_sql
+)
+from common.sql_profiler import configure_sql_profiler, SqlProfiler
+from common.sqlite_pool import configure_sqlite, get_pool
+
 app = Flask(__name__)
 DATABASE = 'tasks.db'
 
@@ -15,10 +30,54 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Пул соединений SQLite с настройками SQLITE_PRAGMAS (common/sqlite_pool.py).
+# Путь к базе задается на экземпляр приложения в app.config['DATABASE'];
+# значение 'memory:<имя>' - база в памяти процесса
+configure_sqlite(app, DATABASE)
+
 def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_pool(app.config['DATABASE'], app.config).acquire()
+
+# Ключи идемпотентности для эндпоинтов создания
+idempotent = idempotency_decorator(get_db)
+
+# Групповая фиксация записей (common/group_commit.py), по умолчанию выключена
+configure_group_commit(app)
+run_write = write_runner(app.config)
+
+# Идентификаторы, упорядоченные по времени (UUIDv7), вместо случайных uuid4
+app.config['TIME_ORDERED_IDS'] = True
+new_id = id_generator(app.config)
+
+# Профилирование SQL (common/sql_profiler.py), по умолчанию выключено;
+# сводка доступна по /diagnostics/sql
+configure_sql_profiler(app)
+sql_profiler = SqlProfiler(app, get_db)
+
+# orjson как JSON-провайдер Flask (common/json_rows.py)
+init_json_provider(app)
+
+def parse_deadline():
+    """Чтение дедлайна запроса, выставленного API Gateway"""
+    header = request.headers.get('X-Request-Deadline')
+    if not header:
+        return None
+    try:
+        return float(header)
+    except ValueError:
+        return None
+
+def deadline_exceeded():
+    """Проверка, не истек ли дедлайн запроса (шлюз уже не ждет ответа)"""
+    deadline = getattr(request, 'deadline', None)
+    return deadline is not None and time.time() >= deadline
+
+def deadline_response(request_id):
+    logger.warning(f"Request {request_id} - Deadline exceeded, aborting {request.method} {request.path}")
+    return jsonify({
+        'success': False,
+        'error': {'code': 'DEADLINE_EXCEEDED', 'message': 'Request deadline exceeded'}
+    }), 504
 
 def log_request():
     """Логирование входящего запроса с трассировкой"""
@@ -34,6 +93,11 @@ def before_request():
     # Логируем начало обработки запроса
     log_request()
     request.start_time = time.time()
+    request.deadline = parse_deadline()
+    
+    # Запрос простоял в очереди дольше, чем шлюз готов был ждать
+    if deadline_exceeded():
+        return deadline_response(request.headers.get('X-Request-ID', 'default'))
 
 @app.after_request
 def after_request(response):
@@ -92,7 +156,8 @@ def init_db():
             content TEXT,
             created_by TEXT NOT NULL,
             report_type TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
@@ -112,7 +177,7 @@ def init_db():
         ]
         
         for title, description, severity, status, reported_by in demo_defects:
-            defect_id = str(uuid.uuid4())
+            defect_id = new_id()
             conn.execute('''
                 INSERT INTO defects (id, title, description, severity, status, reported_by)
                 VALUES (?, ?, ?, ?, ?, ?)
@@ -130,7 +195,7 @@ def init_db():
         ]
         
         for title, description, status, priority, assigned_to, due_date in demo_tasks:
-            task_id = str(uuid.uuid4())
+            task_id = new_id()
             conn.execute('''
                 INSERT INTO tasks (id, title, description, status, priority, assigned_to, due_date, created_by)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
@@ -152,18 +217,769 @@ def init_db():
         ]
         
         for title, content, report_type, created_by in demo_reports:
-            report_id = str(uuid.uuid4())
+            report_id = new_id()
             conn.execute('''
                 INSERT INTO reports (id, title, content, report_type, created_by)
                 VALUES (?, ?, ?, ?, ?)
             ''', (report_id, title, content, report_type, created_by))
         logger.info("Added demo reports")
     
+    init_idempotency_table(conn)
+    
     conn.commit()
+    
+    migrate_db(conn)
     conn.close()
 
+# Миграции схемы применяются по порядку и к новым, и к уже существующим
+# базам; номер последней примененной миграции хранится в PRAGMA user_version
+def migration_add_query_indexes(conn):
+    """Индексы под сортировку списков и подсчеты в статистике"""
+    # Списки отсортированы по created_at DESC
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_created_at ON defects(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_created_at ON reports(created_at)')
+    
+    # Подсчеты по статусу/приоритету/критичности и списки с таким фильтром
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_status ON defects(status, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_severity ON defects(severity, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_priority ON tasks(priority, created_at)')
+    
+    # Частичные индексы: открытые дефекты и незавершенные задачи по сроку
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_defects_open_created_at
+        ON defects(created_at) WHERE status = 'open'
+    ''')
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_tasks_open_due_date
+        ON tasks(due_date) WHERE status != 'completed'
+    ''')
+
+# Счетчики статистики поддерживаются триггерами: /v1/statistics читает
+# маленькую таблицу stat_counters вместо подсчетов по tasks и defects.
+# Для незавершенных задач хранится гистограмма по due_date, из которой
+# число просроченных получается суммой по датам раньше сегодняшней.
+STAT_COUNTER_DIMENSIONS = {
+    'tasks': ['status', 'priority'],
+    'defects': ['status', 'severity'],
+}
+
+def stat_counter_delta_sql(entity, dimension, value_expr, delta, condition='1'):
+    return f'''
+        INSERT INTO stat_counters (entity, dimension, value, count)
+        SELECT '{entity}', '{dimension}', {value_expr}, {delta} WHERE {condition}
+        ON CONFLICT (entity, dimension, value) DO UPDATE SET count = count + excluded.count;
+    '''
+
+def stat_counter_row_sql(entity, row, delta):
+    """Изменения счетчиков при появлении (delta=1) или исчезновении (delta=-1) строки"""
+    statements = [stat_counter_delta_sql(entity, 'total', "''", delta)]
+    for column in STAT_COUNTER_DIMENSIONS[entity]:
+        statements.append(stat_counter_delta_sql(entity, column, f"IFNULL({row}.{column}, '')", delta))
+    if entity == 'tasks':
+        statements.append(stat_counter_delta_sql(
+            entity, 'open_due_date', f'{row}.due_date', delta,
+            f"{row}.due_date IS NOT NULL AND {row}.status != 'completed'"
+        ))
+    return ''.join(statements)
+
+def rebuild_stat_counters(conn):
+    """Полный пересчет счетчиков по таблицам"""
+    conn.execute('DELETE FROM stat_counters')
+    for entity, columns in STAT_COUNTER_DIMENSIONS.items():
+        conn.execute(f'''
+            INSERT INTO stat_counters (entity, dimension, value, count)
+            SELECT '{entity}', 'total', '', COUNT(*) FROM {entity}
+        ''')
+        for column in columns:
+            conn.execute(f'''
+                INSERT INTO stat_counters (entity, dimension, value, count)
+                SELECT '{entity}', '{column}', IFNULL({column}, ''), COUNT(*)
+                FROM {entity} GROUP BY IFNULL({column}, '')
+            ''')
+    conn.execute('''
+        INSERT INTO stat_counters (entity, dimension, value, count)
+        SELECT 'tasks', 'open_due_date', due_date, COUNT(*) FROM tasks
+        WHERE due_date IS NOT NULL AND status != 'completed'
+        GROUP BY due_date
+    ''')
+
+def migration_add_stat_counters(conn):
+    """Таблица счетчиков статистики и триггеры, поддерживающие ее актуальной"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stat_counters (
+            entity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (entity, dimension, value)
+        ) WITHOUT ROWID
+    ''')
+    
+    for entity, columns in STAT_COUNTER_DIMENSIONS.items():
+        watched = columns + (['due_date'] if entity == 'tasks' else [])
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{entity}_stat_insert AFTER INSERT ON {entity}
+            BEGIN {stat_counter_row_sql(entity, 'new', 1)} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{entity}_stat_delete AFTER DELETE ON {entity}
+            BEGIN {stat_counter_row_sql(entity, 'old', -1)} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{entity}_stat_update
+            AFTER UPDATE OF {', '.join(watched)} ON {entity}
+            BEGIN {stat_counter_row_sql(entity, 'old', -1)} {stat_counter_row_sql(entity, 'new', 1)} END
+        ''')
+    
+    rebuild_stat_counters(conn)
+
+def read_statistics(conn):
+    """Статистика из таблицы счетчиков одним запросом"""
+    counters = {}
+    overdue = 0
+    for row in conn.execute('''
+        SELECT entity, dimension, value, count, value < DATE('now') AS is_past
+        FROM stat_counters
+    '''):
+        if row['dimension'] == 'open_due_date':
+            overdue += row['count'] if row['is_past'] else 0
+        else:
+            counters[(row['entity'], row['dimension'], row['value'])] = row['count']
+    
+    return {
+        'tasks_total': counters.get(('tasks', 'total', ''), 0),
+        'defects_total': counters.get(('defects', 'total', ''), 0),
+        'defects_open': counters.get(('defects', 'status', 'open'), 0),
+        'tasks_completed': counters.get(('tasks', 'status', 'completed'), 0),
+        'tasks_high_priority': counters.get(('tasks', 'priority', 'high'), 0),
+        'tasks_overdue': overdue,
+        'defects_high_severity': counters.get(('defects', 'severity', 'high'), 0)
+    }
+
+def scan_statistics(conn):
+    """Та же статистика одним проходом по каждой таблице (для сверки счетчиков)"""
+    tasks = conn.execute('''
+        SELECT COUNT(*) AS total,
+               IFNULL(SUM(status = 'completed'), 0) AS completed,
+               IFNULL(SUM(priority = 'high'), 0) AS high_priority,
+               IFNULL(SUM(due_date < DATE('now') AND status != 'completed'), 0) AS overdue
+        FROM tasks
+    ''').fetchone()
+    defects = conn.execute('''
+        SELECT COUNT(*) AS total,
+               IFNULL(SUM(status = 'open'), 0) AS open,
+               IFNULL(SUM(severity = 'high'), 0) AS high_severity
+        FROM defects
+    ''').fetchone()
+    
+    return {
+        'tasks_total': tasks['total'],
+        'defects_total': defects['total'],
+        'defects_open': defects['open'],
+        'tasks_completed': tasks['completed'],
+        'tasks_high_priority': tasks['high_priority'],
+        'tasks_overdue': tasks['overdue'],
+        'defects_high_severity': defects['high_severity']
+    }
+
+def migration_add_keyset_list_indexes(conn):
+    """Индексы под постраничные списки: ключ сортировки дополнен id,
+    добавлены индексы для фильтров по исполнителю и автору"""
+    rebuilt_indexes = {
+        'idx_defects_created_at': 'defects(created_at, id)',
+        'idx_tasks_created_at': 'tasks(created_at, id)',
+        'idx_reports_created_at': 'reports(created_at, id)',
+        'idx_defects_status': 'defects(status, created_at, id)',
+        'idx_defects_severity': 'defects(severity, created_at, id)',
+        'idx_tasks_status': 'tasks(status, created_at, id)',
+        'idx_tasks_priority': 'tasks(priority, created_at, id)',
+    }
+    for name, definition in rebuilt_indexes.items():
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+        conn.execute(f'CREATE INDEX {name} ON {definition}')
+    
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to ON tasks(assigned_to, created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_assigned_to ON defects(assigned_to, created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_defects_reported_by ON defects(reported_by, created_at, id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_reports_type ON reports(report_type, created_at, id)')
+
+# Полнотекстовый поиск: индексы FTS5 по заголовкам и текстам, триггеры
+# поддерживают их при вставке, изменении и удалении строк (common/search.py)
+SEARCH_INDEXES = {
+    'tasks': ['title', 'description'],
+    'defects': ['title', 'description'],
+    'reports': ['title', 'content'],
+}
+
+def search_values_sql(table):
+    return lambda row: ', '.join(search_text_sql(f'{row}.{column}') for column in SEARCH_INDEXES[table])
+
+def migration_add_search_index(conn):
+    """Индексы FTS5 по заголовкам и текстам задач, дефектов и отчетов"""
+    for table, columns in SEARCH_INDEXES.items():
+        create_search_index(conn, table, columns, search_values_sql(table))
+
+# Лента изменений: клиенты забирают строки, измененные после их последней
+# синхронизации, по индексу (updated_at, id). Время изменения пишется
+# с миллисекундами, чтобы порядок изменений внутри секунды сохранялся.
+# Удаленные строки оставляют надгробия, которые хранятся TOMBSTONE_RETENTION_DAYS
+CHANGE_TIME_SQL = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+CHANGE_FEED_TABLES = ['defects', 'tasks', 'reports']
+TOMBSTONE_RETENTION_DAYS = 30
+# Запас на транзакции, начатые до чтения ленты и зафиксированные после него:
+# позиция надгробий без новых удалений сдвигается к моменту чтения минус запас
+CHANGE_FEED_SAFETY_MARGIN = 60
+
+def migration_add_change_feed(conn):
+    """updated_at у отчетов, индексы по времени изменения и надгробия удаленных строк"""
+    columns = [row['name'] for row in conn.execute('PRAGMA table_info(reports)')]
+    if 'updated_at' not in columns:
+        # ALTER TABLE не допускает DEFAULT CURRENT_TIMESTAMP, время
+        # изменения отчетов задается при каждой записи
+        conn.execute('ALTER TABLE reports ADD COLUMN updated_at TIMESTAMP')
+    conn.execute('UPDATE reports SET updated_at = created_at WHERE updated_at IS NULL')
+    
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tombstones (
+            entity TEXT NOT NULL,
+            id TEXT NOT NULL,
+            deleted_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (entity, id)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_tombstones_deleted_at ON tombstones(entity, deleted_at, id)')
+    
+    for table in CHANGE_FEED_TABLES:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table}(updated_at, id)')
+        # Вместе с новым надгробием удаляются надгробия старше срока хранения
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_tombstone AFTER DELETE ON {table}
+            BEGIN
+                INSERT OR REPLACE INTO tombstones (entity, id, deleted_at)
+                VALUES ('{table}', old.id, {CHANGE_TIME_SQL});
+                DELETE FROM tombstones WHERE entity = '{table}'
+                    AND deleted_at < datetime('now', '-{TOMBSTONE_RETENTION_DAYS} days');
+            END
+        ''')
+
+SCHEMA_MIGRATIONS = [
+    (1, migration_add_query_indexes),
+    (2, migration_add_stat_counters),
+    (3, migration_add_keyset_list_indexes),
+    (4, migration_add_search_index),
+    (5, migration_add_change_feed),
+]
+
+def migrate_db(conn):
+    """Применение недостающих миграций, каждая в своей транзакции"""
+    current_version = conn.execute('PRAGMA user_version').fetchone()[0]
+    applied = False
+    
+    for version, migration in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        logger.info(f"Applying schema migration {version}: {migration.__name__}")
+        conn.execute('BEGIN')
+        try:
+            migration(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied = True
+    
+    if applied:
+        # Обновляем статистику планировщика для новых индексов
+        conn.execute('ANALYZE')
+        conn.commit()
+
+# Поля элементов списков в порядке столбцов выборки
+ROW_ENCODERS = {
+    'defects': RowEncoder([
+        ('id', 'value'),
+        ('title', 'value'),
+        ('description', 'value'),
+        ('severity', 'value'),
+        ('status', 'value'),
+        ('reported_by', 'value'),
+        ('assigned_to', 'value'),
+        ('created_at', 'value'),
+        ('updated_at', 'value')
+    ]),
+    'tasks': RowEncoder([
+        ('id', 'value'),
+        ('title', 'value'),
+        ('description', 'value'),
+        ('status', 'value'),
+        ('priority', 'value'),
+        ('assigned_to', 'value'),
+        ('created_at', 'value'),
+        ('due_date', 'value'),
+        ('updated_at', 'value')
+    ]),
+    'reports': RowEncoder([
+        ('id', 'value'),
+        ('title', 'value'),
+        ('content', 'value'),
+        ('report_type', 'value'),
+        ('created_at', 'value'),
+        ('updated_at', 'value')
+    ]),
+}
+
+# Поля карточек (GET по id): поля списка и автор записи
+DETAIL_ENCODERS = {
+    'defects': ROW_ENCODERS['defects'],
+    'tasks': RowEncoder(ROW_ENCODERS['tasks'].fields + [('created_by', 'value')]),
+    'reports': RowEncoder(ROW_ENCODERS['reports'].fields + [('created_by', 'value')]),
+}
+
+# Постраничные списки с фильтрами и сортировкой
+LIST_DEFAULT_LIMIT = 50
+LIST_MAX_LIMIT = 200
+
+# Фильтры на равенство (несколько значений через запятую)
+LIST_FILTERS = {
+    'defects': ['status', 'severity', 'assigned_to', 'reported_by'],
+    'tasks': ['status', 'priority', 'assigned_to', 'created_by'],
+    'reports': ['report_type', 'created_by'],
+}
+
+# Фильтры по диапазону: параметр -> (столбец, оператор)
+LIST_RANGE_FILTERS = {
+    'defects': {
+        'created_from': ('created_at', '>='),
+        'created_to': ('created_at', '<='),
+    },
+    'tasks': {
+        'created_from': ('created_at', '>='),
+        'created_to': ('created_at', '<='),
+        'due_from': ('due_date', '>='),
+        'due_to': ('due_date', '<='),
+    },
+    'reports': {
+        'created_from': ('created_at', '>='),
+        'created_to': ('created_at', '<='),
+    },
+}
+
+# Допустимые поля сортировки; для столбцов с NULL сортируем по IFNULL
+LIST_SORT_FIELDS = {
+    'defects': {'created_at': 'created_at', 'updated_at': 'updated_at', 'title': 'title'},
+    'tasks': {
+        'created_at': 'created_at',
+        'updated_at': 'updated_at',
+        'due_date': "IFNULL(due_date, '')",
+        'title': 'title',
+    },
+    'reports': {'created_at': 'created_at', 'updated_at': 'updated_at', 'title': 'title'},
+}
+
+def build_list_query(table, args, stream=False):
+    """Запрос страницы списка по параметрам запроса.
+    Возвращает (sql, params, limit, sort_field, encoder), где encoder - кодировщик
+    полей fields=; ValueError при ошибке в параметрах.
+    В потоковом режиме limit не ограничен и по умолчанию отсутствует (None)"""
+    encoder = requested_fields(ROW_ENCODERS[table], args)
+    
+    try:
+        limit = int(args.get('limit', LIST_DEFAULT_LIMIT)) if 'limit' in args or not stream else None
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    if limit is not None:
+        limit = max(limit, 1) if stream else min(max(limit, 1), LIST_MAX_LIMIT)
+    
+    sort_field = args.get('sort', 'created_at')
+    if sort_field not in LIST_SORT_FIELDS[table]:
+        raise ValueError(f'sort must be one of: {list(LIST_SORT_FIELDS[table])}')
+    sort_expr = LIST_SORT_FIELDS[table][sort_field]
+    
+    order = args.get('order', 'desc').lower()
+    if order not in ['asc', 'desc']:
+        raise ValueError('order must be asc or desc')
+    
+    conditions = []
+    params = []
+    
+    for column in LIST_FILTERS[table]:
+        value = args.get(column)
+        if value:
+            values = value.split(',')
+            conditions.append(f'{column} IN ({", ".join("?" for _ in values)})')
+            params.extend(values)
+    
+    for param, (column, operator) in LIST_RANGE_FILTERS[table].items():
+        value = args.get(param)
+        if value:
+            conditions.append(f'{column} {operator} ?')
+            params.append(value)
+    
+    cursor = args.get('cursor')
+    if cursor:
+        conditions.append(f'({sort_expr}, id) {"<" if order == "desc" else ">"} (?, ?)')
+        params.extend(decode_cursor(cursor, 2))
+    
+    where_sql = f' WHERE {" AND ".join(conditions)}' if conditions else ''
+    direction = order.upper()
+    sql = (f'SELECT {encoder.select_sql}, {sort_expr} AS sort_key FROM {table}{where_sql} '
+           f'ORDER BY {sort_expr} {direction}, id {direction} LIMIT ?')
+    # На одну строку больше, чтобы узнать, есть ли следующая страница
+    params.append(limit + 1 if limit is not None else -1)
+    
+    return sql, params, limit, sort_field, encoder
+
+def list_pagination(last_row, has_more, limit, sort_field):
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor([last_row['sort_key'], last_row['id']])
+    
+    return {
+        'limit': limit,
+        'sort': sort_field,
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    }
+
+def paginate_rows(rows, limit, sort_field):
+    """Отрезает лишнюю строку и строит блок pagination для ответа"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, list_pagination(rows[-1] if rows else None, has_more, limit, sort_field)
+
+def stream_entity_list(table, encoder, conn, query, params, limit, sort_field):
+    return stream_list_response(
+        table, encoder, conn, query, params, limit,
+        lambda last_row, has_more: list_pagination(last_row, has_more, limit, sort_field)
+    )
+
+# Режим ленты изменений списков (updated_since или change_token): строки,
+# измененные после точки синхронизации, по возрастанию времени изменения,
+# и id удаленных строк. change_token из ответа - точка следующего запроса
+CHANGE_FEED_PARAMS = ['updated_since', 'change_token']
+CHANGE_FEED_ALLOWED_PARAMS = CHANGE_FEED_PARAMS + ['limit', 'fields']
+
+def wants_changes():
+    return any(param in request.args for param in CHANGE_FEED_PARAMS)
+
+def parse_updated_since(value):
+    """Время в формате ISO 8601 (UTC, без смещения) как строка для сравнения с updated_at"""
+    value = value.strip().rstrip('Z').replace('T', ' ')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError('updated_since must be an ISO 8601 time')
+    if parsed.tzinfo is not None:
+        raise ValueError('updated_since must be in UTC without offset')
+    return value
+
+def list_changes(table):
+    """Изменения table после точки синхронизации: пачка измененных строк
+    и пачка надгробий, каждая по ключу (время, id) после своей позиции"""
+    request_id = request.headers.get('X-Request-ID', 'default')
+    
+    try:
+        unknown = [param for param in request.args if param not in CHANGE_FEED_ALLOWED_PARAMS]
+        if unknown:
+            raise ValueError(f'{", ".join(unknown)} cannot be combined with updated_since or change_token')
+        encoder = requested_fields(ROW_ENCODERS[table], request.args)
+        try:
+            limit = min(max(int(request.args.get('limit', LIST_DEFAULT_LIMIT)), 1), LIST_MAX_LIMIT)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        
+        if request.args.get('change_token'):
+            position = decode_cursor(request.args['change_token'], 4)
+        elif request.args.get('updated_since'):
+            since = parse_updated_since(request.args['updated_since'])
+            position = [since, '', since, '']
+        else:
+            raise ValueError('updated_since or change_token is required')
+    except ValueError as e:
+        return list_params_error(str(e))
+    
+    # Надгробия старше срока хранения уже удалены: клиент должен заново загрузить список
+    retention_start = (datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    if str(position[2]) < retention_start:
+        return jsonify({
+            'success': False,
+            'error': {'code': 'CHANGE_TOKEN_EXPIRED', 'message': 'Sync point is too old, reload the full list'}
+        }), 410
+    
+    read_at = datetime.utcnow()
+    conn = get_db()
+    try:
+        rows = conn.execute(
+            f'SELECT {encoder.select_sql}, updated_at AS change_time FROM {table} '
+            'WHERE (updated_at, id) > (?, ?) ORDER BY updated_at, id LIMIT ?',
+            (position[0], position[1], limit + 1)
+        ).fetchall()
+        tombstones = conn.execute(
+            'SELECT id, deleted_at FROM tombstones WHERE entity = ? AND (deleted_at, id) > (?, ?) '
+            'ORDER BY deleted_at, id LIMIT ?',
+            (table, position[2], position[3], limit + 1)
+        ).fetchall()
+    finally:
+        conn.close()
+    
+    has_more = len(rows) > limit or len(tombstones) > limit
+    tombstones_exhausted = len(tombstones) <= limit
+    rows = rows[:limit]
+    tombstones = tombstones[:limit]
+    if rows:
+        position[0:2] = [rows[-1]['change_time'], rows[-1]['id']]
+    if tombstones:
+        position[2:4] = [tombstones[-1]['deleted_at'], tombstones[-1]['id']]
+    if tombstones_exhausted:
+        # Все надгробия до момента чтения выданы: позиция не должна устаревать
+        # у клиента, который синхронизируется регулярно, но не видит удалений
+        safe_point = [(read_at - timedelta(seconds=CHANGE_FEED_SAFETY_MARGIN)).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3], '']
+        position[2:4] = max([str(position[2]), str(position[3])], safe_point)
+    
+    logger.info(f"Request {request_id} - Sent {len(rows)} changed and {len(tombstones)} deleted {table}")
+    
+    return json_list_response(
+        table, encoder.encode_rows(rows),
+        deleted=[{'id': row['id'], 'deleted_at': row['deleted_at']} for row in tombstones],
+        pagination={'limit': limit, 'has_more': has_more, 'change_token': encode_cursor(position)}
+    )
+
+def list_params_error(message):
+    return jsonify({
+        'success': False,
+        'error': {'code': 'VALIDATION_ERROR', 'message': message}
+    }), 400
+
+def multi_get(table):
+    """Записи table по списку ids= одним запросом по первичному ключу"""
+    request_id = request.headers.get('X-Request-ID', 'default')
+    
+    try:
+        try:
+            ids = requested_ids(request.args)
+            encoder = requested_fields(DETAIL_ENCODERS[table], request.args)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
+        conn = get_db()
+        rows = conn.execute(
+            f'SELECT {encoder.select_sql} FROM {table} WHERE id IN ({", ".join("?" for _ in ids)})', ids
+        ).fetchall()
+        conn.close()
+        
+        logger.info(f"Request {request_id} - Retrieved {len(rows)} of {len(ids)} {table}")
+        
+        return json_multi_response(table, encoder, ids, rows, {})
+        
+    except Exception as e:
+        logger.error(f"Request {request_id} - Multi-get {table} error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
+# Пакетное создание и изменение: все элементы проверяются заранее, затем
+# записываются через executemany в одной транзакции. Режим atomic не
+# применяет ничего при ошибке хотя бы в одном элементе, best_effort
+# применяет корректные элементы и возвращает ошибки остальных
+BULK_MAX_ITEMS = 500
+BULK_MODES = ['atomic', 'best_effort']
+
+# Поля создания и их значения по умолчанию (title обязателен)
+BULK_CREATE_FIELDS = {
+    'defects': {'title': None, 'description': '', 'severity': 'medium'},
+    'tasks': {'title': None, 'description': '', 'priority': 'medium', 'assigned_to': '', 'due_date': ''},
+}
+BULK_AUTHOR_COLUMNS = {'defects': 'reported_by', 'tasks': 'created_by'}
+
+# Поля изменения: (имя, можно ли задать пустую строку) - как в PUT по id
+BULK_UPDATE_FIELDS = {
+    'defects': [('title', False), ('description', True), ('severity', False),
+                ('status', False), ('assigned_to', True)],
+    'tasks': [('title', False), ('description', True), ('status', False),
+              ('priority', False), ('assigned_to', True), ('due_date', True)],
+}
+
+class BulkAborted(Exception):
+    """Отмена транзакции пакета в режиме atomic"""
+
+def bulk_request(data):
+    """(mode, items) из тела пакетного запроса; ValueError при ошибке"""
+    if not isinstance(data, dict):
+        raise ValueError('JSON object required')
+    mode = data.get('mode', 'atomic')
+    if mode not in BULK_MODES:
+        raise ValueError(f'mode must be one of: {BULK_MODES}')
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError('items must be a non-empty list')
+    if len(items) > BULK_MAX_ITEMS:
+        raise ValueError(f'No more than {BULK_MAX_ITEMS} items per request')
+    return mode, items
+
+def bulk_item_error(index, code, message, record_id=None):
+    return {'index': index, 'id': record_id, 'status': 'error', 'error': {'code': code, 'message': message}}
+
+def bulk_string_error(item, names):
+    """Сообщение об ошибке, если одно из полей names задано не строкой"""
+    for name in names:
+        if item.get(name) is not None and not isinstance(item[name], str):
+            return f'{name} must be a string'
+    return None
+
+def bulk_response(mode, results, status_code):
+    failed = sum(result['status'] == 'error' for result in results)
+    aborted = mode == 'atomic' and failed > 0
+    if aborted:
+        # Ничего не применено: корректные элементы помечаются пропущенными
+        for result in results:
+            if result['status'] != 'error':
+                result['status'] = 'skipped'
+    
+    body = {
+        'success': not aborted,
+        'data': {
+            'mode': mode,
+            'total': len(results),
+            'succeeded': 0 if aborted else len(results) - failed,
+            'failed': failed,
+            'results': results
+        }
+    }
+    if aborted:
+        body['error'] = {'code': 'VALIDATION_ERROR', 'message': f'{failed} items failed, nothing was applied'}
+        status_code = 400
+    return jsonify(body), status_code
+
+def bulk_create(table):
+    request_id = request.headers.get('X-Request-ID', 'default')
+    user_id = request.headers.get('X-User-ID', 'anonymous')
+    
+    try:
+        try:
+            mode, items = bulk_request(request.get_json(silent=True))
+        except ValueError as e:
+            return list_params_error(str(e))
+        
+        fields = BULK_CREATE_FIELDS[table]
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict) or not item.get('title'):
+                results.append(bulk_item_error(index, 'VALIDATION_ERROR', 'Title required'))
+                continue
+            message = bulk_string_error(item, fields)
+            if message:
+                results.append(bulk_item_error(index, 'VALIDATION_ERROR', message))
+                continue
+            
+            record_id = new_id()
+            rows.append((record_id,) + tuple(
+                item.get(name) if item.get(name) is not None else default for name, default in fields.items()
+            ) + (user_id,))
+            results.append({'index': index, 'id': record_id, 'status': 'created'})
+        
+        if rows and (mode == 'best_effort' or len(rows) == len(items)):
+            columns = ['id'] + list(fields) + [BULK_AUTHOR_COLUMNS[table]]
+            run_write(lambda conn: conn.executemany(
+                f'INSERT INTO {table} ({", ".join(columns)}, updated_at) '
+                f'VALUES ({", ".join("?" for _ in columns)}, {CHANGE_TIME_SQL})', rows
+            ))
+        
+        logger.info(f"Request {request_id} - Bulk created {len(rows)} of {len(items)} {table} ({mode})")
+        
+        return bulk_response(mode, results, 201 if len(rows) == len(items) else 200)
+        
+    except Exception as e:
+        logger.error(f"Request {request_id} - Bulk create {table} error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
+def bulk_update(table):
+    request_id = request.headers.get('X-Request-ID', 'default')
+    
+    try:
+        try:
+            mode, items = bulk_request(request.get_json(silent=True))
+        except ValueError as e:
+            return list_params_error(str(e))
+        
+        fields = BULK_UPDATE_FIELDS[table]
+        results = [None] * len(items)
+        updates = []
+        seen = set()
+        for index, item in enumerate(items):
+            record_id = item.get('id') if isinstance(item, dict) else None
+            if not isinstance(record_id, str) or not record_id:
+                results[index] = bulk_item_error(index, 'VALIDATION_ERROR', 'id required')
+                continue
+            if record_id in seen:
+                results[index] = bulk_item_error(index, 'VALIDATION_ERROR', 'Duplicate id in batch', record_id)
+                continue
+            seen.add(record_id)
+            message = bulk_string_error(item, [name for name, _ in fields])
+            if message:
+                results[index] = bulk_item_error(index, 'VALIDATION_ERROR', message, record_id)
+                continue
+            
+            changes = {
+                name: item[name] for name, allow_empty in fields
+                if (item.get(name) is not None if allow_empty else item.get(name))
+            }
+            updates.append((index, record_id, changes))
+        
+        def apply_updates(conn):
+            # Существование проверяется в той же транзакции, что и запись
+            ids = [record_id for _, record_id, _ in updates]
+            found = {row[0] for row in conn.execute(
+                f'SELECT id FROM {table} WHERE id IN ({", ".join("?" for _ in ids)})', ids
+            )}
+            
+            # Элементы с одинаковым набором полей - одним executemany
+            groups = {}
+            for index, record_id, changes in updates:
+                if record_id not in found:
+                    results[index] = bulk_item_error(index, 'NOT_FOUND', f'{table[:-1].capitalize()} not found', record_id)
+                    continue
+                results[index] = {'index': index, 'id': record_id, 'status': 'updated'}
+                if changes:
+                    groups.setdefault(tuple(changes), []).append(tuple(changes.values()) + (record_id,))
+            
+            if mode == 'atomic' and len(found) < len(updates):
+                raise BulkAborted()
+            for columns, params in groups.items():
+                assignments = ', '.join([f'{column} = ?' for column in columns] + [f'updated_at = {CHANGE_TIME_SQL}'])
+                conn.executemany(f'UPDATE {table} SET {assignments} WHERE id = ?', params)
+        
+        if updates and (mode == 'best_effort' or len(updates) == len(items)):
+            try:
+                run_write(apply_updates)
+            except BulkAborted:
+                pass
+        
+        if mode == 'atomic' and len(updates) < len(items):
+            # Пакет отклонен на проверке, до базы дело не дошло
+            for index, record_id, _ in updates:
+                results[index] = {'index': index, 'id': record_id, 'status': 'skipped'}
+        
+        logger.info(f"Request {request_id} - Bulk update of {len(items)} {table} ({mode})")
+        
+        return bulk_response(mode, results, 200)
+        
+    except Exception as e:
+        logger.error(f"Request {request_id} - Bulk update {table} error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
 # Функции для инженеров - ДЕФЕКТЫ
 @app.route('/v1/defects', methods=['POST'])
+@idempotent
 def create_defect():
     request_id = request.headers.get('X-Request-ID', 'default')
     user_id = request.headers.get('X-User-ID', 'anonymous')
@@ -182,15 +998,12 @@ def create_defect():
                 'error': {'code': 'VALIDATION_ERROR', 'message': 'Title required'}
             }), 400
         
-        defect_id = str(uuid.uuid4())
+        defect_id = new_id()
         
-        conn = get_db()
-        conn.execute('''
-            INSERT INTO defects (id, title, description, severity, reported_by)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (defect_id, title, description, severity, user_id))
-        conn.commit()
-        conn.close()
+        run_write(lambda conn: conn.execute(f'''
+            INSERT INTO defects (id, title, description, severity, reported_by, updated_at)
+            VALUES (?, ?, ?, ?, ?, {CHANGE_TIME_SQL})
+        ''', (defect_id, title, description, severity, user_id)))
         
         logger.info(f"Request {request_id} - Defect created: {defect_id}")
         
@@ -211,32 +1024,33 @@ def get_defects():
     request_id = request.headers.get('X-Request-ID', 'default')
     
     try:
+        if deadline_exceeded():
+            return deadline_response(request_id)
+        
+        if wants_changes():
+            return list_changes('defects')
+        
+        stream = wants_stream()
+        try:
+            query, params, limit, sort_field, encoder = build_list_query('defects', request.args, stream)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
         conn = get_db()
-        defects = conn.execute('SELECT * FROM defects ORDER BY created_at DESC').fetchall()
+        if stream:
+            return stream_entity_list('defects', encoder, conn, query, params, limit, sort_field)
+        
+        defects = conn.execute(query, params).fetchall()
         conn.close()
         
-        defects_list = []
-        for defect in defects:
-            defects_list.append({
-                'id': defect['id'],
-                'title': defect['title'],
-                'description': defect['description'],
-                'severity': defect['severity'],
-                'status': defect['status'],
-                'reported_by': defect['reported_by'],
-                'assigned_to': defect['assigned_to'],
-                'created_at': defect['created_at'],
-                'updated_at': defect['updated_at']
-            })
-        
-        logger.info(f"Request {request_id} - Sent {len(defects_list)} defects")
+        if deadline_exceeded():
+            return deadline_response(request_id)
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'defects': defects_list
-            }
-        })
+        defects, pagination = paginate_rows(defects, limit, sort_field)
+        
+        logger.info(f"Request {request_id} - Sent {len(defects)} defects")
+        
+        return json_list_response('defects', encoder.encode_rows(defects), pagination=pagination)
         
     except Exception as e:
         logger.error(f"Request {request_id} - Get defects error: {str(e)}")
@@ -245,14 +1059,23 @@ def get_defects():
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+@app.route('/v1/defects/batch', methods=['GET'])
+def get_defects_batch():
+    return multi_get('defects')
+
 @app.route('/v1/defects/<defect_id>', methods=['GET'])
 def get_defect(defect_id):
     request_id = request.headers.get('X-Request-ID', 'default')
     
     try:
+        try:
+            encoder = requested_fields(DETAIL_ENCODERS['defects'], request.args)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
         conn = get_db()
         defect = conn.execute(
-            'SELECT * FROM defects WHERE id = ?', (defect_id,)
+            f'SELECT {encoder.select_sql} FROM defects WHERE id = ?', (defect_id,)
         ).fetchone()
         conn.close()
         
@@ -262,24 +1085,9 @@ def get_defect(defect_id):
                 'error': {'code': 'NOT_FOUND', 'message': 'Defect not found'}
             }), 404
         
-        defect_data = {
-            'id': defect['id'],
-            'title': defect['title'],
-            'description': defect['description'],
-            'severity': defect['severity'],
-            'status': defect['status'],
-            'reported_by': defect['reported_by'],
-            'assigned_to': defect['assigned_to'],
-            'created_at': defect['created_at'],
-            'updated_at': defect['updated_at']
-        }
-        
         logger.info(f"Request {request_id} - Defect retrieved: {defect_id}")
         
-        return jsonify({
-            'success': True,
-            'data': defect_data
-        })
+        return json_item_response(encoder, defect)
         
     except Exception as e:
         logger.error(f"Request {request_id} - Get defect error: {str(e)}")
@@ -288,6 +1096,15 @@ def get_defect(defect_id):
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+@app.route('/v1/defects/bulk', methods=['POST'])
+@idempotent
+def create_defects_bulk():
+    return bulk_create('defects')
+
+@app.route('/v1/defects/bulk', methods=['PUT'])
+def update_defects_bulk():
+    return bulk_update('defects')
+
 @app.route('/v1/defects/<defect_id>', methods=['PUT'])
 def update_defect(defect_id):
     request_id = request.headers.get('X-Request-ID', 'default')
@@ -336,7 +1153,7 @@ def update_defect(defect_id):
             params.append(assigned_to)
             
         if updates:
-            updates.append('updated_at = CURRENT_TIMESTAMP')
+            updates.append(f'updated_at = {CHANGE_TIME_SQL}')
             query = f'UPDATE defects SET {", ".join(updates)} WHERE id = ?'
             params.append(defect_id)
             conn.execute(query, params)
@@ -360,6 +1177,7 @@ def update_defect(defect_id):
 
 # Функции для менеджеров - ЗАДАЧИ
 @app.route('/v1/tasks', methods=['POST'])
+@idempotent
 def create_task():
     request_id = request.headers.get('X-Request-ID', 'default')
     user_id = request.headers.get('X-User-ID', 'anonymous')
@@ -381,16 +1199,12 @@ def create_task():
                 'error': {'code': 'VALIDATION_ERROR', 'message': 'Title required'}
             }), 400
         
-        task_id = str(uuid.uuid4())
-        
-        conn = get_db()
-        conn.execute('''
-            INSERT INTO tasks (id, title, description, priority, assigned_to, due_date, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (task_id, title, description, priority, assigned_to, due_date, user_id))
+        task_id = new_id()
         
-        conn.commit()
-        conn.close()
+        run_write(lambda conn: conn.execute(f'''
+            INSERT INTO tasks (id, title, description, priority, assigned_to, due_date, created_by, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, {CHANGE_TIME_SQL})
+        ''', (task_id, title, description, priority, assigned_to, due_date, user_id)))
         
         logger.info(f"Request {request_id} - Task created: {task_id}")
         
@@ -414,33 +1228,33 @@ def get_tasks():
     request_id = request.headers.get('X-Request-ID', 'default')
     
     try:
+        if deadline_exceeded():
+            return deadline_response(request_id)
+        
+        if wants_changes():
+            return list_changes('tasks')
+        
+        stream = wants_stream()
+        try:
+            query, params, limit, sort_field, encoder = build_list_query('tasks', request.args, stream)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
         conn = get_db()
-        tasks = conn.execute('SELECT * FROM tasks ORDER BY created_at DESC').fetchall()
+        if stream:
+            return stream_entity_list('tasks', encoder, conn, query, params, limit, sort_field)
+        
+        tasks = conn.execute(query, params).fetchall()
         conn.close()
         
-        # Преобразуем в словари
-        tasks_list = []
-        for task in tasks:
-            tasks_list.append({
-                'id': task['id'],
-                'title': task['title'],
-                'description': task['description'],
-                'status': task['status'],
-                'priority': task['priority'],
-                'assigned_to': task['assigned_to'],
-                'created_at': task['created_at'],
-                'due_date': task['due_date'],
-                'updated_at': task['updated_at']
-            })
-        
-        logger.info(f"Request {request_id} - Sent {len(tasks_list)} tasks")
+        if deadline_exceeded():
+            return deadline_response(request_id)
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'tasks': tasks_list
-            }
-        })
+        tasks, pagination = paginate_rows(tasks, limit, sort_field)
+        
+        logger.info(f"Request {request_id} - Sent {len(tasks)} tasks")
+        
+        return json_list_response('tasks', encoder.encode_rows(tasks), pagination=pagination)
         
     except Exception as e:
         logger.error(f"Request {request_id} - Get tasks error: {str(e)}")
@@ -449,14 +1263,23 @@ def get_tasks():
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+@app.route('/v1/tasks/batch', methods=['GET'])
+def get_tasks_batch():
+    return multi_get('tasks')
+
 @app.route('/v1/tasks/<task_id>', methods=['GET'])
 def get_task(task_id):
     request_id = request.headers.get('X-Request-ID', 'default')
     
     try:
+        try:
+            encoder = requested_fields(DETAIL_ENCODERS['tasks'], request.args)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
         conn = get_db()
         task = conn.execute(
-            'SELECT * FROM tasks WHERE id = ?', (task_id,)
+            f'SELECT {encoder.select_sql} FROM tasks WHERE id = ?', (task_id,)
         ).fetchone()
         conn.close()
         
@@ -466,25 +1289,9 @@ def get_task(task_id):
                 'error': {'code': 'NOT_FOUND', 'message': 'Task not found'}
             }), 404
         
-        task_data = {
-            'id': task['id'],
-            'title': task['title'],
-            'description': task['description'],
-            'status': task['status'],
-            'priority': task['priority'],
-            'assigned_to': task['assigned_to'],
-            'due_date': task['due_date'],
-            'created_by': task['created_by'],
-            'created_at': task['created_at'],
-            'updated_at': task['updated_at']
-        }
-        
         logger.info(f"Request {request_id} - Task retrieved: {task_id}")
         
-        return jsonify({
-            'success': True,
-            'data': task_data
-        })
+        return json_item_response(encoder, task)
         
     except Exception as e:
         logger.error(f"Request {request_id} - Get task error: {str(e)}")
@@ -493,6 +1300,15 @@ def get_task(task_id):
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+@app.route('/v1/tasks/bulk', methods=['POST'])
+@idempotent
+def create_tasks_bulk():
+    return bulk_create('tasks')
+
+@app.route('/v1/tasks/bulk', methods=['PUT'])
+def update_tasks_bulk():
+    return bulk_update('tasks')
+
 @app.route('/v1/tasks/<task_id>', methods=['PUT'])
 def update_task(task_id):
     request_id = request.headers.get('X-Request-ID', 'default')
@@ -545,7 +1361,7 @@ def update_task(task_id):
             params.append(due_date)
             
         if updates:
-            updates.append('updated_at = CURRENT_TIMESTAMP')
+            updates.append(f'updated_at = {CHANGE_TIME_SQL}')
             query = f'UPDATE tasks SET {", ".join(updates)} WHERE id = ?'
             params.append(task_id)
             conn.execute(query, params)
@@ -569,6 +1385,7 @@ def update_task(task_id):
 
 # Функции для отчетов (менеджеры)
 @app.route('/v1/reports', methods=['POST'])
+@idempotent
 def create_report():
     request_id = request.headers.get('X-Request-ID', 'default')
     user_id = request.headers.get('X-User-ID', 'anonymous')
@@ -587,15 +1404,12 @@ def create_report():
                 'error': {'code': 'VALIDATION_ERROR', 'message': 'Title required'}
             }), 400
         
-        report_id = str(uuid.uuid4())
+        report_id = new_id()
         
-        conn = get_db()
-        conn.execute('''
-            INSERT INTO reports (id, title, content, created_by, report_type)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (report_id, title, content, user_id, report_type))
-        conn.commit()
-        conn.close()
+        run_write(lambda conn: conn.execute(f'''
+            INSERT INTO reports (id, title, content, created_by, report_type, updated_at)
+            VALUES (?, ?, ?, ?, ?, {CHANGE_TIME_SQL})
+        ''', (report_id, title, content, user_id, report_type)))
         
         logger.info(f"Request {request_id} - Report created: {report_id}")
         
@@ -616,28 +1430,33 @@ def get_reports():
     request_id = request.headers.get('X-Request-ID', 'default')
     
     try:
+        if deadline_exceeded():
+            return deadline_response(request_id)
+        
+        if wants_changes():
+            return list_changes('reports')
+        
+        stream = wants_stream()
+        try:
+            query, params, limit, sort_field, encoder = build_list_query('reports', request.args, stream)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
         conn = get_db()
-        reports = conn.execute('SELECT * FROM reports ORDER BY created_at DESC').fetchall()
+        if stream:
+            return stream_entity_list('reports', encoder, conn, query, params, limit, sort_field)
+        
+        reports = conn.execute(query, params).fetchall()
         conn.close()
         
-        reports_list = []
-        for report in reports:
-            reports_list.append({
-                'id': report['id'],
-                'title': report['title'],
-                'content': report['content'],
-                'report_type': report['report_type'],
-                'created_at': report['created_at']
-            })
+        if deadline_exceeded():
+            return deadline_response(request_id)
         
-        logger.info(f"Request {request_id} - Sent {len(reports_list)} reports")
+        reports, pagination = paginate_rows(reports, limit, sort_field)
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'reports': reports_list
-            }
-        })
+        logger.info(f"Request {request_id} - Sent {len(reports)} reports")
+        
+        return json_list_response('reports', encoder.encode_rows(reports), pagination=pagination)
         
     except Exception as e:
         logger.error(f"Request {request_id} - Get reports error: {str(e)}")
@@ -646,14 +1465,23 @@ def get_reports():
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+@app.route('/v1/reports/batch', methods=['GET'])
+def get_reports_batch():
+    return multi_get('reports')
+
 @app.route('/v1/reports/<report_id>', methods=['GET'])
 def get_report(report_id):
     request_id = request.headers.get('X-Request-ID', 'default')
     
     try:
+        try:
+            encoder = requested_fields(DETAIL_ENCODERS['reports'], request.args)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
         conn = get_db()
         report = conn.execute(
-            'SELECT * FROM reports WHERE id = ?', (report_id,)
+            f'SELECT {encoder.select_sql} FROM reports WHERE id = ?', (report_id,)
         ).fetchone()
         conn.close()
         
@@ -663,21 +1491,9 @@ def get_report(report_id):
                 'error': {'code': 'NOT_FOUND', 'message': 'Report not found'}
             }), 404
         
-        report_data = {
-            'id': report['id'],
-            'title': report['title'],
-            'content': report['content'],
-            'report_type': report['report_type'],
-            'created_by': report['created_by'],
-            'created_at': report['created_at']
-        }
-        
         logger.info(f"Request {request_id} - Report retrieved: {report_id}")
         
-        return jsonify({
-            'success': True,
-            'data': report_data
-        })
+        return json_item_response(encoder, report)
         
     except Exception as e:
         logger.error(f"Request {request_id} - Get report error: {str(e)}")
@@ -727,6 +1543,7 @@ def update_report(report_id):
             params.append(report_type)
             
         if updates:
+            updates.append(f'updated_at = {CHANGE_TIME_SQL}')
             query = f'UPDATE reports SET {", ".join(updates)} WHERE id = ?'
             params.append(report_id)
             conn.execute(query, params)
@@ -789,6 +1606,7 @@ def delete_report(report_id):
 
 # Новый эндпоинт для генерации отчетов по статистике
 @app.route('/v1/reports/generate/statistics', methods=['POST'])
+@idempotent
 def generate_statistics_report():
     request_id = request.headers.get('X-Request-ID', 'default')
     user_id = request.headers.get('X-User-ID', 'anonymous')
@@ -798,15 +1616,19 @@ def generate_statistics_report():
         report_type = data.get('report_type', 'statistics')
         title = data.get('title', 'Статистический отчет')
         
+        if deadline_exceeded():
+            return deadline_response(request_id)
+        
         conn = get_db()
         
-        # Получаем статистику
-        defects_count = conn.execute('SELECT COUNT(*) FROM defects').fetchone()[0]
-        tasks_count = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
-        open_defects = conn.execute('SELECT COUNT(*) FROM defects WHERE status = "open"').fetchone()[0]
-        completed_tasks = conn.execute('SELECT COUNT(*) FROM tasks WHERE status = "completed"').fetchone()[0]
-        high_priority_tasks = conn.execute('SELECT COUNT(*) FROM tasks WHERE priority = "high"').fetchone()[0]
-        overdue_tasks = conn.execute('SELECT COUNT(*) FROM tasks WHERE due_date < DATE("now") AND status != "completed"').fetchone()[0]
+        # Получаем статистику из счетчиков
+        stats = read_statistics(conn)
+        defects_count = stats['defects_total']
+        tasks_count = stats['tasks_total']
+        open_defects = stats['defects_open']
+        completed_tasks = stats['tasks_completed']
+        high_priority_tasks = stats['tasks_high_priority']
+        overdue_tasks = stats['tasks_overdue']
         
         # Генерируем содержание отчета
         content = f"""
@@ -831,11 +1653,11 @@ def generate_statistics_report():
 3. Обработать {open_defects} открытых дефектов
 """
         
-        report_id = str(uuid.uuid4())
+        report_id = new_id()
         
-        conn.execute('''
-            INSERT INTO reports (id, title, content, created_by, report_type)
-            VALUES (?, ?, ?, ?, ?)
+        conn.execute(f'''
+            INSERT INTO reports (id, title, content, created_by, report_type, updated_at)
+            VALUES (?, ?, ?, ?, ?, {CHANGE_TIME_SQL})
         ''', (report_id, title, content.strip(), user_id, report_type))
         
         conn.commit()
@@ -864,47 +1686,95 @@ def get_statistics():
     request_id = request.headers.get('X-Request-ID', 'default')
     
     try:
+        if deadline_exceeded():
+            return deadline_response(request_id)
+        
         conn = get_db()
         
-        # Общая статистика
-        defects_count = conn.execute('SELECT COUNT(*) FROM defects').fetchone()[0]
-        tasks_count = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
-        open_defects = conn.execute('SELECT COUNT(*) FROM defects WHERE status = "open"').fetchone()[0]
-        completed_tasks = conn.execute('SELECT COUNT(*) FROM tasks WHERE status = "completed"').fetchone()[0]
+        # source=scan - пересчет по таблицам для сверки со счетчиками
+        if request.args.get('source') == 'scan':
+            stats = scan_statistics(conn)
+        else:
+            stats = read_statistics(conn)
+        
+        conn.close()
         
-        # Статистика по приоритетам
-        high_priority_tasks = conn.execute('SELECT COUNT(*) FROM tasks WHERE priority = "high"').fetchone()[0]
+        logger.info(f"Request {request_id} - Statistics: {stats}")
         
-        # Просроченные задачи
-        overdue_tasks = conn.execute('''
-            SELECT COUNT(*) FROM tasks 
-            WHERE due_date < DATE("now") AND status != "completed"
-        ''').fetchone()[0]
+        return jsonify({
+            'success': True,
+            'data': stats
+        })
         
-        # Статистика по дефектам
-        high_severity_defects = conn.execute('SELECT COUNT(*) FROM defects WHERE severity = "high"').fetchone()[0]
+    except Exception as e:
+        logger.error(f"Request {request_id} - Statistics error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
+# Поиск по задачам, дефектам и отчетам. Результаты всех типов ранжируются
+# вместе по bm25, совпадение в заголовке весит больше
+SEARCH_TITLE_WEIGHT = 5.0
+
+def search_select_sql(table):
+    weights = ', '.join([str(SEARCH_TITLE_WEIGHT)] + ['1.0'] * (len(SEARCH_INDEXES[table]) - 1))
+    return f'''
+        SELECT '{table}' AS type, {table}.id AS id, {table}.title AS title,
+               snippet({table}_fts, -1, '[', ']', '…', {SEARCH_SNIPPET_TOKENS}) AS snippet,
+               -bm25({table}_fts, {weights}) AS score
+        FROM {search_source_sql(table)}
+        WHERE {table}_fts MATCH ?
+    '''
+
+@app.route('/v1/search', methods=['GET'])
+def search():
+    request_id = request.headers.get('X-Request-ID', 'default')
+    
+    try:
+        if deadline_exceeded():
+            return deadline_response(request_id)
+        
+        try:
+            match = build_search_match(request.args.get('q', ''))
+            types = [name for name in request.args.get('types', ','.join(SEARCH_INDEXES)).split(',') if name]
+            unknown = [name for name in types if name not in SEARCH_INDEXES]
+            if unknown or not types:
+                raise ValueError(f"types must be a subset of {', '.join(SEARCH_INDEXES)}")
+            page, limit = search_page(request.args)
+        except ValueError as e:
+            return list_params_error(str(e))
+        
+        types = list(dict.fromkeys(types))
+        query = ' UNION ALL '.join(search_select_sql(table) for table in types)
+        query += ' ORDER BY score DESC, id LIMIT ? OFFSET ?'
+        params = [match] * len(types) + [limit + 1, (page - 1) * limit]
         
+        conn = get_db()
+        rows = conn.execute(query, params).fetchall()
         conn.close()
         
-        stats = {
-            'tasks_total': tasks_count,
-            'defects_total': defects_count,
-            'defects_open': open_defects,
-            'tasks_completed': completed_tasks,
-            'tasks_high_priority': high_priority_tasks,
-            'tasks_overdue': overdue_tasks,
-            'defects_high_severity': high_severity_defects
-        }
+        has_more = len(rows) > limit
+        results = [{
+            'type': row['type'],
+            'id': row['id'],
+            'title': row['title'],
+            'snippet': row['snippet'],
+            'score': round(row['score'], 4)
+        } for row in rows[:limit]]
         
-        logger.info(f"Request {request_id} - Statistics: {stats}")
+        logger.info(f"Request {request_id} - Search returned {len(results)} results")
         
         return jsonify({
             'success': True,
-            'data': stats
+            'data': {
+                'results': results,
+                'pagination': {'page': page, 'limit': limit, 'has_more': has_more}
+            }
         })
         
     except Exception as e:
-        logger.error(f"Request {request_id} - Statistics error: {str(e)}")
+        logger.error(f"Request {request_id} - Search error: {str(e)}")
         return jsonify({
             'success': False,
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
@@ -5,6 +5,14 @@ import hashlib
 import logging
 import jwt
 import datetime
+import time
+
+from common.ids import id_generator
+from common.json_rows import (
+    RowEncoder, init_json_provider, json_list_response, json_multi_response, requested_fields, requested_ids
+)
+from common.sql_profiler import configure_sql_profiler, SqlProfiler
+from common.sqlite_pool import configure_sqlite, get_pool
 
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = 'your-secret-key-change-in-production'
@@ -15,10 +23,55 @@ DATABASE = 'users.db'
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Пул соединений SQLite с настройками SQLITE_PRAGMAS (common/sqlite_pool.py).
+# Путь к базе задается на экземпляр приложения в app.config['DATABASE'];
+# значение 'memory:<имя>' - база в памяти процесса
+configure_sqlite(app, DATABASE)
+
 def get_db():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_pool(app.config['DATABASE'], app.config).acquire()
+
+# Идентификаторы, упорядоченные по времени (UUIDv7), вместо случайных uuid4
+app.config['TIME_ORDERED_IDS'] = True
+new_id = id_generator(app.config)
+
+# Профилирование SQL (common/sql_profiler.py), по умолчанию выключено;
+# сводка доступна по /diagnostics/sql
+configure_sql_profiler(app)
+sql_profiler = SqlProfiler(app, get_db)
+
+# orjson как JSON-провайдер Flask (common/json_rows.py)
+init_json_provider(app)
+
+def parse_deadline():
+    """Чтение дедлайна запроса, выставленного API Gateway"""
+    header = request.headers.get('X-Request-Deadline')
+    if not header:
+        return None
+    try:
+        return float(header)
+    except ValueError:
+        return None
+
+def deadline_exceeded():
+    """Проверка, не истек ли дедлайн запроса (шлюз уже не ждет ответа)"""
+    deadline = getattr(request, 'deadline', None)
+    return deadline is not None and time.time() >= deadline
+
+def deadline_response():
+    logger.warning(f"Deadline exceeded, aborting {request.method} {request.path}")
+    return jsonify({
+        'success': False,
+        'error': {'code': 'DEADLINE_EXCEEDED', 'message': 'Request deadline exceeded'}
+    }), 504
+
+@app.before_request
+def before_request():
+    request.deadline = parse_deadline()
+    
+    # Запрос простоял в очереди дольше, чем шлюз готов был ждать
+    if deadline_exceeded():
+        return deadline_response()
 
 def init_db():
     conn = get_db()
@@ -48,7 +101,7 @@ def init_db():
         
         if not user_exists:
             password_hash = hashlib.md5(password.encode()).hexdigest()
-            user_id = str(uuid.uuid4())
+            user_id = new_id()
             conn.execute(
                 'INSERT INTO users (id, email, password_hash, name, role) VALUES (?, ?, ?, ?, ?)',
                 (user_id, email, password_hash, name, role)
@@ -111,7 +164,7 @@ def register():
                 'error': {'code': 'USER_EXISTS', 'message': 'User already exists'}
             }), 409
         
-        user_id = str(uuid.uuid4())
+        user_id = new_id()
         password_hash = hashlib.md5(password.encode()).hexdigest()
         
         conn.execute(
@@ -217,6 +270,14 @@ def login():
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+USER_ROW_ENCODER = RowEncoder([
+    ('id', 'value'),
+    ('email', 'value'),
+    ('name', 'value'),
+    ('role', 'value'),
+    ('created_at', 'value')
+])
+
 @app.route('/v1/users', methods=['GET'])
 def get_users():
     try:
@@ -227,18 +288,21 @@ def get_users():
         
         logger.info(f"Users list request - RequestID: {request_id}, User: {user_id}, Role: {user_role}")
         
+        try:
+            encoder = requested_fields(USER_ROW_ENCODER, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            }), 400
+        
         conn = get_db()
         users = conn.execute(
-            'SELECT id, email, name, role, created_at FROM users'
+            f'SELECT {encoder.select_sql} FROM users'
         ).fetchall()
         conn.close()
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'users': [dict(user) for user in users]
-            }
-        })
+        return json_list_response('users', encoder.encode_rows(users))
         
     except Exception as e:
         logger.error(f"Get users error: {str(e)}")
@@ -247,6 +311,37 @@ def get_users():
             'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
         }), 500
 
+@app.route('/v1/users/batch', methods=['GET'])
+def get_users_batch():
+    request_id = request.headers.get('X-Request-ID', 'default')
+    
+    try:
+        try:
+            ids = requested_ids(request.args)
+            encoder = requested_fields(USER_ROW_ENCODER, request.args)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': {'code': 'VALIDATION_ERROR', 'message': str(e)}
+            }), 400
+        
+        conn = get_db()
+        users = conn.execute(
+            f'SELECT {encoder.select_sql} FROM users WHERE id IN ({", ".join("?" for _ in ids)})', ids
+        ).fetchall()
+        conn.close()
+        
+        logger.info(f"Users batch request - RequestID: {request_id}, found {len(users)} of {len(ids)}")
+        
+        return json_multi_response('users', encoder, ids, users, {})
+        
+    except Exception as e:
+        logger.error(f"Get users batch error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': {'code': 'SERVER_ERROR', 'message': 'Server error'}
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'healthy', 'service': 'users'})
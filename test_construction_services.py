@@ -1,7 +1,12 @@
 import pytest
+import csv
+import io
 import json
 import uuid
 import os
+import time
+import jwt
+import requests
 from datetime import datetime, timedelta
 
 # Тестовые данные
@@ -11,68 +16,53 @@ TEST_USERS = {
     'admin': {'email': 'admin@system.com', 'password': 'admin123'}
 }
 
+# Тестовые базы сервисов хранятся в памяти процесса: у каждого воркера
+# pytest свои базы, а исходное состояние восстанавливается из снимка
+# вместо повторного создания схемы и демо-данных
+DATABASE_SNAPSHOTS = {}
+
+def use_memory_database(service, name):
+    """Переключение сервиса на базу в памяти в исходном состоянии"""
+    from common.sqlite_pool import get_pool
+    
+    service.app.config['TESTING'] = True
+    service.app.config['DATABASE'] = f'memory:test_{name}_{os.getpid()}'
+    pool = get_pool(service.app.config['DATABASE'], service.app.config)
+    
+    snapshot = DATABASE_SNAPSHOTS.get(name)
+    if snapshot is None:
+        with service.app.app_context():
+            service.init_db()
+        DATABASE_SNAPSHOTS[name] = pool.snapshot()
+    else:
+        pool.restore(snapshot)
+
 class TestConstructionServices:
     """Класс тестов для системы управления строительными сервисами"""
     
     @pytest.fixture
     def users_client(self):
-        from service_users.app import app as users_app, init_db
-        users_app.config['TESTING'] = True
-        users_app.config['DATABASE'] = 'test_users.db'  # Используем тестовую БД
+        import service_users.app as users_service
+        use_memory_database(users_service, 'users')
         
-        # Удаляем тестовую БД если существует
-        if os.path.exists('test_users.db'):
-            os.remove('test_users.db')
-            
-        with users_app.test_client() as client:
-            # Инициализируем БД внутри контекста приложения
-            with users_app.app_context():
-                init_db()
+        with users_service.app.test_client() as client:
             yield client
-        
-        # Очистка после тестов
-        if os.path.exists('test_users.db'):
-            os.remove('test_users.db')
     
     @pytest.fixture
     def orders_client(self):
-        from service_orders.app import app as orders_app, init_db
-        orders_app.config['TESTING'] = True
-        orders_app.config['DATABASE'] = 'test_orders.db'  # Используем тестовую БД
+        import service_orders.app as orders_service
+        use_memory_database(orders_service, 'orders')
         
-        # Удаляем тестовую БД если существует
-        if os.path.exists('test_orders.db'):
-            os.remove('test_orders.db')
-            
-        with orders_app.test_client() as client:
-            # Инициализируем БД внутри контекста приложения
-            with orders_app.app_context():
-                init_db()
+        with orders_service.app.test_client() as client:
             yield client
-        
-        # Очистка после тестов
-        if os.path.exists('test_orders.db'):
-            os.remove('test_orders.db')
     
     @pytest.fixture
     def tasks_client(self):
-        from service_tasks.app import app as tasks_app, init_db
-        tasks_app.config['TESTING'] = True
-        tasks_app.config['DATABASE'] = 'test_tasks.db'  # Используем тестовую БД
+        import service_tasks.app as tasks_service
+        use_memory_database(tasks_service, 'tasks')
         
-        # Удаляем тестовую БД если существует
-        if os.path.exists('test_tasks.db'):
-            os.remove('test_tasks.db')
-            
-        with tasks_app.test_client() as client:
-            # Инициализируем БД внутри контекста приложения
-            with tasks_app.app_context():
-                init_db()
+        with tasks_service.app.test_client() as client:
             yield client
-        
-        # Очистка после тестов
-        if os.path.exists('test_tasks.db'):
-            os.remove('test_tasks.db')
 
     # 1. Тест регистрации нового пользователя
     def test_user_registration_success(self, users_client):
@@ -579,6 +569,1760 @@ class TestConstructionServices:
         assert data['success'] == True
         assert data['data']['message'] == 'Report deleted successfully'
 
+    # 26. Тест прерывания запроса с истекшим дедлайном
+    def test_expired_deadline_aborts_request(self, tasks_client):
+        """Тест отказа от работы, на которую шлюз уже не ждет ответа"""
+        headers = {'X-Request-Deadline': f'{time.time() - 1:.3f}'}
+        response = tasks_client.get('/v1/statistics', headers=headers)
+        data = json.loads(response.data)
+        
+        assert response.status_code == 504
+        assert data['success'] == False
+        assert data['error']['code'] == 'DEADLINE_EXCEEDED'
+    
+    # 27. Тест обработки запроса с действующим дедлайном
+    def test_valid_deadline_is_processed(self, tasks_client):
+        """Тест обычной обработки запроса до истечения дедлайна"""
+        headers = {'X-Request-Deadline': f'{time.time() + 30:.3f}'}
+        response = tasks_client.get('/v1/defects', headers=headers)
+        data = json.loads(response.data)
+        
+        assert response.status_code == 200
+        assert data['success'] == True
+
+    # 28. Тест разделения маршрутов шлюза по bulkhead-классам
+    def test_gateway_route_classification(self):
+        """Тест отнесения маршрутов к интерактивным, пишущим и тяжелым"""
+        from api_gateway.app import classify_route
+        
+        assert classify_route('v1/tasks/123', 'GET') == 'interactive'
+        assert classify_route('v1/tasks', 'GET') == 'heavy'
+        assert classify_route('v1/tasks', 'POST') == 'write'
+        assert classify_route('v1/reports/generate/statistics', 'POST') == 'heavy'
+        assert classify_route('v1/statistics', 'GET') == 'heavy'
+    
+    # 29. Тест отказа переполненного bulkhead
+    def test_bulkhead_rejects_when_full(self):
+        """Тест ограничения одновременных запросов и очереди bulkhead"""
+        from api_gateway.app import Bulkhead
+        
+        bulkhead = Bulkhead('test', max_concurrent=1, max_queue=0, queue_timeout=0.01)
+        assert bulkhead.acquire() == True
+        assert bulkhead.acquire() == False
+        bulkhead.release(0.01)
+        assert bulkhead.acquire() == True
+        
+        metrics = bulkhead.metrics()
+        assert metrics['accepted'] == 2
+        assert metrics['rejected'] == 1
+        assert metrics['active'] == 1
+    
+    # 30. Тест доступа к метрикам шлюза
+    def test_gateway_metrics_require_token(self):
+        """Тест того, что метрики шлюза отдаются только с токеном менеджера или администратора"""
+        from api_gateway.app import app as gateway_app
+        
+        def token_for(role):
+            token = jwt.encode({
+                'user_id': f'metrics-{role}',
+                'email': f'{role}@system.com',
+                'role': role
+            }, gateway_app.config['JWT_SECRET_KEY'], algorithm='HS256')
+            return {'Authorization': f'Bearer {token}'}
+        
+        with gateway_app.test_client() as client:
+            assert client.get('/metrics').status_code == 401
+            assert client.get('/metrics', headers=token_for('engineer')).status_code == 403
+            
+            response = client.get('/metrics', headers=token_for('manager'))
+            assert response.status_code == 200
+            assert 'bulkheads' in json.loads(response.data)
+
+    @pytest.fixture
+    def gateway_client(self):
+        from api_gateway.app import app as gateway_app, limiter
+        gateway_app.config['TESTING'] = True
+        limiter.enabled = False
+        
+        token = jwt.encode({
+            'user_id': 'gateway-test-user',
+            'email': 'manager@system.com',
+            'role': 'manager'
+        }, gateway_app.config['JWT_SECRET_KEY'], algorithm='HS256')
+        
+        with gateway_app.test_client() as client:
+            client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+            yield client
+        
+        limiter.enabled = True
+    
+    def make_upstream_response(self, status_code, payload):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = json.dumps(payload).encode()
+        response.headers['Content-Type'] = 'application/json'
+        return response
+    
+    # 31. Тест повтора идемпотентного запроса после сбоя соединения
+    def test_gateway_retries_idempotent_request(self, gateway_client, monkeypatch):
+        """Тест автоматического повтора GET при кратковременной недоступности сервиса"""
+        from api_gateway.app import BULKHEADS
+        
+        calls = []
+        def flaky_request(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise requests.exceptions.ConnectionError('service restarting')
+            return self.make_upstream_response(200, {'success': True, 'data': {}})
+        
+        monkeypatch.setattr(BULKHEADS['interactive'].session, 'request', flaky_request)
+        response = gateway_client.get('/v1/tasks/some-task-id')
+        
+        assert response.status_code == 200
+        assert len(calls) == 2
+    
+    # 32. Тест отсутствия повтора POST без ключа идемпотентности
+    def test_gateway_does_not_retry_post_without_key(self, gateway_client, monkeypatch):
+        """Тест того, что создание без Idempotency-Key не повторяется"""
+        from api_gateway.app import BULKHEADS
+        
+        calls = []
+        def failing_request(**kwargs):
+            calls.append(kwargs)
+            raise requests.exceptions.ConnectionError('service restarting')
+        
+        monkeypatch.setattr(BULKHEADS['write'].session, 'request', failing_request)
+        response = gateway_client.post('/v1/defects', json={'title': 'Дефект'})
+        data = json.loads(response.data)
+        
+        assert response.status_code == 503
+        assert data['error']['code'] == 'SERVICE_UNAVAILABLE'
+        assert len(calls) == 1
+    
+    # 33. Тест отсутствия повтора POST с ключом на маршруте без его поддержки
+    def test_gateway_does_not_retry_post_outside_allowlist(self, gateway_client, monkeypatch):
+        """Тест того, что Idempotency-Key делает POST повторяемым только на
+        маршрутах из IDEMPOTENT_POST_ROUTES"""
+        from api_gateway.app import BULKHEADS, RETRY_BUDGET
+        
+        calls = []
+        def failing_request(**kwargs):
+            calls.append(kwargs)
+            raise requests.exceptions.ConnectionError('service restarting')
+        
+        monkeypatch.setattr(RETRY_BUDGET, 'try_spend', lambda: True)
+        monkeypatch.setattr(BULKHEADS['write'].session, 'request', failing_request)
+        response = gateway_client.post('/v1/orders/some-order/cancel', json={},
+                                       headers={'Idempotency-Key': f'key-{uuid.uuid4()}'})
+        
+        assert response.status_code == 503
+        assert len(calls) == 1
+
+    # 34. Тест повторного создания заказа с тем же ключом идемпотентности
+    def test_create_order_idempotency_key_replay(self, orders_client):
+        """Тест того, что повтор POST с Idempotency-Key не создает дубликат"""
+        order_data = {
+            'title': 'Заказ с ключом идемпотентности',
+            'items': [{'product': 'Цемент М500', 'quantity': 10, 'unit_price': 500}]
+        }
+        headers = {
+            'X-User-ID': 'test-user-idempotency',
+            'X-User-Role': 'engineer',
+            'Idempotency-Key': f'key-{uuid.uuid4()}'
+        }
+        first = orders_client.post('/v1/orders', json=order_data, headers=headers)
+        second = orders_client.post('/v1/orders', json=order_data, headers=headers)
+        
+        assert first.status_code == 201
+        assert second.status_code == 201
+        assert second.headers['Idempotent-Replayed'] == 'true'
+        assert json.loads(second.data)['data']['order_id'] == json.loads(first.data)['data']['order_id']
+        
+        response = orders_client.get('/v1/orders', headers=headers)
+        titles = [order['title'] for order in json.loads(response.data)['data']['orders']]
+        assert titles.count('Заказ с ключом идемпотентности') == 1
+    
+    # 35. Тест повторного использования ключа с другим телом запроса
+    def test_idempotency_key_reuse_with_different_payload(self, tasks_client):
+        """Тест отказа при использовании ключа идемпотентности для другого запроса"""
+        headers = {
+            'X-User-ID': 'engineer@system.com',
+            'Idempotency-Key': f'key-{uuid.uuid4()}'
+        }
+        first = tasks_client.post('/v1/defects', json={'title': 'Первый дефект'}, headers=headers)
+        second = tasks_client.post('/v1/defects', json={'title': 'Другой дефект'}, headers=headers)
+        data = json.loads(second.data)
+        
+        assert first.status_code == 201
+        assert second.status_code == 422
+        assert data['error']['code'] == 'IDEMPOTENCY_KEY_MISMATCH'
+    
+    # 36. Тест перехвата ключа идемпотентности после истечения аренды
+    def test_idempotency_lease_takeover(self, orders_client):
+        """Тест того, что незавершенный ключ блокирует повтор только до
+        истечения аренды, после чего повтор выполняет запрос"""
+        import hashlib
+        import service_orders.app as orders_service
+        
+        user_id = f'lease-{uuid.uuid4().hex[:8]}'
+        body = json.dumps({'title': 'Заказ после сбоя', 'items': [{'product': 'Щебень', 'quantity': 1, 'unit_price': 10}]})
+        headers = {'X-User-ID': user_id, 'X-User-Role': 'engineer', 'Idempotency-Key': f'key-{uuid.uuid4()}'}
+        
+        # Ключ занят запросом, процесс которого упал до ответа
+        conn = orders_service.get_db()
+        conn.execute('''
+            INSERT INTO idempotency_keys (scope, key, fingerprint, created_at, lease_until)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (f'{user_id} POST /v1/orders', headers['Idempotency-Key'],
+              hashlib.sha256(body.encode()).digest(), time.time(), time.time() + 60))
+        conn.commit()
+        
+        response = orders_client.post('/v1/orders', data=body, content_type='application/json', headers=headers)
+        assert response.status_code == 409
+        assert json.loads(response.data)['error']['code'] == 'IDEMPOTENCY_IN_PROGRESS'
+        
+        conn.execute('UPDATE idempotency_keys SET lease_until = ? WHERE key = ?',
+                     (time.time() - 1, headers['Idempotency-Key']))
+        conn.commit()
+        conn.close()
+        
+        first = orders_client.post('/v1/orders', data=body, content_type='application/json', headers=headers)
+        second = orders_client.post('/v1/orders', data=body, content_type='application/json', headers=headers)
+        
+        assert first.status_code == 201
+        assert second.headers['Idempotent-Replayed'] == 'true'
+        assert json.loads(second.data)['data']['order_id'] == json.loads(first.data)['data']['order_id']
+    
+    # 37. Тест повтора POST с ключом на маршруте создания
+    def test_gateway_retries_idempotent_post(self, gateway_client, monkeypatch):
+        """Тест того, что создание с Idempotency-Key повторяется шлюзом после сбоя соединения"""
+        from api_gateway.app import BULKHEADS, RETRY_BUDGET
+        
+        calls = []
+        def flaky_request(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise requests.exceptions.ConnectionError('service restarting')
+            return self.make_upstream_response(201, {'success': True, 'data': {}})
+        
+        monkeypatch.setattr(RETRY_BUDGET, 'try_spend', lambda: True)
+        monkeypatch.setattr(BULKHEADS['write'].session, 'request', flaky_request)
+        key = f'key-{uuid.uuid4()}'
+        response = gateway_client.post('/v1/defects', json={'title': 'Дефект'}, headers={'Idempotency-Key': key})
+        
+        assert response.status_code == 201
+        assert len(calls) == 2
+        assert calls[1]['headers']['Idempotency-Key'] == key
+
+    # 38. Тест балансировки и пассивного исключения экземпляров сервиса
+    def test_upstream_pool_balancing_and_ejection(self):
+        """Тест выбора наименее загруженного экземпляра и исключения сбойного"""
+        from api_gateway.app import UpstreamPool, app as gateway_app
+        
+        pool = UpstreamPool('tasks', ['http://tasks-1:5002', 'http://tasks-2:5002'])
+        busy = pool.acquire()
+        idle = pool.acquire()
+        assert busy.url != idle.url
+        pool.release(idle, True)
+        
+        # Пока первый экземпляр занят, выбирается второй
+        upstream = pool.acquire()
+        assert upstream.url == idle.url
+        pool.release(upstream, True)
+        pool.release(busy, True)
+        
+        for _ in range(gateway_app.config['UPSTREAM_EJECT_AFTER_FAILURES']):
+            failing = pool.acquire(exclude={idle.url})
+            pool.release(failing, False)
+        
+        for _ in range(5):
+            upstream = pool.acquire()
+            assert upstream.url == idle.url
+            pool.release(upstream, True)
+    
+    # 39. Тест перечитывания списка экземпляров из файла конфигурации
+    def test_upstreams_config_reload(self, tmp_path, monkeypatch):
+        """Тест подхвата новых экземпляров сервиса без перезапуска шлюза"""
+        from api_gateway import app as gateway
+        
+        config_path = tmp_path / 'upstreams.json'
+        config_path.write_text(json.dumps({
+            'tasks': ['http://tasks-1:5002', 'http://tasks-2:5002']
+        }))
+        monkeypatch.setitem(gateway.app.config, 'UPSTREAMS_CONFIG', str(config_path))
+        monkeypatch.setitem(gateway.upstreams_config_state, 'checked_at', 0.0)
+        original_urls = [u.url for u in gateway.UPSTREAMS['tasks'].instances]
+        
+        try:
+            gateway.reload_upstreams_if_changed()
+            urls = [u.url for u in gateway.UPSTREAMS['tasks'].instances]
+            assert urls == ['http://tasks-1:5002', 'http://tasks-2:5002']
+        finally:
+            gateway.UPSTREAMS['tasks'].set_urls(original_urls)
+
+    # 40. Тест пула соединений SQLite
+    def test_connection_pool_reuses_tuned_connections(self, tasks_client, tmp_path, monkeypatch):
+        """Тест повторного использования соединения и применения PRAGMA"""
+        import service_tasks.app as tasks_service
+        from service_tasks.app import get_db
+        
+        # Режим WAL проверяем на файловой базе
+        monkeypatch.setitem(tasks_service.app.config, 'DATABASE', str(tmp_path / 'pool_tasks.db'))
+        
+        conn = get_db()
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert conn.execute('PRAGMA busy_timeout').fetchone()[0] == 5000
+        conn.close()
+        
+        # Закрытое соединение возвращается в пул и выдается повторно
+        assert get_db() is conn
+        conn.close()
+
+    # 41. Тест использования индексов запросами списков и статистики
+    @pytest.mark.parametrize('query, index_name', [
+        ('SELECT * FROM defects ORDER BY created_at DESC', 'idx_defects_created_at'),
+        ('SELECT * FROM tasks ORDER BY created_at DESC', 'idx_tasks_created_at'),
+        ('SELECT * FROM reports ORDER BY created_at DESC', 'idx_reports_created_at'),
+        ("SELECT COUNT(*) FROM defects WHERE status = 'open'", 'idx_defects_status'),
+        ("SELECT COUNT(*) FROM defects WHERE severity = 'high'", 'idx_defects_severity'),
+        ("SELECT COUNT(*) FROM tasks WHERE status = 'completed'", 'idx_tasks_status'),
+        ("SELECT COUNT(*) FROM tasks WHERE priority = 'high'", 'idx_tasks_priority'),
+        ("SELECT COUNT(*) FROM tasks WHERE due_date < DATE('now') AND status != 'completed'",
+         'idx_tasks_open_due_date'),
+    ])
+    def test_query_plans_use_indexes(self, tasks_client, query, index_name):
+        """Тест того, что запросы не сканируют таблицы целиком"""
+        from service_tasks.app import get_db
+        
+        conn = get_db()
+        plan = ' '.join(row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}'))
+        conn.close()
+        
+        assert index_name in plan
+    
+    # 42. Тест применения миграции индексов к существующей базе
+    def test_schema_upgrade_on_existing_database(self, tasks_client, tmp_path, monkeypatch):
+        """Тест идемпотентного обновления схемы базы без индексов"""
+        import service_tasks.app as tasks_service
+        
+        monkeypatch.setitem(tasks_service.app.config, 'DATABASE', str(tmp_path / 'legacy_tasks.db'))
+        tasks_service.init_db()
+        
+        # Имитируем базу, созданную до появления индексов
+        conn = tasks_service.get_db()
+        conn.execute('DROP INDEX idx_tasks_open_due_date')
+        conn.execute('PRAGMA user_version = 0')
+        conn.close()
+        
+        tasks_service.init_db()
+        tasks_service.init_db()
+        
+        conn = tasks_service.get_db()
+        indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        conn.close()
+        
+        assert 'idx_tasks_open_due_date' in indexes
+        assert version == len(tasks_service.SCHEMA_MIGRATIONS)
+
+    # 43. Тест согласованности счетчиков статистики с данными
+    def test_statistics_counters_match_table_scan(self, tasks_client):
+        """Тест поддержки счетчиков триггерами при вставке, изменении и удалении"""
+        from service_tasks.app import get_db
+        
+        headers = {'X-User-ID': 'manager@system.com'}
+        overdue = tasks_client.post('/v1/tasks', json={
+            'title': 'Просроченная задача', 'priority': 'high', 'due_date': '2020-01-01'
+        }, headers=headers)
+        overdue_id = json.loads(overdue.data)['data']['task_id']
+        tasks_client.post('/v1/defects', json={'title': 'Новый дефект', 'severity': 'high'}, headers=headers)
+        
+        before = json.loads(tasks_client.get('/v1/statistics').data)['data']
+        tasks_client.put(f'/v1/tasks/{overdue_id}', json={'status': 'completed'})
+        after = json.loads(tasks_client.get('/v1/statistics').data)['data']
+        
+        assert after['tasks_completed'] == before['tasks_completed'] + 1
+        assert after['tasks_overdue'] == before['tasks_overdue'] - 1
+        
+        conn = get_db()
+        conn.execute('DELETE FROM tasks WHERE id = ?', (overdue_id,))
+        conn.commit()
+        conn.close()
+        
+        counters = json.loads(tasks_client.get('/v1/statistics').data)['data']
+        scan = json.loads(tasks_client.get('/v1/statistics?source=scan').data)['data']
+        assert counters == scan
+        assert counters['tasks_total'] == after['tasks_total'] - 1
+
+    # 44. Тест постраничного вывода заказов по курсору
+    def test_orders_cursor_pagination(self, orders_client):
+        """Тест обхода всех заказов по курсору без пропусков и повторов"""
+        headers = {
+            'X-User-ID': f'test-user-cursor-{uuid.uuid4().hex[:8]}',
+            'X-User-Role': 'engineer'
+        }
+        created_ids = set()
+        for i in range(7):
+            response = orders_client.post('/v1/orders', json={
+                'title': f'Заказ {i}',
+                'items': [{'product': 'Песок', 'quantity': 1, 'unit_price': 100}]
+            }, headers=headers)
+            created_ids.add(json.loads(response.data)['data']['order_id'])
+        
+        seen_ids = []
+        url = '/v1/orders?limit=3'
+        while url:
+            data = json.loads(orders_client.get(url, headers=headers).data)['data']
+            seen_ids.extend(order['id'] for order in data['orders'])
+            pagination = data['pagination']
+            assert pagination['total'] == 7
+            url = f"/v1/orders?limit=3&cursor={pagination['next_cursor']}" if pagination['has_more'] else None
+        
+        assert len(seen_ids) == 7
+        assert set(seen_ids) == created_ids
+    
+    # 45. Тест некорректного курсора
+    def test_orders_invalid_cursor(self, orders_client):
+        """Тест отказа при поврежденном курсоре"""
+        headers = {'X-User-ID': 'test-user', 'X-User-Role': 'manager'}
+        response = orders_client.get('/v1/orders?cursor=not-a-cursor', headers=headers)
+        data = json.loads(response.data)
+        
+        assert response.status_code == 400
+        assert data['error']['code'] == 'VALIDATION_ERROR'
+    
+    # 46. Тест использования составного индекса при выборке страницы заказов
+    def test_orders_keyset_query_uses_index(self, orders_client):
+        """Тест того, что выборка страницы пользователя не сортирует таблицу"""
+        from service_orders.app import get_db
+        
+        conn = get_db()
+        plan = ' '.join(row[3] for row in conn.execute('''
+            EXPLAIN QUERY PLAN SELECT * FROM orders
+            WHERE user_id = ? AND status = ? AND (created_at, id) < (?, ?)
+            ORDER BY created_at DESC, id DESC LIMIT 10
+        ''', ('user', 'created', '2030-01-01', 'z')))
+        conn.close()
+        
+        assert 'idx_orders_user_status_created_at' in plan
+        assert 'TEMP B-TREE' not in plan
+    
+    # 47. Тест ограничения кэша количества заказов
+    def test_orders_count_cache_bounded(self, orders_client, monkeypatch):
+        """Тест того, что кэш количества заказов вытесняет давно не использованные фильтры"""
+        import service_orders.app as orders_service
+        
+        monkeypatch.setattr(orders_service, 'ORDERS_COUNT_CACHE_MAX_ENTRIES', 3)
+        orders_service.invalidate_orders_count_cache()
+        conn = orders_service.get_db()
+        try:
+            where_sql = ' WHERE user_id = ?'
+            for number in range(3):
+                orders_service.count_orders(conn, where_sql, [f'user-{number}'])
+            # Обращение к user-0 делает его самым свежим, вытесняется user-1
+            orders_service.count_orders(conn, where_sql, ['user-0'])
+            orders_service.count_orders(conn, where_sql, ['user-3'])
+            
+            assert list(orders_service.orders_count_cache) == [
+                (where_sql, ('user-2',)), (where_sql, ('user-0',)), (where_sql, ('user-3',))
+            ]
+            
+            # Просроченная запись удаляется при обращении
+            key = (where_sql, ('user-2',))
+            orders_service.orders_count_cache[key] = (99, time.time() - 1)
+            assert orders_service.count_orders(conn, where_sql, ['user-2']) == 0
+            assert len(orders_service.orders_count_cache) == 3
+        finally:
+            conn.close()
+            orders_service.invalidate_orders_count_cache()
+
+
+    # 48. Тест фильтрации и обхода задач по курсору
+    def test_tasks_filtered_cursor_pagination(self, tasks_client):
+        """Тест обхода отфильтрованного списка задач без пропусков и повторов"""
+        assignee = f'engineer-{uuid.uuid4().hex[:8]}@system.com'
+        headers = {'X-User-ID': 'manager@system.com'}
+        created_ids = set()
+        for i in range(5):
+            response = tasks_client.post('/v1/tasks', json={
+                'title': f'Задача {i}', 'priority': 'low', 'assigned_to': assignee
+            }, headers=headers)
+            created_ids.add(json.loads(response.data)['data']['task_id'])
+        
+        seen_ids = []
+        url = f'/v1/tasks?assigned_to={assignee}&limit=2'
+        while url:
+            data = json.loads(tasks_client.get(url).data)['data']
+            seen_ids.extend(task['id'] for task in data['tasks'])
+            assert all(task['assigned_to'] == assignee for task in data['tasks'])
+            pagination = data['pagination']
+            assert pagination['limit'] == 2
+            url = (f"/v1/tasks?assigned_to={assignee}&limit=2&cursor={pagination['next_cursor']}"
+                   if pagination['has_more'] else None)
+        
+        assert len(seen_ids) == 5
+        assert set(seen_ids) == created_ids
+    
+    # 49. Тест ограничения размера страницы и проверки параметров списков
+    def test_list_limit_and_invalid_params(self, tasks_client):
+        """Тест лимита по умолчанию и отказа при неизвестной сортировке"""
+        from service_tasks.app import LIST_MAX_LIMIT
+        
+        data = json.loads(tasks_client.get('/v1/defects?limit=100000').data)['data']
+        assert data['pagination']['limit'] == LIST_MAX_LIMIT
+        assert len(data['defects']) <= LIST_MAX_LIMIT
+        
+        for url in ['/v1/reports?sort=content', '/v1/tasks?order=sideways', '/v1/defects?cursor=broken']:
+            response = tasks_client.get(url)
+            assert response.status_code == 400
+            assert json.loads(response.data)['error']['code'] == 'VALIDATION_ERROR'
+
+    # 50. Тест агрегации по товарам из таблицы позиций заказов
+    def test_product_analytics_from_order_items(self, orders_client):
+        """Тест поддержки позиций при создании и изменении заказа"""
+        product = f'Цемент М500 {uuid.uuid4().hex[:8]}'
+        headers = {'X-User-ID': 'engineer-analytics', 'X-User-Role': 'engineer'}
+        first = orders_client.post('/v1/orders', json={
+            'title': 'Цемент', 'items': [{'product': product, 'quantity': 10, 'unit_price': 500}]
+        }, headers=headers)
+        order_id = json.loads(first.data)['data']['order_id']
+        orders_client.post('/v1/orders', json={
+            'title': 'Цемент и песок',
+            'items': [
+                {'product': product, 'quantity': 5, 'unit_price': 400},
+                {'product': 'Песок', 'quantity': 1, 'unit_price': 100}
+            ]
+        }, headers=headers)
+        
+        url = f'/v1/orders/analytics/products?product={product}'
+        stats = json.loads(orders_client.get(url, headers=headers).data)['data']['products']
+        assert stats == [{
+            'product': product, 'quantity': 15, 'amount': 7000.0, 'orders_count': 2,
+            'min_unit_price': 400, 'max_unit_price': 500
+        }]
+        
+        # Изменение состава заказа заменяет его позиции
+        orders_client.put(f'/v1/orders/{order_id}', json={
+            'items': [{'product': product, 'quantity': 1, 'unit_price': 500}]
+        }, headers=headers)
+        stats = json.loads(orders_client.get(url, headers=headers).data)['data']['products']
+        assert stats[0]['quantity'] == 6
+        
+        # Отмененные заказы не учитываются
+        orders_client.post(f'/v1/orders/{order_id}/cancel', headers=headers)
+        stats = json.loads(orders_client.get(url, headers=headers).data)['data']['products']
+        assert stats[0]['quantity'] == 5
+    
+    # 51. Тест переноса состава существующих заказов в order_items
+    def test_order_items_backfill(self, orders_client, tmp_path, monkeypatch):
+        """Тест пакетного переноса JSON-состава заказов при миграции"""
+        import service_orders.app as orders_service
+        
+        monkeypatch.setitem(orders_service.app.config, 'DATABASE', str(tmp_path / 'legacy_orders.db'))
+        orders_service.init_db()
+        
+        # Имитируем базу, созданную до появления таблицы позиций
+        conn = orders_service.get_db()
+        conn.execute('DROP TABLE order_items')
+        conn.execute('PRAGMA user_version = 1')
+        conn.commit()
+        conn.close()
+        
+        monkeypatch.setattr(orders_service, 'ORDER_ITEMS_BACKFILL_BATCH', 2)
+        orders_service.init_db()
+        
+        conn = orders_service.get_db()
+        items_count = conn.execute('SELECT COUNT(*) FROM order_items').fetchone()[0]
+        cement = conn.execute(
+            "SELECT quantity, line_total FROM order_items WHERE product = 'Цемент М500'"
+        ).fetchone()
+        conn.close()
+        
+        assert items_count == 9
+        assert tuple(cement) == (100, 50000)
+    
+    # 52. Тест каскадного удаления позиций заказа
+    def test_order_items_cascade_delete(self, orders_client):
+        """Тест того, что соединения пула включают внешние ключи и
+        удаление заказа удаляет его позиции"""
+        import sqlite3
+        import service_orders.app as orders_service
+        
+        headers = {'X-User-ID': f'cascade-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        response = orders_client.post('/v1/orders', json={
+            'title': 'Заказ на удаление', 'items': [{'product': 'Доска', 'quantity': 4, 'unit_price': 30}]
+        }, headers=headers)
+        order_id = json.loads(response.data)['data']['order_id']
+        
+        conn = orders_service.get_db()
+        try:
+            assert conn.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+            assert conn.execute('SELECT COUNT(*) FROM order_items WHERE order_id = ?', (order_id,)).fetchone()[0] == 1
+            conn.execute('DELETE FROM orders WHERE id = ?', (order_id,))
+            conn.commit()
+            assert conn.execute('SELECT COUNT(*) FROM order_items WHERE order_id = ?', (order_id,)).fetchone()[0] == 0
+            
+            with pytest.raises(sqlite3.IntegrityError):
+                conn.execute(
+                    "INSERT INTO order_items (order_id, position, product, quantity, unit_price, line_total, created_at) "
+                    "VALUES (?, 0, 'Доска', 1, 1, 1, CURRENT_TIMESTAMP)", (order_id,)
+                )
+            conn.rollback()
+        finally:
+            conn.close()
+    
+    # 53. Тест идентификаторов, упорядоченных по времени создания
+    def test_time_ordered_ids(self, tasks_client, monkeypatch):
+        """Тест формата UUIDv7 и монотонности новых идентификаторов"""
+        import service_tasks.app as tasks_service
+        
+        ids = [tasks_service.new_id() for _ in range(1000)]
+        assert ids == sorted(ids)
+        assert len(set(ids)) == len(ids)
+        assert all(uuid.UUID(value).version == 7 for value in ids)
+        
+        headers = {'X-User-ID': 'engineer@system.com'}
+        response = tasks_client.post('/v1/defects', json={'title': 'Трещина в стяжке'}, headers=headers)
+        defect_id = json.loads(response.data)['data']['defect_id']
+        assert uuid.UUID(defect_id).version == 7
+        assert defect_id > ids[-1]
+        
+        monkeypatch.setitem(tasks_service.app.config, 'TIME_ORDERED_IDS', False)
+        assert uuid.UUID(tasks_service.new_id()).version == 4
+    
+    # 54. Тест групповой фиксации записей
+    def test_group_commit_writer(self, tasks_client, monkeypatch):
+        """Тест объединения параллельных записей и изоляции ошибок внутри пачки"""
+        import threading
+        import sqlite3
+        import service_tasks.app as tasks_service
+        
+        monkeypatch.setitem(tasks_service.app.config, 'GROUP_COMMIT', True)
+        monkeypatch.setitem(tasks_service.app.config, 'GROUP_COMMIT_WINDOW', 0.05)
+        
+        title = f'Групповой дефект {uuid.uuid4().hex[:8]}'
+        duplicate_id = tasks_service.new_id()
+        errors = []
+        
+        def insert(defect_id):
+            try:
+                tasks_service.run_write(lambda conn: conn.execute(
+                    'INSERT INTO defects (id, title, reported_by) VALUES (?, ?, ?)',
+                    (defect_id, title, 'engineer@system.com')
+                ))
+            except sqlite3.IntegrityError as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=insert, args=(tasks_service.new_id(),)) for _ in range(20)]
+        threads += [threading.Thread(target=insert, args=(duplicate_id,)) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        response = tasks_client.post('/v1/defects', json={'title': title}, headers={'X-User-ID': 'engineer@system.com'})
+        assert response.status_code == 201
+        
+        conn = tasks_service.get_db()
+        count = conn.execute('SELECT COUNT(*) FROM defects WHERE title = ?', (title,)).fetchone()[0]
+        conn.close()
+        
+        assert len(errors) == 1
+        assert count == 22
+    
+    # 55. Тест устойчивости потока групповой фиксации к ошибкам
+    def test_group_commit_writer_survives_errors(self, tasks_client):
+        """Тест того, что сбой пачки не останавливает писателя, а ожидание ограничено"""
+        import threading
+        import service_tasks.app as tasks_service
+        from common.group_commit import GroupCommitWriter, GroupCommitTimeout
+        from common.sqlite_pool import get_pool
+        
+        class FlakyPool:
+            def __init__(self, pool):
+                self.pool = pool
+                self.failures = 1
+                self.gate = threading.Event()
+                self.gate.set()
+            
+            def acquire(self):
+                self.gate.wait()
+                if self.failures:
+                    self.failures -= 1
+                    raise RuntimeError('pool is closed')
+                return self.pool.acquire()
+        
+        pool = FlakyPool(get_pool(tasks_service.app.config['DATABASE'], tasks_service.app.config))
+        writer = GroupCommitWriter(pool, 0.001, 16)
+        insert = lambda defect_id: lambda conn: conn.execute(
+            'INSERT INTO defects (id, title, reported_by) VALUES (?, ?, ?)',
+            (defect_id, 'Запись писателя', 'engineer@system.com')
+        )
+        
+        with pytest.raises(RuntimeError):
+            writer.submit(insert(tasks_service.new_id()), timeout=5)
+        assert writer.thread.is_alive()
+        writer.submit(insert(tasks_service.new_id()), timeout=5)
+        
+        # Запись, не начатая до истечения ожидания, отменяется и не выполняется
+        pool.gate.clear()
+        blocked = threading.Thread(target=lambda: writer.submit(lambda conn: None, timeout=5))
+        blocked.start()
+        time.sleep(0.05)
+        cancelled_id = tasks_service.new_id()
+        with pytest.raises(GroupCommitTimeout):
+            writer.submit(insert(cancelled_id), timeout=0.05)
+        pool.gate.set()
+        blocked.join()
+        writer.submit(lambda conn: None, timeout=5)
+        
+        conn = tasks_service.get_db()
+        count = conn.execute("SELECT COUNT(*) FROM defects WHERE title = 'Запись писателя'").fetchone()[0]
+        cancelled = conn.execute('SELECT COUNT(*) FROM defects WHERE id = ?', (cancelled_id,)).fetchone()[0]
+        conn.close()
+        
+        assert count == 1
+        assert cancelled == 0
+    
+    # 56. Тест профилировщика SQL
+    def test_sql_profiler_diagnostics(self, tasks_client, monkeypatch):
+        """Тест учета запросов к базе и журнала медленных запросов с планами"""
+        import service_tasks.app as tasks_service
+        
+        monkeypatch.setitem(tasks_service.app.config, 'SQL_PROFILING', True)
+        monkeypatch.setitem(tasks_service.app.config, 'SQL_SLOW_QUERY_MS', 0)
+        
+        response = tasks_client.get('/v1/tasks?status=new')
+        assert response.status_code == 200
+        assert int(response.headers['X-SQL-Queries']) >= 1
+        
+        diagnostics = json.loads(tasks_client.get('/diagnostics/sql').data)
+        endpoint = diagnostics['endpoints']['GET /v1/tasks']
+        assert diagnostics['enabled'] == True
+        assert endpoint['requests'] >= 1
+        assert any('FROM tasks' in statement['sql'] for statement in endpoint['statements'])
+        
+        slow = [query for query in diagnostics['slow_queries'] if query['endpoint'] == 'GET /v1/tasks']
+        assert any('idx_tasks_status' in ' '.join(query['plan'] or []) for query in slow)
+
+    # 57. Тест изоляции баз в памяти и восстановления из снимка
+    def test_memory_database_snapshot_restore(self, tasks_client):
+        """Тест того, что изменения одного теста не видны следующему"""
+        import service_tasks.app as tasks_service
+        from common.sqlite_pool import MEMORY_DATABASE_PREFIX, get_pool
+        
+        assert tasks_service.app.config['DATABASE'].startswith(MEMORY_DATABASE_PREFIX)
+        pool = get_pool(tasks_service.app.config['DATABASE'], tasks_service.app.config)
+        snapshot = pool.snapshot()
+        before = json.loads(tasks_client.get('/v1/statistics').data)['data']
+        
+        tasks_client.post('/v1/tasks', json={'title': 'Временная задача'}, headers={'X-User-ID': 'manager@system.com'})
+        assert json.loads(tasks_client.get('/v1/statistics').data)['data']['tasks_total'] == before['tasks_total'] + 1
+        
+        pool.restore(snapshot)
+        assert json.loads(tasks_client.get('/v1/statistics').data)['data'] == before
+
+    # 58. Тест кодировщиков строк списков
+    @pytest.mark.parametrize('use_orjson', [False, True])
+    def test_row_encoder_output(self, orders_client, monkeypatch, use_orjson):
+        """Тест одинакового результата обоих способов кодирования списка заказов"""
+        import common.json_rows as json_rows
+        
+        monkeypatch.setattr(json_rows, 'USE_ORJSON', use_orjson)
+        
+        headers = {'X-User-ID': f'encoder-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        items = [{'product': 'Кирпич "М150"', 'quantity': 3, 'unit_price': 20.5}]
+        orders_client.post('/v1/orders', json={'title': 'Заказ\nс переносом', 'items': items}, headers=headers)
+        
+        response = orders_client.get('/v1/orders?include=items', headers=headers)
+        order = json.loads(response.data)['data']['orders'][0]
+        
+        assert response.content_type == 'application/json'
+        assert order['title'] == 'Заказ\nс переносом'
+        assert order['items'] == items
+        assert order['top_products'] == ['Кирпич "М150"']
+        assert order['total_amount'] == 61.5
+        assert order['description'] == ''
+    
+    # 59. Тест списков со стандартным модулем json
+    @pytest.mark.parametrize('client_name, path, name', [
+        ('users_client', '/v1/users', 'users'),
+        ('tasks_client', '/v1/defects', 'defects'),
+        ('tasks_client', '/v1/tasks', 'tasks'),
+        ('tasks_client', '/v1/reports', 'reports'),
+        ('orders_client', '/v1/orders', 'orders'),
+    ])
+    def test_list_endpoints_without_orjson(self, request, monkeypatch, client_name, path, name):
+        """Тест того, что при JSON_BACKEND=json (USE_ORJSON = False) списки
+        отдают те же данные, что и через orjson"""
+        import common.json_rows as json_rows
+        
+        client = request.getfixturevalue(client_name)
+        headers = {'X-User-ID': 'manager@system.com', 'X-User-Role': 'manager'}
+        if name == 'defects':
+            client.post('/v1/defects', json={'title': 'Скол "плитки"\nу входа'}, headers=headers)
+        if name == 'orders':
+            client.post('/v1/orders', json={
+                'title': 'Заказ для json', 'items': [{'product': 'Цемент', 'quantity': 2, 'unit_price': 7.5}]
+            }, headers=headers)
+        
+        monkeypatch.setattr(json_rows, 'USE_ORJSON', True)
+        expected = json.loads(client.get(path, headers=headers).data)
+        monkeypatch.setattr(json_rows, 'USE_ORJSON', False)
+        response = client.get(path, headers=headers)
+        
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data == expected
+        assert data['success'] == True
+        assert len(data['data'][name]) > 0
+    
+    # 60. Тест кодирования строк через orjson без словарей
+    def test_row_encoder_orjson_values(self, monkeypatch):
+        """Тест совпадения orjson-пути кодировщика со стандартным на
+        неудобных значениях и строках со служебными столбцами"""
+        import common.json_rows as json_rows
+        
+        encoder = json_rows.RowEncoder([
+            ('id', 'value'), ('title', 'value'), ('total', 'number'), ('items', 'json'), ('note', 'value')
+        ])
+        rows = [
+            ('a', 'Запятая,\n  и отступ', 3, '[{"product": "Песок"}]', None, 'служебный'),
+            ('b', '"кавычки" \\ и \u2028', 2.5, None, '%s %d', 'служебный'),
+        ]
+        
+        monkeypatch.setattr(json_rows, 'USE_ORJSON', False)
+        expected = json.loads(encoder.encode_rows(rows))
+        monkeypatch.setattr(json_rows, 'USE_ORJSON', True)
+        
+        assert json.loads(encoder.encode_rows(rows)) == expected
+        assert expected[0] == {'id': 'a', 'title': 'Запятая,\n  и отступ', 'total': 3.0,
+                               'items': [{'product': 'Песок'}], 'note': None}
+        assert expected[1]['items'] == [] and expected[1]['note'] == '%s %d'
+        assert encoder.encode_rows([]) == b'[]'
+
+    # 61. Тест потоковой выдачи списка задач
+    def test_tasks_stream_list(self, tasks_client, monkeypatch):
+        """Тест того, что потоковый список - корректный JSON со всеми строками"""
+        import common.json_rows as json_rows
+        import service_tasks.app as tasks_service
+        
+        monkeypatch.setattr(json_rows, 'STREAM_CHUNK_ROWS', 2)
+        for number in range(5):
+            tasks_client.post('/v1/tasks', json={'title': f'Потоковая задача {number}'},
+                              headers={'X-User-ID': 'manager@system.com'})
+        
+        conn = tasks_service.get_db()
+        total = conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+        conn.close()
+        
+        response = tasks_client.get('/v1/tasks?stream=1')
+        body = response.get_data()
+        data = json.loads(body)
+        
+        assert response.status_code == 200
+        assert body.endswith(b'"success":true}')
+        assert len(data['data']['tasks']) == total
+        assert data['data']['pagination']['has_more'] == False
+        
+        limited = json.loads(tasks_client.get('/v1/tasks?stream=1&limit=3').data)
+        assert len(limited['data']['tasks']) == 3
+        assert limited['data']['pagination']['has_more'] == True
+        
+        following = json.loads(tasks_client.get(
+            f"/v1/tasks?stream=1&cursor={limited['data']['pagination']['next_cursor']}"
+        ).data)
+        ids = [task['id'] for task in limited['data']['tasks'] + following['data']['tasks']]
+        assert len(ids) == len(set(ids)) == total
+    
+    # 62. Тест ошибки посреди потоковой выдачи
+    def test_stream_list_error_marker(self, tasks_client, monkeypatch):
+        """Тест того, что прерванный поток остается корректным JSON с success = false"""
+        import common.json_rows as json_rows
+        import service_tasks.app as tasks_service
+        
+        encoder = tasks_service.ROW_ENCODERS['defects']
+        chunks = []
+        def failing_encode_rows(rows):
+            if chunks:
+                raise RuntimeError('encoder failure')
+            chunks.append(rows)
+            return json_rows.RowEncoder.encode_rows(encoder, rows)
+        
+        monkeypatch.setattr(json_rows, 'STREAM_CHUNK_ROWS', 1)
+        monkeypatch.setattr(encoder, 'encode_rows', failing_encode_rows)
+        
+        data = json.loads(tasks_client.get('/v1/defects?stream=1').data)
+        
+        assert data['success'] == False
+        assert data['error']['code'] == 'SERVER_ERROR'
+        assert len(data['data']['defects']) == 1
+        assert 'pagination' not in data['data']
+    
+    # 63. Тест передачи потокового ответа через шлюз
+    def test_gateway_streams_list_response(self, gateway_client, monkeypatch):
+        """Тест того, что шлюз запрашивает поток и отдает тело без буферизации"""
+        from api_gateway.app import BULKHEADS
+        
+        body = json.dumps({'data': {'tasks': [{'id': 'task-1'}]}, 'success': True}).encode()
+        calls = []
+        def stream_request(**kwargs):
+            calls.append(kwargs)
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(body)
+            response.headers['Content-Type'] = 'application/json'
+            response.headers['Content-Length'] = str(len(body))
+            return response
+        
+        monkeypatch.setattr(BULKHEADS['heavy'].session, 'request', stream_request)
+        response = gateway_client.get('/v1/tasks?stream=1')
+        
+        assert response.status_code == 200
+        assert response.get_data() == body
+        assert calls[0]['stream'] == True
+    
+    # 64. Тест удержания слота bulkhead на время потокового ответа
+    def test_gateway_stream_holds_bulkhead(self, gateway_client, monkeypatch):
+        """Тест того, что слот bulkhead и счетчик экземпляра освобождаются после передачи тела"""
+        from api_gateway.app import BULKHEADS, UPSTREAMS
+        
+        def stream_request(**kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(b'{"data":{"tasks":[]},"success":true}')
+            return response
+        
+        monkeypatch.setattr(BULKHEADS['heavy'].session, 'request', stream_request)
+        outstanding = sum(upstream.outstanding for upstream in UPSTREAMS['tasks'].instances)
+        active = BULKHEADS['heavy'].metrics()['active']
+        
+        response = gateway_client.get('/v1/tasks?stream=1', buffered=False)
+        assert BULKHEADS['heavy'].metrics()['active'] == active + 1
+        assert sum(upstream.outstanding for upstream in UPSTREAMS['tasks'].instances) == outstanding + 1
+        
+        assert response.get_data() == b'{"data":{"tasks":[]},"success":true}'
+        response.close()
+        assert BULKHEADS['heavy'].metrics()['active'] == active
+        assert sum(upstream.outstanding for upstream in UPSTREAMS['tasks'].instances) == outstanding
+        
+        # Клиент, закрывший ответ до чтения тела, тоже освобождает слот
+        response = gateway_client.get('/v1/tasks?stream=1', buffered=False)
+        response.close()
+        assert BULKHEADS['heavy'].metrics()['active'] == active
+        assert sum(upstream.outstanding for upstream in UPSTREAMS['tasks'].instances) == outstanding
+
+    # 65. Тест выборки отдельных полей списка задач
+    def test_tasks_sparse_fieldset(self, tasks_client, monkeypatch):
+        """Тест того, что fields= сужает и ответ, и сам запрос к базе"""
+        import service_tasks.app as tasks_service
+        
+        monkeypatch.setitem(tasks_service.app.config, 'SQL_PROFILING', True)
+        response = tasks_client.get('/v1/tasks?fields=title,status&limit=2')
+        data = json.loads(response.data)
+        
+        assert response.status_code == 200
+        assert all(set(task) == {'id', 'title', 'status'} for task in data['data']['tasks'])
+        
+        following = json.loads(tasks_client.get(
+            f"/v1/tasks?fields=title&cursor={data['data']['pagination']['next_cursor']}"
+        ).data)
+        assert following['success'] == True
+        
+        diagnostics = json.loads(tasks_client.get('/diagnostics/sql').data)
+        statements = [statement['sql'] for statement in diagnostics['endpoints']['GET /v1/tasks']['statements']]
+        narrowed = [sql for sql in statements if sql.startswith('SELECT id, title, status, ')]
+        assert narrowed and 'description' not in narrowed[0]
+        
+        task_id = data['data']['tasks'][0]['id']
+        task = json.loads(tasks_client.get(f'/v1/tasks/{task_id}?fields=created_by').data)['data']
+        assert set(task) == {'id', 'created_by'}
+    
+    # 66. Тест отклонения неизвестного поля
+    @pytest.mark.parametrize('url', ['/v1/defects?fields=title,secret', '/v1/reports/any-id?fields=password'])
+    def test_sparse_fieldset_unknown_field(self, tasks_client, url):
+        """Тест ошибки валидации при запросе несуществующего поля"""
+        response = tasks_client.get(url)
+        data = json.loads(response.data)
+        
+        assert response.status_code == 400
+        assert data['error']['code'] == 'VALIDATION_ERROR'
+    
+    # 67. Тест выборки отдельных полей заказов и пользователей
+    def test_orders_and_users_sparse_fieldset(self, orders_client, users_client):
+        """Тест fields= для заказов (список и карточка с проверкой прав) и пользователей"""
+        headers = {'X-User-ID': f'fields-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        items = [{'product': 'Цемент', 'quantity': 2, 'unit_price': 10}]
+        for number in range(3):
+            orders_client.post('/v1/orders', json={'title': f'Заказ {number}', 'items': items}, headers=headers)
+        
+        page = json.loads(orders_client.get('/v1/orders?fields=total_amount&limit=2', headers=headers).data)['data']
+        assert page['orders'][0] == {'id': page['orders'][0]['id'], 'total_amount': 20.0}
+        
+        rest = json.loads(orders_client.get(
+            f"/v1/orders?fields=title&cursor={page['pagination']['next_cursor']}", headers=headers
+        ).data)['data']
+        assert rest['orders'] == [{'id': rest['orders'][0]['id'], 'title': 'Заказ 0'}]
+        
+        order_id = page['orders'][0]['id']
+        order = json.loads(orders_client.get(f'/v1/orders/{order_id}?fields=items', headers=headers).data)['data']
+        assert order == {'id': order_id, 'items': items}
+        
+        stranger = {'X-User-ID': 'someone-else', 'X-User-Role': 'engineer'}
+        assert orders_client.get(f'/v1/orders/{order_id}?fields=title', headers=stranger).status_code == 403
+        assert orders_client.get('/v1/orders?fields=secret', headers=headers).status_code == 400
+        
+        users = json.loads(users_client.get('/v1/users?fields=email').data)['data']['users']
+        assert all(set(user) == {'id', 'email'} for user in users)
+        assert users_client.get('/v1/users?fields=password_hash').status_code == 400
+
+    # 68. Тест сводки заказов в списке
+    def test_order_list_summaries(self, orders_client):
+        """Тест того, что список отдает сводку, а состав - только карточка или include=items"""
+        headers = {'X-User-ID': f'summary-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        items = [
+            {'product': 'Песок', 'quantity': 10, 'unit_price': 5},
+            {'product': 'Арматура', 'quantity': 2, 'unit_price': 300},
+            {'product': 'Цемент', 'quantity': 5, 'unit_price': 50},
+            {'product': 'Песок', 'quantity': 30, 'unit_price': 5},
+            {'product': 'Гвозди', 'quantity': 1, 'unit_price': 10}
+        ]
+        response = orders_client.post('/v1/orders', json={'title': 'Сводка', 'items': items}, headers=headers)
+        order_id = json.loads(response.data)['data']['order_id']
+        
+        order = json.loads(orders_client.get('/v1/orders', headers=headers).data)['data']['orders'][0]
+        assert 'items' not in order
+        assert order['item_count'] == 5
+        assert order['top_products'] == ['Арматура', 'Цемент', 'Песок']
+        assert order['total_amount'] == 1060
+        
+        detail = json.loads(orders_client.get(f'/v1/orders/{order_id}', headers=headers).data)['data']
+        assert detail['items'] == items
+        
+        orders_client.put(f'/v1/orders/{order_id}', json={'items': items[-1:]}, headers=headers)
+        order = json.loads(orders_client.get('/v1/orders', headers=headers).data)['data']['orders'][0]
+        assert (order['item_count'], order['top_products']) == (1, ['Гвозди'])
+        
+        response = orders_client.get('/v1/orders?include=history', headers=headers)
+        assert response.status_code == 400
+    
+    # 69. Тест расчета сводки существующих заказов при миграции
+    def test_order_summaries_backfill(self, orders_client, tmp_path, monkeypatch):
+        """Тест заполнения item_count и top_products для заказов, созданных до миграции"""
+        import service_orders.app as orders_service
+        
+        monkeypatch.setitem(orders_service.app.config, 'DATABASE', str(tmp_path / 'legacy_orders.db'))
+        orders_service.init_db()
+        
+        conn = orders_service.get_db()
+        conn.execute("UPDATE orders SET item_count = 0, top_products = '[]'")
+        conn.execute('PRAGMA user_version = 2')
+        conn.commit()
+        conn.close()
+        
+        monkeypatch.setattr(orders_service, 'ORDER_ITEMS_BACKFILL_BATCH', 2)
+        orders_service.init_db()
+        
+        conn = orders_service.get_db()
+        missing = conn.execute(
+            'SELECT COUNT(*) FROM orders WHERE item_count != '
+            '(SELECT COUNT(*) FROM order_items WHERE order_items.order_id = orders.id)'
+        ).fetchone()[0]
+        empty = conn.execute("SELECT COUNT(*) FROM orders WHERE top_products = '[]'").fetchone()[0]
+        conn.close()
+        
+        assert missing == 0
+        assert empty == 0
+
+    # 70. Тест получения нескольких задач и дефектов по списку id
+    def test_multi_get_tasks_and_defects(self, tasks_client):
+        """Тест выборки по ids= с отметками о ненайденных записях"""
+        headers = {'X-User-ID': 'manager@system.com'}
+        task_ids = [
+            json.loads(tasks_client.post('/v1/tasks', json={'title': f'Пакет {number}'}, headers=headers).data)['data']['task_id']
+            for number in range(2)
+        ]
+        
+        response = tasks_client.get(f'/v1/tasks/batch?ids={task_ids[1]},missing-id,{task_ids[0]},{task_ids[1]}&fields=title')
+        data = json.loads(response.data)['data']
+        
+        assert response.status_code == 200
+        assert list(data['tasks']) == [task_ids[1], 'missing-id', task_ids[0]]
+        assert data['tasks'][task_ids[0]] == {'id': task_ids[0], 'title': 'Пакет 0'}
+        assert data['tasks']['missing-id'] is None
+        assert data['errors'] == {'missing-id': {'code': 'NOT_FOUND'}}
+        
+        defects = json.loads(tasks_client.get('/v1/defects/batch?ids=missing-id').data)['data']
+        assert defects == {'defects': {'missing-id': None}, 'errors': {'missing-id': {'code': 'NOT_FOUND'}}}
+        
+        assert tasks_client.get('/v1/tasks/batch').status_code == 400
+        too_many = ','.join(str(number) for number in range(101))
+        assert tasks_client.get(f'/v1/reports/batch?ids={too_many}').status_code == 400
+    
+    # 71. Тест пакетной проверки прав при получении нескольких заказов
+    def test_multi_get_orders_access(self, orders_client, users_client):
+        """Тест того, что чужие заказы помечаются FORBIDDEN, а руководитель видит все"""
+        owner = {'X-User-ID': f'owner-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        other = {'X-User-ID': f'other-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        items = [{'product': 'Кирпич', 'quantity': 1, 'unit_price': 10}]
+        own_id = json.loads(orders_client.post('/v1/orders', json={'title': 'Свой', 'items': items}, headers=owner).data)['data']['order_id']
+        other_id = json.loads(orders_client.post('/v1/orders', json={'title': 'Чужой', 'items': items}, headers=other).data)['data']['order_id']
+        
+        data = json.loads(orders_client.get(f'/v1/orders/batch?ids={own_id},{other_id}', headers=owner).data)['data']
+        assert data['orders'][own_id]['items'] == items
+        assert data['orders'][other_id] is None
+        assert data['errors'] == {other_id: {'code': 'FORBIDDEN'}}
+        
+        manager = {'X-User-ID': 'manager@system.com', 'X-User-Role': 'manager'}
+        data = json.loads(orders_client.get(f'/v1/orders/batch?ids={own_id}&ids={other_id}', headers=manager).data)['data']
+        assert data['errors'] == {}
+        assert data['orders'][other_id]['title'] == 'Чужой'
+        
+        user_ids = [user['id'] for user in json.loads(users_client.get('/v1/users').data)['data']['users'][:2]]
+        users = json.loads(users_client.get(f"/v1/users/batch?ids={','.join(user_ids)}&fields=email").data)['data']['users']
+        assert list(users) == user_ids
+        assert all(set(user) == {'id', 'email'} for user in users.values())
+
+    # 72. Тест пакетного создания задач
+    @pytest.mark.parametrize('group_commit', [False, True])
+    def test_bulk_create_tasks(self, tasks_client, monkeypatch, group_commit):
+        """Тест режимов atomic и best_effort при пакетном создании"""
+        import service_tasks.app as tasks_service
+        
+        monkeypatch.setitem(tasks_service.app.config, 'GROUP_COMMIT', group_commit)
+        headers = {'X-User-ID': 'manager@system.com'}
+        before = json.loads(tasks_client.get('/v1/statistics').data)['data']['tasks_total']
+        items = [{'title': f'План {number}', 'priority': 'high', 'due_date': '2030-01-01'} for number in range(30)]
+        
+        response = tasks_client.post('/v1/tasks/bulk', json={'items': items}, headers=headers)
+        data = json.loads(response.data)
+        
+        assert response.status_code == 201
+        assert data['data']['succeeded'] == 30
+        task = json.loads(tasks_client.get(f"/v1/tasks/{data['data']['results'][0]['id']}").data)['data']
+        assert (task['title'], task['priority'], task['created_by']) == ('План 0', 'high', 'manager@system.com')
+        
+        broken = [{'title': 'Корректная'}, {'description': 'без названия'}, {'title': 'Тоже', 'priority': 5}]
+        response = tasks_client.post('/v1/tasks/bulk', json={'items': broken}, headers=headers)
+        data = json.loads(response.data)
+        assert response.status_code == 400
+        assert [result['status'] for result in data['data']['results']] == ['skipped', 'error', 'error']
+        assert json.loads(tasks_client.get('/v1/statistics').data)['data']['tasks_total'] == before + 30
+        
+        response = tasks_client.post('/v1/tasks/bulk', json={'mode': 'best_effort', 'items': broken}, headers=headers)
+        data = json.loads(response.data)
+        assert response.status_code == 200
+        assert (data['data']['succeeded'], data['data']['failed']) == (1, 2)
+        assert json.loads(tasks_client.get('/v1/statistics').data)['data']['tasks_total'] == before + 31
+        
+        assert tasks_client.post('/v1/tasks/bulk', json={'items': []}, headers=headers).status_code == 400
+    
+    # 73. Тест пакетного изменения дефектов
+    def test_bulk_update_defects(self, tasks_client):
+        """Тест пакетного закрытия дефектов с отметкой ненайденных"""
+        headers = {'X-User-ID': 'engineer@system.com'}
+        created = json.loads(tasks_client.post(
+            '/v1/defects/bulk', json={'items': [{'title': f'Дефект {number}'} for number in range(3)]}, headers=headers
+        ).data)['data']['results']
+        ids = [result['id'] for result in created]
+        
+        updates = [{'id': ids[0], 'status': 'closed'}, {'id': 'missing-id', 'status': 'closed'},
+                   {'id': ids[1], 'status': 'closed', 'assigned_to': 'engineer@system.com'}]
+        data = json.loads(tasks_client.put('/v1/defects/bulk', json={'items': updates}).data)
+        assert data['success'] == False
+        assert data['data']['results'][1]['error']['code'] == 'NOT_FOUND'
+        assert json.loads(tasks_client.get(f'/v1/defects/{ids[0]}').data)['data']['status'] != 'closed'
+        
+        data = json.loads(tasks_client.put('/v1/defects/bulk', json={'mode': 'best_effort', 'items': updates}).data)
+        assert [result['status'] for result in data['data']['results']] == ['updated', 'error', 'updated']
+        
+        defects = json.loads(tasks_client.get(f"/v1/defects/batch?ids={','.join(ids)}").data)['data']['defects']
+        assert [defects[defect_id]['status'] for defect_id in ids[:2]] == ['closed', 'closed']
+        assert defects[ids[1]]['assigned_to'] == 'engineer@system.com'
+        assert defects[ids[2]]['status'] != 'closed'
+        
+        duplicate = [{'id': ids[2], 'status': 'closed'}, {'id': ids[2], 'status': 'open'}]
+        data = json.loads(tasks_client.put('/v1/defects/bulk', json={'items': duplicate}).data)
+        assert data['data']['results'][1]['error']['code'] == 'VALIDATION_ERROR'
+    
+    # 74. Тест повтора пакетного создания с ключом идемпотентности через шлюз
+    def test_gateway_retries_bulk_create_with_key(self, gateway_client, monkeypatch):
+        """Тест того, что POST /v1/tasks/bulk с Idempotency-Key повторяется после сбоя соединения"""
+        from api_gateway.app import BULKHEADS, RETRY_BUDGET
+        
+        calls = []
+        def flaky_request(**kwargs):
+            calls.append(kwargs)
+            if len(calls) == 1:
+                raise requests.exceptions.ConnectionError('service restarting')
+            return self.make_upstream_response(201, {'success': True, 'data': {}})
+        
+        monkeypatch.setattr(RETRY_BUDGET, 'try_spend', lambda: True)
+        monkeypatch.setattr(BULKHEADS['write'].session, 'request', flaky_request)
+        response = gateway_client.post('/v1/tasks/bulk', json={'items': [{'title': 'Задача'}]},
+                                       headers={'Idempotency-Key': f'key-{uuid.uuid4()}'})
+        
+        assert response.status_code == 201
+        assert len(calls) == 2
+    
+    # 75. Тест пакетного импорта заказов из NDJSON
+    def test_bulk_orders_ndjson(self, orders_client, monkeypatch):
+        """Тест потоковой проверки и записи заказов пачками с результатом по каждому"""
+        import service_orders.app as orders_service
+        
+        monkeypatch.setattr(orders_service, 'BULK_ORDERS_BATCH', 2)
+        headers = {'X-User-ID': f'import-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        orders = [
+            {'title': 'Импорт 1', 'items': [{'product': 'Песок', 'quantity': 2, 'unit_price': 50}]},
+            {'title': 'Без позиций', 'items': []},
+            {'title': 'Импорт 2', 'items': [{'product': 'Цемент', 'quantity': 3, 'unit_price': 100},
+                                            {'product': 'Щебень', 'quantity': 1, 'unit_price': 20.5}]},
+            {'title': 'Отрицательная цена', 'items': [{'product': 'Гвозди', 'quantity': 1, 'unit_price': -1}]},
+        ]
+        body = '\n'.join(json.dumps(order, ensure_ascii=False) for order in orders[:2])
+        body += '\n{не json\n\n' + '\n'.join(json.dumps(order) for order in orders[2:]) + '\n'
+        
+        response = orders_client.post('/v1/orders/bulk', data=body.encode(), headers=headers,
+                                      content_type='application/x-ndjson')
+        data = json.loads(response.data)
+        results = data['data']['results']
+        
+        assert response.status_code == 200
+        assert data['success'] == True
+        assert data['data']['summary'] == {'total': 5, 'created': 2, 'failed': 3}
+        assert [result['status'] for result in results] == ['created', 'error', 'error', 'created', 'error']
+        assert results[2]['error']['message'] == 'Malformed JSON line'
+        assert results[3]['total_amount'] == 320.5
+        
+        listed = json.loads(orders_client.get('/v1/orders', headers=headers).data)['data']['orders']
+        assert {order['title']: order['item_count'] for order in listed} == {'Импорт 1': 1, 'Импорт 2': 2}
+        
+        analytics = json.loads(orders_client.get(
+            '/v1/orders/analytics/products?product=Щебень', headers={'X-User-Role': 'manager'}
+        ).data)['data']
+        assert analytics['products'][0]['quantity'] >= 1
+    
+    # 76. Тест пакетного импорта заказов из JSON-массива
+    def test_bulk_orders_json_array(self, orders_client, monkeypatch):
+        """Тест чтения массива мелкими блоками и остановки на испорченном теле"""
+        import service_orders.app as orders_service
+        
+        monkeypatch.setattr(orders_service, 'BULK_READ_CHUNK', 7)
+        monkeypatch.setattr(orders_service, 'BULK_ORDERS_BATCH', 2)
+        headers = {'X-User-ID': f'import-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        orders = [{'title': f'Заказ «{number}»', 'items': [{'product': 'Кирпич', 'quantity': 10, 'unit_price': 12}]}
+                  for number in range(5)]
+        
+        body = json.dumps(orders, ensure_ascii=False, indent=1).encode()
+        data = json.loads(orders_client.post('/v1/orders/bulk', data=body, headers=headers,
+                                             content_type='application/json').data)
+        assert data['success'] == True
+        assert data['data']['summary'] == {'total': 5, 'created': 5, 'failed': 0}
+        
+        broken = json.dumps(orders[:3], ensure_ascii=False)[:-1] + ', {"title": "обрыв'
+        data = json.loads(orders_client.post('/v1/orders/bulk', data=broken.encode(), headers=headers,
+                                             content_type='application/json').data)
+        assert data['success'] == False
+        assert data['error']['code'] == 'VALIDATION_ERROR'
+        assert data['data']['summary'] == {'total': 2, 'created': 2, 'failed': 0}
+        
+        listed = json.loads(orders_client.get('/v1/orders?limit=50', headers=headers).data)['data']['orders']
+        assert len(listed) == 7
+    
+    # 77. Тест потоковой передачи тела импорта через шлюз
+    def test_gateway_forwards_bulk_orders_body(self, gateway_client, monkeypatch):
+        """Тест того, что шлюз передает тело импорта без разбора и не повторяет запрос"""
+        from api_gateway.app import BULKHEADS
+        
+        body = b'{"title": "A", "items": []}\n{"title": "B", "items": []}\n'
+        calls = []
+        def bulk_request(**kwargs):
+            calls.append(dict(kwargs, data=b''.join(kwargs['data'])))
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(b'{"data":{"results":[]},"success":true}')
+            return response
+        
+        monkeypatch.setattr(BULKHEADS['heavy'].session, 'request', bulk_request)
+        response = gateway_client.post('/v1/orders/bulk', data=body, content_type='application/x-ndjson')
+        
+        assert response.status_code == 200
+        assert json.loads(response.data)['success'] == True
+        assert len(calls) == 1
+        assert calls[0]['data'] == body
+        assert calls[0]['headers']['Content-Type'] == 'application/x-ndjson'
+        assert calls[0]['stream'] == True
+    
+    # 78. Тест импорта, ответ на который больше буфера сокета
+    def test_bulk_import_over_socket(self, orders_client):
+        """Тест того, что клиент, отправляющий тело целиком до чтения ответа, не зависает"""
+        import socket
+        import threading
+        from requests.adapters import HTTPAdapter
+        from urllib3.connection import HTTPConnection
+        from werkzeug.serving import make_server
+        import service_orders.app as orders_service
+        
+        # Маленькие буферы сокетов, чтобы их переполняли и небольшие объемы
+        buffer_options = [(socket.SOL_SOCKET, socket.SO_SNDBUF, 16384), (socket.SOL_SOCKET, socket.SO_RCVBUF, 16384)]
+        class SmallBufferAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                kwargs['socket_options'] = HTTPConnection.default_socket_options + buffer_options
+                super().init_poolmanager(*args, **kwargs)
+        
+        server = make_server('127.0.0.1', 0, orders_service.app, threaded=True)
+        for level, option, value in buffer_options:
+            server.socket.setsockopt(level, option, value)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        session = requests.Session()
+        session.mount('http://', SmallBufferAdapter())
+        
+        line = json.dumps({'title': 'Сокет', 'items': [{'product': 'Гвозди', 'quantity': 1, 'unit_price': 1}]})
+        count = 3000
+        def body():
+            for start in range(0, count, 1000):
+                yield ('\n'.join([line] * 1000) + '\n').encode()
+        
+        try:
+            response = session.post(
+                f'http://127.0.0.1:{server.server_port}/v1/orders/bulk', data=body(), timeout=10,
+                headers={'Content-Type': 'application/x-ndjson', 'X-User-ID': 'socket-user'}
+            )
+        finally:
+            server.shutdown()
+        data = response.json()
+        
+        assert len(response.content) > 10 * 16384
+        assert data['success'] == True
+        assert data['data']['summary'] == {'total': count, 'created': count, 'failed': 0}
+    
+    # 79. Тест выгрузки заказов в CSV
+    def test_export_orders_csv(self, orders_client, monkeypatch):
+        """Тест потоковой выгрузки с фильтрами и строками по позициям"""
+        import service_orders.app as orders_service
+        
+        monkeypatch.setattr(orders_service, 'EXPORT_CHUNK_ROWS', 2)
+        headers = {'X-User-ID': f'export-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        items = [{'product': 'Песок, мытый', 'quantity': 2, 'unit_price': 50},
+                 {'product': 'Цемент "М500"', 'quantity': 1, 'unit_price': 400}]
+        for number in range(3):
+            orders_client.post('/v1/orders', json={'title': f'Выгрузка {number}', 'items': items}, headers=headers)
+        
+        response = orders_client.get('/v1/orders/export', headers=headers)
+        rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'text/csv'
+        assert 'attachment' in response.headers['Content-Disposition']
+        assert rows[0] == orders_service.EXPORT_ORDER_COLUMNS
+        assert [row[1] for row in rows[1:]] == ['Выгрузка 0', 'Выгрузка 1', 'Выгрузка 2']
+        
+        response = orders_client.get('/v1/orders/export?expand=items&status=created', headers=headers)
+        rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+        assert len(rows) == 1 + 3 * 2
+        assert rows[2][rows[0].index('product')] == 'Цемент "М500"'
+        
+        response = orders_client.get('/v1/orders/export?status=completed', headers=headers)
+        assert len(list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))) == 1
+        
+        assert orders_client.get('/v1/orders/export?format=pdf', headers=headers).status_code == 400
+        assert orders_client.get('/v1/orders/export?expand=history', headers=headers).status_code == 400
+    
+    # 80. Тест маршрута выгрузки в шлюзе
+    def test_gateway_export_route(self, gateway_client, monkeypatch):
+        """Тест того, что выгрузка идет через тяжелый bulkhead с потоковой передачей"""
+        from api_gateway.app import BULKHEADS, get_route_deadline
+        
+        calls = []
+        def export_request(**kwargs):
+            calls.append(kwargs)
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(b'id,title\r\n')
+            response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+            response.headers['Content-Disposition'] = 'attachment; filename="orders.csv"'
+            return response
+        
+        monkeypatch.setattr(BULKHEADS['heavy'].session, 'request', export_request)
+        response = gateway_client.get('/v1/orders/export?status=created')
+        
+        assert response.status_code == 200
+        assert response.get_data() == b'id,title\r\n'
+        assert response.headers['Content-Disposition'] == 'attachment; filename="orders.csv"'
+        assert calls[0]['stream'] == True
+        assert get_route_deadline('v1/orders/export') > get_route_deadline('v1/orders')
+    
+    # 81. Тест экранирования формул и прерывания выгрузки
+    def test_export_escapes_formulas_and_marks_errors(self, orders_client, monkeypatch):
+        """Тест того, что ячейки-формулы экранируются, а оборванная выгрузка
+        заканчивается строкой-маркером ошибки"""
+        import sqlite3
+        import service_orders.app as orders_service
+        
+        monkeypatch.setattr(orders_service, 'EXPORT_CHUNK_ROWS', 1)
+        headers = {'X-User-ID': f'formula-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        titles = ['=HYPERLINK("http://evil")', '@SUM(A1)', 'Обычный заказ']
+        for title in titles:
+            orders_client.post('/v1/orders', json={
+                'title': title, 'items': [{'product': '-2+3', 'quantity': 1, 'unit_price': 10}]
+            }, headers=headers)
+        
+        response = orders_client.get('/v1/orders/export?expand=items', headers=headers)
+        rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+        assert [row[1] for row in rows[1:]] == ["'=HYPERLINK(\"http://evil\")", "'@SUM(A1)", 'Обычный заказ']
+        assert {row[rows[0].index('product')] for row in rows[1:]} == {"'-2+3"}
+        
+        # Ошибка базы посреди выгрузки
+        export_batches = orders_service.export_batches
+        def failing_batches(conn, query, params):
+            batches = export_batches(conn, query, params)
+            try:
+                yield next(batches)
+                raise sqlite3.OperationalError('disk I/O error')
+            finally:
+                batches.close()
+        monkeypatch.setattr(orders_service, 'export_batches', failing_batches)
+        response = orders_client.get('/v1/orders/export', headers=headers)
+        rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+        assert len(rows) == 3
+        assert rows[-1] == [orders_service.EXPORT_ERROR_MARKER, 'SERVER_ERROR', 'Server error']
+        
+        # Дедлайн истекает после первой пачки
+        def slow_batches(conn, query, params):
+            for rows in export_batches(conn, query, params):
+                yield rows
+                time.sleep(0.3)
+        monkeypatch.setattr(orders_service, 'export_batches', slow_batches)
+        response = orders_client.get('/v1/orders/export', headers={
+            **headers, 'X-Request-Deadline': str(time.time() + 0.2)
+        })
+        rows = list(csv.reader(io.StringIO(response.get_data().decode('utf-8-sig'))))
+        assert len(rows) == 3
+        assert rows[-1][:2] == [orders_service.EXPORT_ERROR_MARKER, 'DEADLINE_EXCEEDED']
+        
+        response = orders_client.get('/v1/orders/export?format=xlsx', headers={
+            **headers, 'X-Request-Deadline': str(time.time() + 0.2)
+        })
+        assert response.status_code == 504
+    
+    # 82. Тест выгрузки заказов в XLSX
+    def test_export_orders_xlsx(self, orders_client):
+        """Тест выгрузки в XLSX с экранированием формул"""
+        import openpyxl
+        
+        headers = {'X-User-ID': f'xlsx-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        orders_client.post('/v1/orders', json={
+            'title': '=1+1', 'items': [{'product': 'Песок', 'quantity': 2, 'unit_price': 50}]
+        }, headers=headers)
+        
+        response = orders_client.get('/v1/orders/export?format=xlsx', headers=headers)
+        sheet = openpyxl.load_workbook(io.BytesIO(response.get_data())).active
+        rows = list(sheet.values)
+        
+        assert response.status_code == 200
+        assert response.mimetype == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        assert rows[0][:2] == ('id', 'title')
+        assert rows[1][1] == "'=1+1"
+        assert rows[1][4] == 100
+
+    # 83. Тест полнотекстового поиска по задачам, дефектам и отчетам
+    def test_search_tasks_defects_reports(self, tasks_client):
+        """Тест ранжирования, поиска по префиксу и формам русских слов"""
+        headers = {'X-User-ID': 'manager@system.com'}
+        marker = 'опалубк'
+        task_id = tasks_client.post('/v1/tasks', json={
+            'title': f'Монтаж {marker}а', 'description': 'Монтаж щитов на захватке'
+        }, headers=headers).get_json()['data']['task_id']
+        tasks_client.post('/v1/defects', json={
+            'title': 'Брак бетона', 'description': f'Раковины после демонтажа {marker}и', 'severity': 'low'
+        }, headers=headers)
+        tasks_client.post('/v1/reports', json={
+            'title': 'Отчет по монолиту', 'content': f'Установлена ёмкость для {marker}и', 'report_type': 'technical'
+        }, headers=headers)
+        
+        response = tasks_client.get(f'/v1/search?q={marker}у')
+        results = response.get_json()['data']['results']
+        
+        assert response.status_code == 200
+        assert [result['type'] for result in results][0] == 'tasks'
+        assert sorted(result['type'] for result in results) == ['defects', 'reports', 'tasks']
+        assert results[0]['score'] >= results[1]['score'] >= results[2]['score']
+        assert '[' in results[0]['snippet']
+        
+        # Префикс слова, ё и е, ограничение типов и страницы
+        results = tasks_client.get(f'/v1/search?q={marker[:-2]} емкость').get_json()['data']['results']
+        assert [result['type'] for result in results] == ['reports']
+        response = tasks_client.get(f'/v1/search?q={marker}&types=tasks,defects&limit=1')
+        assert response.get_json()['data']['pagination']['has_more'] == True
+        assert len(response.get_json()['data']['results']) == 1
+        
+        # Индекс следует за изменением строки
+        tasks_client.put(f'/v1/tasks/{task_id}', json={'title': 'Монтаж лесов'})
+        results = tasks_client.get(f'/v1/search?q={marker}&types=tasks').get_json()['data']['results']
+        assert results == []
+        results = tasks_client.get('/v1/search?q=лесов&types=tasks').get_json()['data']['results']
+        assert [result['id'] for result in results] == [task_id]
+        
+        assert tasks_client.get('/v1/search?q=%20-%20').status_code == 400
+        assert tasks_client.get('/v1/search?q=бетон&types=orders').status_code == 400
+    
+    # 84. Тест удаления из поискового индекса
+    def test_search_index_follows_delete(self, tasks_client):
+        """Тест того, что удаленный отчет пропадает из поиска, а индекс совпадает с таблицей"""
+        import service_tasks.app as tasks_service
+        
+        headers = {'X-User-ID': 'manager@system.com'}
+        report_id = tasks_client.post('/v1/reports', json={
+            'title': 'Акт скрытых работ', 'content': 'Армирование ростверка', 'report_type': 'technical'
+        }, headers=headers).get_json()['data']['report_id']
+        assert len(tasks_client.get('/v1/search?q=ростверк').get_json()['data']['results']) == 1
+        
+        tasks_client.delete(f'/v1/reports/{report_id}', headers=headers)
+        assert tasks_client.get('/v1/search?q=ростверк').get_json()['data']['results'] == []
+        
+        conn = tasks_service.get_db()
+        try:
+            for table in tasks_service.SEARCH_INDEXES:
+                conn.execute(f"INSERT INTO {table}_fts ({table}_fts, rank) VALUES ('integrity-check', 1)")
+        finally:
+            conn.close()
+    
+    # 85. Тест поиска заказов по товарам
+    def test_search_orders(self, orders_client, gateway_client, monkeypatch):
+        """Тест поиска по товарам из состава, фильтра по владельцу и маршрута шлюза"""
+        from api_gateway.app import BULKHEADS
+        
+        owner = {'X-User-ID': f'search-{uuid.uuid4().hex[:8]}', 'X-User-Role': 'engineer'}
+        product = f'Газобетон D{uuid.uuid4().hex[:6]}'
+        order_id = orders_client.post('/v1/orders', json={
+            'title': 'Стеновые блоки', 'items': [{'product': product, 'quantity': 10, 'unit_price': 300}]
+        }, headers=owner).get_json()['data']['order_id']
+        
+        response = orders_client.get(f'/v1/orders/search?q={product.split()[1]}', headers=owner)
+        orders = response.get_json()['data']['orders']
+        assert response.status_code == 200
+        assert [order['id'] for order in orders] == [order_id]
+        assert orders[0]['item_count'] == 1
+        
+        other = {'X-User-ID': 'someone-else', 'X-User-Role': 'engineer'}
+        assert orders_client.get(f'/v1/orders/search?q={product.split()[1]}', headers=other).get_json()['data']['orders'] == []
+        
+        orders_client.put(f'/v1/orders/{order_id}', json={
+            'items': [{'product': 'Кирпич облицовочный', 'quantity': 100, 'unit_price': 30}]
+        }, headers=owner)
+        assert orders_client.get(f'/v1/orders/search?q={product.split()[1]}', headers=owner).get_json()['data']['orders'] == []
+        orders = orders_client.get('/v1/orders/search?q=облицовочного стеновых', headers=owner).get_json()['data']['orders']
+        assert [order['id'] for order in orders] == [order_id]
+        
+        calls = []
+        def search_request(**kwargs):
+            calls.append(kwargs)
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(b'{"success": true, "data": {"results": []}}')
+            return response
+        
+        monkeypatch.setattr(BULKHEADS['interactive'].session, 'request', search_request)
+        assert gateway_client.get('/v1/search?q=бетон&types=tasks').status_code == 200
+        assert calls[0]['url'].endswith('/v1/search')
+        assert ('q', 'бетон') in calls[0]['params']
+    
+    # 86. Тест поиска после перенумерации rowid
+    def test_search_keys_survive_rowid_renumbering(self, tasks_client):
+        """Тест того, что индекс привязан к id записи, а не к неявному rowid,
+        который VACUUM может перенумеровать"""
+        import service_tasks.app as tasks_service
+        
+        headers = {'X-User-ID': 'manager@system.com'}
+        marker = f'ригель{uuid.uuid4().hex[:6]}'
+        task_id = tasks_client.post('/v1/tasks', json={
+            'title': f'Монтаж {marker}', 'description': 'Сварка узлов'
+        }, headers=headers).get_json()['data']['task_id']
+        report_id = tasks_client.post('/v1/reports', json={
+            'title': 'Акт освидетельствования', 'content': f'Опирание на {marker}', 'report_type': 'technical'
+        }, headers=headers).get_json()['data']['report_id']
+        
+        # Так таблицы выглядят после VACUUM с перенумерацией строк
+        conn = tasks_service.get_db()
+        try:
+            conn.execute('UPDATE tasks SET rowid = rowid + 1000000')
+            conn.execute('UPDATE reports SET rowid = rowid + 1000000')
+            conn.commit()
+        finally:
+            conn.close()
+        
+        results = tasks_client.get(f'/v1/search?q={marker}&types=tasks,reports').get_json()['data']['results']
+        assert [result['id'] for result in results] == [task_id, report_id]
+        
+        tasks_client.put(f'/v1/tasks/{task_id}', json={'title': 'Монтаж прогонов'})
+        tasks_client.delete(f'/v1/reports/{report_id}', headers=headers)
+        assert tasks_client.get(f'/v1/search?q={marker}&types=tasks,reports').get_json()['data']['results'] == []
+        results = tasks_client.get('/v1/search?q=прогонов&types=tasks').get_json()['data']['results']
+        assert [result['id'] for result in results] == [task_id]
+        
+        conn = tasks_service.get_db()
+        try:
+            for table in ['tasks', 'reports']:
+                conn.execute(f"INSERT INTO {table}_fts ({table}_fts, rank) VALUES ('integrity-check', 1)")
+            orphans = conn.execute(
+                'SELECT COUNT(*) FROM reports_search_keys WHERE id NOT IN (SELECT id FROM reports)'
+            ).fetchone()[0]
+        finally:
+            conn.close()
+        assert orphans == 0
+    
+    # 87. Тест общего поиска через шлюз
+    def test_gateway_search_merges_services(self, gateway_client, monkeypatch):
+        """Тест того, что шлюз ищет в сервисах задач и заказов и сливает результаты по score"""
+        from api_gateway.app import BULKHEADS
+        
+        bodies = {
+            '/v1/search': {'results': [
+                {'type': 'tasks', 'id': 't1', 'title': 'Монтаж', 'snippet': '[бетон]', 'score': 3.0},
+                {'type': 'defects', 'id': 'd1', 'title': 'Брак', 'snippet': '[бетон]', 'score': 1.0}
+            ], 'pagination': {'page': 1, 'limit': 2, 'has_more': False}},
+            '/v1/orders/search': {'orders': [
+                {'id': 'o1', 'title': 'Бетон М300', 'status': 'pending', 'total_amount': 10.0,
+                 'item_count': 1, 'created_at': '2024-01-01', 'snippet': '[Бетон]', 'score': 2.0}
+            ], 'pagination': {'page': 1, 'limit': 2, 'has_more': False}}
+        }
+        calls = []
+        def search_request(**kwargs):
+            calls.append(kwargs)
+            path = '/v1/orders/search' if kwargs['url'].endswith('/v1/orders/search') else '/v1/search'
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = io.BytesIO(json.dumps({'success': True, 'data': bodies[path]}).encode())
+            return response
+        
+        monkeypatch.setattr(BULKHEADS['interactive'].session, 'request', search_request)
+        response = gateway_client.get('/v1/search?q=бетон&limit=2')
+        data = response.get_json()['data']
+        
+        assert response.status_code == 200
+        assert [(result['type'], result['id']) for result in data['results']] == [('tasks', 't1'), ('orders', 'o1')]
+        assert data['pagination'] == {'page': 1, 'limit': 2, 'has_more': True}
+        assert sorted(call['url'].split('/v1/')[1] for call in calls) == ['orders/search', 'search']
+        assert all(('limit', '2') in call['params'] and ('page', '1') in call['params'] for call in calls)
+        
+        # Вторая страница: сервисы отдают первые page * limit результатов
+        calls.clear()
+        data = gateway_client.get('/v1/search?q=бетон&limit=2&page=2').get_json()['data']
+        assert [result['id'] for result in data['results']] == ['d1']
+        assert all(('limit', '4') in call['params'] for call in calls)
+        
+        assert gateway_client.get('/v1/search?q=бетон&types=acts').status_code == 400
+        assert gateway_client.get('/v1/search?q=бетон&limit=60&page=2').status_code == 400
+
+    # 88. Тест ленты изменений списков
+    def test_change_feed_updated_since(self, tasks_client):
+        """Тест выдачи только измененных строк и надгробий удаленных отчетов"""
+        headers = {'X-User-ID': 'manager@system.com'}
+        since = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3]
+        
+        # Исходные демо-данные созданы раньше точки синхронизации
+        data = tasks_client.get(f'/v1/tasks?updated_since={since}').get_json()['data']
+        assert data['tasks'] == []
+        assert data['deleted'] == []
+        token = data['pagination']['change_token']
+        
+        task_ids = [
+            tasks_client.post('/v1/tasks', json={'title': f'Синхронизация {number}'}, headers=headers).get_json()['data']['task_id']
+            for number in range(3)
+        ]
+        response = tasks_client.get(f'/v1/tasks?change_token={token}&limit=2&fields=title')
+        data = response.get_json()['data']
+        assert response.status_code == 200
+        assert [task['id'] for task in data['tasks']] == task_ids[:2]
+        assert set(data['tasks'][0]) == {'id', 'title'}
+        assert data['pagination']['has_more'] == True
+        
+        data = tasks_client.get(f"/v1/tasks?change_token={data['pagination']['change_token']}").get_json()['data']
+        assert [task['id'] for task in data['tasks']] == task_ids[2:]
+        token = data['pagination']['change_token']
+        
+        # Повторный запрос с тем же токеном пуст, изменение строки снова ее возвращает
+        assert tasks_client.get(f'/v1/tasks?change_token={token}').get_json()['data']['tasks'] == []
+        tasks_client.put(f'/v1/tasks/{task_ids[0]}', json={'status': 'completed'})
+        data = tasks_client.get(f'/v1/tasks?change_token={token}').get_json()['data']
+        assert [(task['id'], task['status']) for task in data['tasks']] == [(task_ids[0], 'completed')]
+        
+        # Удаление отчета попадает в ленту надгробием
+        report_id = tasks_client.post('/v1/reports', json={'title': 'Временный отчет'}, headers=headers).get_json()['data']['report_id']
+        data = tasks_client.get(f'/v1/reports?updated_since={since}').get_json()['data']
+        assert [report['id'] for report in data['reports']] == [report_id]
+        assert data['reports'][0]['updated_at'] is not None
+        token = data['pagination']['change_token']
+        tasks_client.delete(f'/v1/reports/{report_id}', headers=headers)
+        data = tasks_client.get(f'/v1/reports?change_token={token}').get_json()['data']
+        assert data['reports'] == []
+        assert [report['id'] for report in data['deleted']] == [report_id]
+        
+        assert tasks_client.get(f'/v1/tasks?updated_since={since}&sort=title').status_code == 400
+        assert tasks_client.get('/v1/tasks?updated_since=вчера').status_code == 400
+        assert tasks_client.get('/v1/tasks?change_token=broken').status_code == 400
+        response = tasks_client.get('/v1/defects?updated_since=2000-01-01')
+        assert response.status_code == 410
+        assert response.get_json()['error']['code'] == 'CHANGE_TOKEN_EXPIRED'
+    
+    # 89. Тест добавления updated_at отчетам существующей базы
+    def test_change_feed_migration(self, tasks_client, tmp_path, monkeypatch):
+        """Тест миграции отчетов без updated_at и выбора bulkhead для ленты изменений"""
+        import service_tasks.app as tasks_service
+        from api_gateway.app import classify_route
+        
+        monkeypatch.setitem(tasks_service.app.config, 'DATABASE', str(tmp_path / 'legacy_tasks.db'))
+        tasks_service.init_db()
+        
+        conn = tasks_service.get_db()
+        conn.execute('DROP TRIGGER trg_reports_tombstone')
+        conn.execute('DROP INDEX idx_reports_updated_at')
+        conn.execute('ALTER TABLE reports DROP COLUMN updated_at')
+        conn.execute('PRAGMA user_version = 4')
+        conn.commit()
+        conn.close()
+        
+        tasks_service.init_db()
+        
+        conn = tasks_service.get_db()
+        missing = conn.execute('SELECT COUNT(*) FROM reports WHERE updated_at IS NOT created_at').fetchone()[0]
+        indexes = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        conn.close()
+        
+        assert missing == 0
+        assert 'idx_reports_updated_at' in indexes
+        assert classify_route('v1/tasks', 'GET', {'updated_since': '2025-01-01'}) == 'interactive'
+        assert classify_route('v1/tasks', 'GET', {}) == 'heavy'
+
+    # 90. Тест ленты изменений у клиента без удалений
+    def test_change_feed_token_without_deletes(self, tasks_client):
+        """Тест того, что токен клиента, не видевшего удалений больше срока хранения, не устаревает"""
+        import service_tasks.app as tasks_service
+        
+        now = datetime.utcnow()
+        old_tombstones = (now - timedelta(days=tasks_service.TOMBSTONE_RETENTION_DAYS + 1)).strftime('%Y-%m-%d %H:%M:%S')
+        recent_rows = (now - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Прошлый ответ уже сдвинул позицию надгробий к моменту чтения
+        token = tasks_service.encode_cursor([recent_rows, '', recent_rows, ''])
+        response = tasks_client.get(f'/v1/tasks?change_token={token}')
+        assert response.status_code == 200
+        position = tasks_service.decode_cursor(response.get_json()['data']['pagination']['change_token'], 4)
+        assert position[2] > (now - timedelta(minutes=5)).strftime('%Y-%m-%d %H:%M:%S')
+        
+        # Каждый ответ без удалений продвигает позицию, поэтому через срок хранения
+        # токен ежедневно синхронизирующегося клиента остается действительным
+        for _ in range(3):
+            token = response.get_json()['data']['pagination']['change_token']
+            response = tasks_client.get(f'/v1/tasks?change_token={token}')
+            assert response.status_code == 200
+        
+        # Токен, не обновлявшийся дольше срока хранения, по-прежнему отклоняется
+        token = tasks_service.encode_cursor([recent_rows, '', old_tombstones, ''])
+        assert tasks_client.get(f'/v1/tasks?change_token={token}').status_code == 410
+
 if __name__ == '__main__':
     # Запуск тестов
     pytest.main([__file__, '-v'])
\ No newline at end of file